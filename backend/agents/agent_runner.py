@@ -1,11 +1,16 @@
 """Main agent orchestration and execution with Industry-Grade standards."""
-from sqlalchemy.orm import Session
-from models.lead import Lead
-from models.activity_log import ActivityLog
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from sqlalchemy import select
+from sqlalchemy.orm import Session, sessionmaker
+from models.lead import Lead, lead_scan_options
 from agents.lead_classifier import lead_classifier
 from agents.email_generator import email_generator
 from services.communication_service import comm_service
-from typing import List, Dict, Optional
+from services.activity_sink import ActivitySink
+from services.database import begin_transaction
+from services.idempotency import idempotency_store, make_key
+from services.outbox import outbox
+from typing import Callable, Iterator, List, Dict, Optional, Set, Tuple
 from datetime import datetime, timezone
 from loguru import logger
 from config import get_settings
@@ -15,61 +20,421 @@ settings = get_settings()
 class AgentRunner:
     """Main agent that orchestrates lead analysis and multi-channel outreach."""
     
-    def __init__(self, db: Session, user_id: int):
+    def __init__(
+        self,
+        db: Session,
+        user_id: int,
+        session_factory: Optional[Callable[[], Session]] = None,
+        sink: Optional[ActivitySink] = None
+    ):
         self.db = db
         self.user_id = user_id
         self.activities: List[Dict] = []
+        # Rows logged for the lead in progress; published only if its savepoint commits
+        self._staged_activities: List[Dict] = []
+        
+        # Cycle sessions run on the same engine; objects stay loaded across commits
+        # so already-fetched leads never trigger a refresh SELECT.
+        self.session_factory = session_factory or sessionmaker(
+            bind=db.get_bind(), autoflush=False, expire_on_commit=False
+        )
+        # Activity rows are buffered and bulk-inserted into this runner's transaction
+        self.sink = sink or ActivitySink(self.session_factory, db=db)
         
         # PRO-TIP: Centralized logging setup
         logger.bind(user_id=user_id)
     
-    def run(self) -> Dict:
-        """Run the autonomous agent for all leads in the pipeline."""
-        logger.info(f"System: Initiating global cycle for user {self.user_id}")
+    def run(self, concurrency: Optional[int] = None, chunk_size: Optional[int] = None) -> Dict:
+        """
+        Run the autonomous agent for all leads in the pipeline.
+        
+        Args:
+            concurrency: Max chunks processed in parallel (defaults to AGENT_MAX_CONCURRENCY).
+                Each chunk runs on its own session; 1 keeps the serial loop.
+            chunk_size: Leads committed per transaction (defaults to AGENT_CHUNK_SIZE).
+                Every lead runs inside its own SAVEPOINT, so a failure only rolls back that lead.
+        
+        Only leads that need an action are loaded (active leads are filtered out in
+        SQL), once, and handed to the workers without per-lead queries. They are
+        streamed one chunk at a time (see `_stream_due_leads`) and at most
+        `concurrency` chunks are in flight, so memory stays flat however large the
+        pipeline grows.
+        """
+        concurrency = max(1, concurrency or settings.AGENT_MAX_CONCURRENCY)
+        chunk_size = max(1, chunk_size or settings.AGENT_CHUNK_SIZE)
+        logger.info(
+            f"System: Initiating global cycle for user {self.user_id} "
+            f"(concurrency={concurrency}, chunk_size={chunk_size})"
+        )
+        
+        leads_processed = 0
+        actions_taken = 0
         
-        leads = self.db.query(Lead).filter(Lead.user_id == self.user_id).all()
+        def collect(future, first_lead_id: int):
+            nonlocal actions_taken
+            try:
+                chunk_actions, activities = future.result()
+                self.activities.extend(activities)
+                actions_taken += chunk_actions
+            except Exception as e:
+                logger.error(f"Critical fail for chunk starting at lead {first_lead_id}: {e}")
         
-        if not leads:
+        if concurrency == 1:
+            for chunk in self._stream_due_leads(chunk_size):
+                leads_processed += len(chunk)
+                try:
+                    chunk_actions, activities = self._run_chunk(chunk)
+                    self.activities.extend(activities)
+                    actions_taken += chunk_actions
+                except Exception as e:
+                    logger.error(f"Critical fail for chunk starting at lead {chunk[0].id}: {e}")
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agent-cycle") as pool:
+                futures = {}
+                for chunk in self._stream_due_leads(chunk_size):
+                    leads_processed += len(chunk)
+                    if len(futures) >= concurrency:
+                        # Read ahead no further than the workers can take
+                        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future, futures.pop(future))
+                    futures[pool.submit(self._run_chunk, chunk)] = chunk[0].id
+                for future in as_completed(futures):
+                    collect(future, futures[future])
+        
+        if not leads_processed:
             return {
                 "success": True,
                 "leads_processed": 0,
                 "actions_taken": 0,
                 "activities": [],
-                "message": "No prospects found in system"
+                "message": "No prospects need action right now"
             }
         
-        actions_taken = 0
-        for lead in leads:
-            try:
-                result = self.run_for_lead(lead.id)
-                if result.get("action_performed"):
-                    actions_taken += 1
-            except Exception as e:
-                logger.error(f"Critical fail for lead {lead.id}: {e}")
-                
         return {
             "success": True,
-            "leads_processed": len(leads),
+            "leads_processed": leads_processed,
             "actions_taken": actions_taken,
             "activities": self.activities,
-            "message": f"Cycle complete. {actions_taken} actions performed across {len(leads)} leads."
+            "message": f"Cycle complete. {actions_taken} actions performed across {leads_processed} leads."
         }
 
-    def run_for_lead(self, lead_id: int, force_context: Optional[str] = None) -> Dict:
-        """Execute the AI workflow for a specific prospect."""
-        from agents.workflow import agent_executors
+    def _stream_due_leads(self, chunk_size: int) -> Iterator[List[Lead]]:
+        """
+        Yield the user's leads that need an action, `chunk_size` at a time, in id order.
         
-        lead = self.db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == self.user_id).first()
+        Postgres streams them through one server-side cursor (yield_per). On SQLite
+        an open cursor would block the chunks' commits, so each chunk is a keyset
+        page (id > last id) read on a short-lived session. Either way the rows are
+        attached to the chunk sessions with merge(load=False), and free-text
+        columns stay deferred.
+        """
+        query = (
+            select(Lead)
+            .where(Lead.user_id == self.user_id, lead_classifier.needs_action_filter())
+            .options(*lead_scan_options())
+            .order_by(Lead.id)
+        )
+        
+        if self.db.get_bind().dialect.name != "sqlite":
+            loader = self.session_factory()
+            try:
+                result = loader.execute(query.execution_options(yield_per=chunk_size))
+                for partition in result.scalars().partitions():
+                    yield list(partition)
+            finally:
+                loader.close()
+            return
+        
+        last_id = 0
+        while True:
+            loader = self.session_factory()
+            try:
+                # Closing detaches the rows but keeps them populated
+                chunk = loader.execute(query.where(Lead.id > last_id).limit(chunk_size)).scalars().all()
+            finally:
+                loader.close()
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            last_id = chunk[-1].id
+
+    def _run_chunk(self, leads: List[Lead]) -> tuple[int, List[Dict]]:
+        """
+        Run a chunk of leads on a dedicated session (Session objects are not thread-safe).
+        
+        Emails are generated and sent before the chunk's transaction opens, which
+        then only records the outcomes: on SQLite its write lock is never held
+        across an LLM or provider round trip, so concurrent chunks do not stall.
+        """
+        if settings.DELIVERY_MODE != "outbox" and not comm_service.email_available():
+            # Fast-fail: skip generation too; the leads stay due and are picked up next cycle
+            logger.warning(f"Email provider unavailable, deferring {len(leads)} leads to the next cycle")
+            return 0, []
+        
+        # Claim each email before any generation; leads another worker has already
+        # emailed today (overlapping task, retry) are dropped here
+        contexts = {lead.id: self._email_context(lead) for lead in leads}
+        keys = self._claim_sends([(lead, "email", contexts[lead.id]) for lead in leads if contexts[lead.id]])
+        leads = [lead for lead in leads if not contexts[lead.id] or lead.id in keys]
+        
+        db = self.session_factory()
+        try:
+            worker = AgentRunner(db=db, user_id=self.user_id, session_factory=self.session_factory)
+            drafts = worker._draft_emails(leads, contexts)
+            # load=False attaches the already-fetched rows without a round trip
+            leads = [db.merge(lead, load=False) for lead in leads]
+            plans = {lead.id: worker._plan_lead(lead, draft=drafts.get(lead.id)) for lead in leads}
+            outbound = [(lead, plans[lead.id]) for lead in leads if plans[lead.id].get("email_body")]
+            use_outbox = settings.DELIVERY_MODE == "outbox"
+            email_results = {} if use_outbox else worker._send_emails(outbound, keys)
+            
+            begin_transaction(db)
+            applied = {
+                lead.id: worker._apply_lead(lead, plans[lead.id], email_results.get(lead.id))
+                for lead in leads
+            }
+            if use_outbox:
+                outbound = [(lead, plan) for lead, plan in outbound if applied[lead.id]["success"]]
+                worker._enqueue_emails(outbound, keys)
+                sent = {lead.id: None for lead, _ in outbound}
+            else:
+                # Keys follow the provider, even if recording a lead failed
+                sent = {
+                    lead_id: email_result.get("id")
+                    for lead_id, email_result in email_results.items() if email_result.get("success")
+                }
+            worker._settle_sends(keys, sent)
+            worker.sink.flush(db)
+            db.commit()
+            return len(sent), worker.activities
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _email_context(lead: Lead) -> Optional[str]:
+        """Email context the workflow will route a lead to (None when no email is due)."""
+        status = lead_classifier.classify_lead(lead.last_contacted_date)
+        return {"needs_followup": "followup", "stalled": "breakup"}.get(status)
+
+    def _draft_emails(self, leads: List[Lead], contexts: Optional[Dict[int, Optional[str]]] = None) -> Dict[int, str]:
+        """
+        Pre-generate a chunk's emails with batched LLM requests.
+        
+        Leads are grouped by the context the workflow will route them to (pass
+        `contexts` by lead id if already computed), so each group shares one prompt.
+        Returns bodies by lead id; leads without a draft are generated per lead by
+        the workflow as before.
+        """
+        if settings.EMAIL_BATCH_SIZE <= 1:
+            return {}
+        
+        groups: Dict[str, List[Lead]] = {}
+        for lead in leads:
+            context_type = contexts[lead.id] if contexts is not None else self._email_context(lead)
+            if context_type:
+                groups.setdefault(context_type, []).append(lead)
+        
+        drafts: Dict[int, str] = {}
+        for context_type, group in groups.items():
+            try:
+                bodies = email_generator.generate_emails(group, context_type=context_type)
+                drafts.update(zip((lead.id for lead in group), bodies))
+            except Exception as e:
+                logger.warning(f"Batched drafting failed for {len(group)} {context_type} leads: {e}")
+        return drafts
+
+    def _send_emails(
+        self,
+        outbound: List[Tuple[Lead, Dict[str, str]]],
+        keys: Optional[Dict[int, str]] = None
+    ) -> Dict[int, Dict]:
+        """
+        Send a chunk's follow-up wave through the batch email API.
+        
+        Args:
+            outbound: (lead, email) pairs; emails carry `email_subject` and `email_body`
+            keys: Idempotency key by lead id, forwarded to the provider
+        
+        Returns:
+            Provider result by lead id
+        """
+        if not outbound:
+            return {}
+        
+        keys = keys or {}
+        results = comm_service.send_email_batch([
+            {
+                "to_email": lead.email,
+                "subject": email["email_subject"],
+                "html_content": self._email_html(email["email_body"]),
+                "idempotency_key": keys.get(lead.id)
+            }
+            for lead, email in outbound
+        ])
+        return {lead.id: email_result for (lead, _), email_result in zip(outbound, results)}
+
+    def _claim_sends(self, steps: List[Tuple[Lead, str, str]]) -> Dict[int, str]:
+        """
+        Claim the idempotency key of each (lead, channel, step) about to be sent.
+        
+        The claim commits on its own session right away, so it must run before this
+        runner's transaction holds any write locks (SQLite has a single writer).
+        
+        Returns:
+            Claimed key by lead id; leads missing from it are already being (or have
+            been) sent by another worker and must be skipped
+        """
+        entries = [
+            {"key": make_key(lead.id, step), "user_id": self.user_id, "lead_id": lead.id, "channel": channel, "step": step}
+            for lead, channel, step in steps
+        ]
+        claimed = idempotency_store.claim(self.session_factory, entries)
+        return {entry["lead_id"]: entry["key"] for entry in entries if entry["key"] in claimed}
+
+    def _sent_before(self, steps: List[Tuple[Lead, str]]) -> Set[int]:
+        """Lead ids whose (lead, step) message already went out today, e.g. in a run that could not record it."""
+        keys = {make_key(lead.id, step): lead.id for lead, step in steps}
+        return {keys[key] for key in idempotency_store.sent(self.session_factory, list(keys))}
+
+    def _settle_sends(self, keys: Dict[int, str], sent: Dict[int, Optional[str]]) -> None:
+        """In this runner's transaction, mark the keys of sent leads ({lead_id: provider_id}) and release the rest."""
+        idempotency_store.mark_sent(
+            self.db, {keys[lead_id]: provider_id for lead_id, provider_id in sent.items() if lead_id in keys}
+        )
+        idempotency_store.release(self.db, [key for lead_id, key in keys.items() if lead_id not in sent])
+
+    def _enqueue_emails(
+        self,
+        outbound: List[Tuple[Lead, Dict[str, str]]],
+        keys: Optional[Dict[int, str]] = None,
+        sequence_step: Optional[int] = None
+    ) -> int:
+        """
+        Write a chunk's rendered emails to the outbox in the current transaction.
+        
+        Leads are stamped as contacted together with their message, so the next
+        cycle does not draft them again while delivery is pending. The delivery
+        workers log `sent_email` and re-stamp the lead once the provider accepts
+        the message, or restore its previous contact date (and, for a
+        `sequence_step`, put the lead back on that step) if delivery fails.
+        
+        Returns:
+            Number of emails queued
+        """
+        now = datetime.now(timezone.utc)
+        messages = []
+        for lead, email in outbound:
+            prior_contacted_at, lead.last_contacted_date = lead.last_contacted_date, now
+            messages.append({
+                "user_id": self.user_id,
+                "lead_id": lead.id,
+                "channel": "email",
+                "recipient": lead.email,
+                "subject": email["email_subject"],
+                "body": self._email_html(email["email_body"]),
+                "details": {"subject": email["email_subject"], "lead_name": lead.name},
+                "idempotency_key": (keys or {}).get(lead.id),
+                "prior_contacted_at": prior_contacted_at,
+                "contacted_at": now,
+                "sequence_id": lead.sequence_id if sequence_step is not None else None,
+                "sequence_step": sequence_step
+            })
+        return outbox.enqueue(self.db, messages)
+
+    def run_for_lead(
+        self,
+        lead_id: int,
+        force_context: Optional[str] = None,
+        lead: Optional[Lead] = None,
+        idempotency_step: Optional[str] = None,
+        sequence_step: Optional[int] = None
+    ) -> Dict:
+        """
+        Execute the AI workflow for a specific prospect.
+        
+        Pass an already-loaded `lead` (attached to this runner's session) to skip the lookup query.
+        With DELIVERY_MODE=outbox the email is queued in the same commit instead of sent inline.
+        
+        The email is keyed on lead, `idempotency_step` (defaults to the context) and
+        day; if another run already claimed that key, nothing is generated or sent
+        and the result is marked `duplicate`. If that run already sent it, the
+        result is also `already_sent`, and succeeds so the caller can move on.
+        
+        `action_performed` is True only if the email was sent (or queued); a send
+        the provider rejected fails, and one held back by an open circuit is also
+        marked `deferred`.
+        
+        Pass the `sequence_step` the email runs so a queued message that fails
+        delivery puts the lead back on it.
+        """
+        if lead is None:
+            lead = self.db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == self.user_id).first()
         if not lead:
             return {"success": False, "error": "Prospect not identified"}
+        
+        keys: Dict[int, str] = {}
+        step = idempotency_step or force_context or self._email_context(lead)
+        if step:
+            keys = self._claim_sends([(lead, "email", step)])
+            if lead.id not in keys:
+                if self._sent_before([(lead, step)]):
+                    logger.info(f"Skipping prospect {lead.id}: '{step}' email already sent today")
+                    return {"success": True, "action_performed": False, "duplicate": True, "already_sent": True}
+                logger.info(f"Skipping prospect {lead.id}: '{step}' email already claimed today")
+                return {"success": False, "duplicate": True, "error": "Duplicate send suppressed"}
+        
+        use_outbox = settings.DELIVERY_MODE == "outbox"
+        plan = self._plan_lead(lead, force_context=force_context)
+        email_result = None
+        if plan.get("email_body") and not use_outbox:
+            # PRO-TIP: Use the unified comm_service for all outreach
+            email_result = comm_service.send_email(
+                to_email=lead.email,
+                subject=plan["email_subject"],
+                html_content=self._email_html(plan["email_body"]),
+                idempotency_key=keys.get(lead.id)
+            )
+        
+        # Only the outcome is written, after the provider round trip
+        begin_transaction(self.db)
+        result = self._apply_lead(lead, plan, email_result)
+        sent: Dict[int, Optional[str]] = {}
+        if plan.get("email_body") and use_outbox and result["success"]:
+            self._enqueue_emails([(lead, plan)], keys, sequence_step)
+            result.update(action_performed=True, queued=True)
+            sent[lead.id] = None
+        elif email_result and email_result.get("success"):
+            sent[lead.id] = email_result.get("id")
+        self._settle_sends(keys, sent)
+        self.sink.flush(self.db)
+        self.db.commit()
+        return result
 
+    def _plan_lead(self, lead: Lead, force_context: Optional[str] = None, draft: Optional[str] = None) -> Dict:
+        """
+        Run the workflow for one lead, LLM generation included, without writing anything.
+        
+        A pre-generated `draft` replaces the workflow's own email generation.
+        
+        Returns:
+            The workflow's final state (`status`, `email_subject`, `email_body`), or
+            {"error": ...} if it failed
+        """
+        from agents.workflow import agent_executors
+        
         try:
             # 1. State Initialization
             initial_state = {
                 "lead": lead,
                 "days_since_contact": 0,
                 "status": lead.status,
-                "email_body": "",
+                "email_body": draft or "",
                 "email_subject": "",
                 "action_taken": "analyzing",
                 "discovery_results": []
@@ -79,114 +444,237 @@ class AgentRunner:
             if force_context:
                 email_body = email_generator.generate_email(lead, context_type=force_context)
                 subject = f"Connecting - {lead.name}" if force_context == "cold_mail" else f"Re: {lead.company} - {lead.name}"
-                final_state = {**initial_state, "email_body": email_body, "email_subject": subject, "action_taken": force_context}
-            else:
-                final_state = agent_executors.run.invoke(initial_state)
+                return {**initial_state, "email_body": email_body, "email_subject": subject, "action_taken": force_context}
+            return agent_executors.run.invoke(initial_state)
+        except Exception as e:
+            logger.error(f"Strategic failure for prospect {lead.id}: {e}")
+            return {"error": str(e)}
 
+    def _apply_lead(self, lead: Lead, plan: Dict, email_result: Optional[Dict] = None) -> Dict:
+        """
+        Record one lead's planned outcome; shared by single-lead runs and cycles.
+        
+        Runs inside a SAVEPOINT and leaves the outer commit to the caller; activity
+        rows are handed to the sink only once the savepoint has been released.
+        
+        Args:
+            plan: Result of `_plan_lead`
+            email_result: Provider result of the email sent for the lead, if one was
+        """
+        lead_id, lead_name = lead.id, lead.name
+        if "error" in plan:
+            return self._record_failure(lead_id, lead_name, plan["error"])
+        
+        savepoint = self.db.begin_nested()
+        try:
             # 3. Status Synchronization
-            if lead.status != final_state["status"]:
-                lead.status = final_state["status"]
+            if lead.status != plan["status"]:
+                lead.status = plan["status"]
                 self._log_activity(
                     lead_id=lead.id,
+                    lead_name=lead.name,
                     action_type="classified",
                     details={
-                        "new_status": final_state["status"],
-                        "category": final_state["status"]
+                        "new_status": plan["status"],
+                        "category": plan["status"]
                     }
                 )
             
+            # 4. Multi-Channel Dispatch outcome
             action_performed = False
+            if email_result is not None:
+                action_performed = self._record_email_result(lead, plan["email_subject"], email_result)
             
-            # 4. Multi-Channel Dispatch
-            if final_state["email_body"]:
-                # PRO-TIP: Use the unified comm_service for all outreach
-                email_result = comm_service.send_email(
-                    to_email=lead.email,
-                    subject=final_state["email_subject"],
-                    html_content=f"<div style='font-family: sans-serif;'>{final_state['email_body'].replace(chr(10), '<br>')}</div>"
-                )
-                
-                if email_result["success"]:
-                    action_performed = True
-                    lead.last_contacted_date = datetime.now(timezone.utc)
-                    self._log_activity(
-                        lead_id=lead.id,
-                        action_type="sent_email",
-                        details={
-                            "subject": final_state["email_subject"],
-                            "email_id": email_result.get("id"),
-                            "lead_name": lead.name
-                        }
-                    )
-                else:
-                    self._log_activity(
-                        lead_id=lead.id,
-                        action_type="error",
-                        details={"error": email_result.get("error")}
-                    )
-            
-            self.db.commit()
-            return {"success": True, "action_performed": action_performed}
+            savepoint.commit()
                         
         except Exception as e:
             logger.error(f"Strategic failure for prospect {lead_id}: {e}")
+            # Also valid when a failed flush has already deactivated the savepoint
+            savepoint.rollback()
+            self._staged_activities.clear()
+            return self._record_failure(lead_id, lead_name, str(e))
+
+        self._publish_activities()
+        if action_performed:
+            return {"success": True, "action_performed": True, "email_id": email_result.get("id")}
+        if email_result is not None:
+            # Not sent: callers must not treat the lead as contacted (deferred ones retry next cycle)
+            return {"success": False, "error": email_result.get("error"), "deferred": bool(email_result.get("deferred"))}
+        return {"success": True, "action_performed": False}
+
+    def _record_failure(self, lead_id: int, lead_name: str, error: str) -> Dict:
+        self._log_activity(
+            lead_id=lead_id,
+            lead_name=lead_name,
+            action_type="error",
+            details={"error_message": error}
+        )
+        self._publish_activities()
+        return {"success": False, "error": error}
+
+    def _record_email_result(self, lead: Lead, subject: str, email_result: Dict) -> bool:
+        """Stamp the lead and stage the activity row for one send attempt; True if it was sent."""
+        if email_result.get("deferred"):
+            # Provider circuit is open: leave the lead untouched so the next cycle retries it
+            logger.info(f"Email to prospect {lead.id} deferred: {email_result.get('error')}")
+            return False
+        
+        if email_result["success"]:
+            lead.last_contacted_date = datetime.now(timezone.utc)
             self._log_activity(
-                lead_id=lead_id,
-                action_type="error",
-                details={"error_message": str(e)}
+                lead_id=lead.id,
+                action_type="sent_email",
+                details={
+                    "subject": subject,
+                    "email_id": email_result.get("id"),
+                    "lead_name": lead.name
+                }
             )
-            self.db.rollback()
-            return {"success": False, "error": str(e)}
+            return True
+        
+        self._log_activity(
+            lead_id=lead.id,
+            lead_name=lead.name,
+            action_type="error",
+            details={"error": email_result.get("error")}
+        )
+        return False
+
+    @staticmethod
+    def _email_html(body: str) -> str:
+        return f"<div style='font-family: sans-serif;'>{body.replace(chr(10), '<br>')}</div>"
 
     def run_whatsapp_action(self, lead_id: int, template_name: str) -> Dict:
         """Execute an automated WhatsApp outreach."""
         lead = self.db.query(Lead).filter(Lead.id == lead_id, Lead.user_id == self.user_id).first()
-        if not lead or not lead.phone:
+        if not lead:
             return {"success": False, "error": "Contact info missing (Phone required for WhatsApp)"}
+        return self.run_whatsapp_actions([(lead, template_name)])[lead.id]
 
-        try:
-            # Generate personalized message
-            message = email_generator.generate_email(lead, context_type=template_name)
-            
-            # Send via Twilio
-            result = comm_service.send_whatsapp(to_phone=lead.phone, message=message)
+    def run_whatsapp_actions(
+        self,
+        steps: List[Tuple[Lead, str]],
+        step_keys: Optional[Dict[int, str]] = None,
+        sequence_steps: Optional[Dict[int, int]] = None
+    ) -> Dict[int, Dict]:
+        """
+        Execute WhatsApp outreach for many leads, sending concurrently.
+        
+        Messages are generated first; the sends are then all dispatched at once
+        (Twilio on the rate-limited dispatch pool, Meta on the pooled async client)
+        and gathered, and the results are committed together.
+        
+        Args:
+            steps: (lead, template_name) pairs; leads must belong to this runner's session
+            step_keys: Idempotency step by lead id (defaults to "whatsapp:<template_name>");
+                leads whose step was already claimed today are skipped as `duplicate`
+                (successful and `already_sent` if that message went out)
+            sequence_steps: Sequence step each lead's message runs, by lead id; a
+                queued message that fails delivery puts the lead back on it
+        
+        Returns:
+            Result per lead id
+        """
+        results: Dict[int, Dict] = {}
+        reachable: List[Tuple[Lead, str]] = []
+        for lead, template_name in steps:
+            if not lead.phone:
+                results[lead.id] = {"success": False, "error": "Contact info missing (Phone required for WhatsApp)"}
+            else:
+                reachable.append((lead, template_name))
+        
+        step_keys = step_keys or {}
+        steps = {lead.id: step_keys.get(lead.id) or f"whatsapp:{template_name}" for lead, template_name in reachable}
+        keys = self._claim_sends([(lead, "whatsapp", steps[lead.id]) for lead, _ in reachable])
+        sent_before = self._sent_before([(lead, steps[lead.id]) for lead, _ in reachable if lead.id not in keys])
+        pending: List[Tuple[Lead, str]] = []
+        for lead, template_name in reachable:
+            if lead.id in sent_before:
+                results[lead.id] = {"success": True, "duplicate": True, "already_sent": True}
+                continue
+            if lead.id not in keys:
+                results[lead.id] = {"success": False, "duplicate": True, "error": "Duplicate send suppressed"}
+                continue
+            try:
+                # Generate personalized message
+                pending.append((lead, email_generator.generate_email(lead, context_type=template_name)))
+            except Exception as e:
+                logger.error(f"WhatsApp execution failed: {e}")
+                results[lead.id] = {"success": False, "error": str(e)}
+        
+        now = datetime.now(timezone.utc)
+        if settings.DELIVERY_MODE == "outbox":
+            rows = []
+            for lead, message in pending:
+                prior_contacted_at, lead.last_contacted_date = lead.last_contacted_date, now
+                rows.append({
+                    "user_id": self.user_id,
+                    "lead_id": lead.id,
+                    "channel": "whatsapp",
+                    "recipient": lead.phone,
+                    "body": message,
+                    "details": {"channel": "WhatsApp", "content_preview": message[:50] + "...", "lead_name": lead.name},
+                    "idempotency_key": keys[lead.id],
+                    "prior_contacted_at": prior_contacted_at,
+                    "contacted_at": now,
+                    "sequence_id": lead.sequence_id if lead.id in (sequence_steps or {}) else None,
+                    "sequence_step": (sequence_steps or {}).get(lead.id)
+                })
+                results[lead.id] = {"success": True, "queued": True}
+            outbox.enqueue(self.db, rows)
+            self._settle_sends(keys, {lead.id: None for lead, _ in pending})
+            self.db.commit()
+            return results
+        
+        sent: Dict[int, Optional[str]] = {}
+        futures = [comm_service.dispatch_whatsapp(to_phone=lead.phone, message=message) for lead, message in pending]
+        for (lead, message), future in zip(pending, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
             
-            if result["success"]:
-                lead.last_contacted_date = datetime.now(timezone.utc)
+            if result.get("deferred"):
+                logger.info(f"WhatsApp to prospect {lead.id} deferred: {result.get('error')}")
+                results[lead.id] = {"success": False, "error": result.get("error"), "deferred": True}
+            elif result["success"]:
+                lead.last_contacted_date = now
                 self._log_activity(
                     lead_id=lead.id,
+                    lead_name=lead.name,
                     action_type="custom_email_sent", # Using this type for activity log consistency or create 'whatsapp_sent'
                     details={
                         "channel": "WhatsApp",
                         "content_preview": message[:50] + "...",
-                        "sid": result.get("sid")
+                        "sid": result.get("id")
                     }
                 )
-                self.db.commit()
-                return {"success": True}
+                results[lead.id] = {"success": True}
+                sent[lead.id] = result.get("id")
             else:
-                return {"success": False, "error": result.get("error")}
-
-        except Exception as e:
-            logger.error(f"WhatsApp execution failed: {e}")
-            return {"success": False, "error": str(e)}
-    
-    def _log_activity(self, lead_id: int, action_type: str, details: Dict):
-        """Standardized activity logging into database and memory."""
-        lead = self.db.query(Lead).filter(Lead.id == lead_id).first()
-        if lead and "lead_name" not in details:
-            details["lead_name"] = lead.name
-
-        activity_log = ActivityLog(
-            user_id=self.user_id,
-            lead_id=lead_id,
-            action_type=action_type,
-            details=details
-        )
-        self.db.add(activity_log)
+                logger.error(f"WhatsApp send failed for prospect {lead.id}: {result.get('error')}")
+                results[lead.id] = {"success": False, "error": result.get("error")}
         
-        self.activities.append({
+        self._publish_activities()
+        self._settle_sends(keys, sent)
+        self.sink.flush(self.db)
+        self.db.commit()
+        return results
+    
+    def _log_activity(self, lead_id: int, action_type: str, details: Dict, lead_name: Optional[str] = None):
+        """Standardized activity logging; rows are staged until the lead's work commits."""
+        if lead_name and "lead_name" not in details:
+            details["lead_name"] = lead_name
+
+        self._staged_activities.append({
             "lead_id": lead_id,
             "action_type": action_type,
             "details": details
         })
+
+    def _publish_activities(self):
+        """Move staged activity rows into the sink and the in-memory run summary."""
+        for activity in self._staged_activities:
+            self.sink.add(user_id=self.user_id, **activity)
+            self.activities.append(activity)
+        self._staged_activities = []
@@ -1,12 +1,33 @@
 """Email generation using Groq LLM."""
-from groq import Groq
+import asyncio
+import json
+import httpx
+from groq import AsyncGroq
+from loguru import logger
 from config import get_settings
-from typing import Any, Literal, List, Dict
+from services.event_loop import background_loop
+from services.fake_providers import fake_providers
+from services.llm_cache import llm_cache
+from services.rate_limiter import groq_limiter
+from typing import Any, Literal, List, Dict, Optional, Tuple
 
 settings = get_settings()
 
-# Initialize Groq client
-client = Groq(api_key=settings.GROQ_API_KEY)
+# Initialize the Groq client (explicit timeouts, pooled keep-alive connections).
+# With FAKE_PROVIDERS including groq, it talks to the offline fake transport instead.
+async_client = AsyncGroq(
+    api_key=settings.GROQ_API_KEY,
+    timeout=settings.GROQ_TIMEOUT_SECONDS,
+    max_retries=settings.GROQ_MAX_RETRIES,
+    http_client=httpx.AsyncClient(
+        timeout=settings.GROQ_TIMEOUT_SECONDS,
+        limits=httpx.Limits(
+            max_connections=settings.GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GROQ_MAX_CONNECTIONS
+        ),
+        transport=fake_providers.transport("groq")
+    )
+)
 
 
 class EmailGenerator:
@@ -30,6 +51,16 @@ Context Structure:
 - Provide a quick piece of social proof or a demo result.
 - End with a low-friction CTA."""
     
+    BATCH_INSTRUCTIONS = """
+
+You will receive several recipients, each under a "### Recipient <id>" header.
+Write one separate email per recipient, following the rules above for each.
+Return JSON only, in exactly this shape:
+{"emails": [{"id": <recipient id>, "body": "<plain-text email>"}]}"""
+    
+    TEMPERATURE = 0.7
+    MAX_TOKENS = 300  # Per email; batched requests scale this by the batch size
+    
     @staticmethod
     def generate_email(
         lead: Any,  # Lead model instance
@@ -37,6 +68,178 @@ Context Structure:
     ) -> str:
         """
         Generate a tailored cold email using the B2B SDR persona.
+        
+        Sync wrapper for threaded callers: the request runs on the shared async
+        client, so concurrent agent-cycle workers share one connection pool.
+        """
+        messages, fallback = EmailGenerator._prepare_email(lead, context_type)
+        return background_loop.run(EmailGenerator._complete_email(messages, fallback))
+
+    @staticmethod
+    async def agenerate_email(
+        lead: Any,  # Lead model instance
+        context_type: str = "followup"
+    ) -> str:
+        """
+        Async variant of `generate_email`; safe to await from any event loop
+        (taskiq workers, FastAPI) and to gather for many leads at once.
+        """
+        messages, fallback = EmailGenerator._prepare_email(lead, context_type)
+        return await background_loop.wrap(EmailGenerator._complete_email(messages, fallback))
+
+    @staticmethod
+    def generate_emails(
+        leads: List[Any],  # Lead model instances
+        context_type: str = "followup"
+    ) -> List[str]:
+        """
+        Generate emails for many leads sharing one `context_type`.
+        
+        Up to EMAIL_BATCH_SIZE leads are packed into a single structured-output
+        request, so the system prompt is sent once per batch instead of once per lead.
+        
+        Returns:
+            Email bodies in the same order as `leads`
+        """
+        prepared = [EmailGenerator._prepare_email(lead, context_type) for lead in leads]
+        return background_loop.run(EmailGenerator._complete_emails(prepared))
+
+    @staticmethod
+    async def agenerate_emails(
+        leads: List[Any],  # Lead model instances
+        context_type: str = "followup"
+    ) -> List[str]:
+        """Async variant of `generate_emails`."""
+        prepared = [EmailGenerator._prepare_email(lead, context_type) for lead in leads]
+        return await background_loop.wrap(EmailGenerator._complete_emails(prepared))
+
+    @staticmethod
+    async def _complete_email(messages: List[Dict[str, str]], fallback: str) -> str:
+        """
+        Run the chat completion on the pooled async client, falling back to the template text.
+        
+        Identical prompts (retries, re-runs, sequence replays) are served from `llm_cache`;
+        fallback copy is never cached.
+        """
+        cache_key = llm_cache.make_key(messages, settings.GROQ_MODEL, EmailGenerator.TEMPERATURE)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        return await EmailGenerator._request_email(messages, fallback, cache_key)
+
+    @staticmethod
+    async def _complete_emails(prepared: List[Tuple[List[Dict[str, str]], str]]) -> List[str]:
+        """Serve cached leads, then generate the rest in concurrent batches of EMAIL_BATCH_SIZE."""
+        batch_size = max(1, settings.EMAIL_BATCH_SIZE)
+        bodies: List[Optional[str]] = [None] * len(prepared)
+        pending: List[Tuple[int, List[Dict[str, str]], str, str]] = []
+        
+        for index, (messages, fallback) in enumerate(prepared):
+            # Keyed like a single-lead request, so batched and per-lead calls share entries
+            cache_key = llm_cache.make_key(messages, settings.GROQ_MODEL, EmailGenerator.TEMPERATURE)
+            bodies[index] = llm_cache.get(cache_key)
+            if bodies[index] is None:
+                pending.append((index, messages, fallback, cache_key))
+        
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        results = await asyncio.gather(*(EmailGenerator._complete_batch(batch) for batch in batches))
+        for batch, batch_bodies in zip(batches, results):
+            for (index, _, _, _), body in zip(batch, batch_bodies):
+                bodies[index] = body
+        return bodies
+
+    @staticmethod
+    async def _complete_batch(batch: List[Tuple[int, List[Dict[str, str]], str, str]]) -> List[str]:
+        """
+        Generate one batch with a single JSON-mode request.
+        
+        Recipients missing from the response, or the whole batch if it fails to
+        parse, fall back to per-lead requests.
+        """
+        if len(batch) == 1:
+            _, messages, fallback, cache_key = batch[0]
+            return [await EmailGenerator._request_email(messages, fallback, cache_key)]
+        
+        recipients = "\n\n".join(
+            f"### Recipient {position}\n{messages[-1]['content'].strip()}"
+            for position, (_, messages, _, _) in enumerate(batch)
+        )
+        messages = [
+            {"role": "system", "content": EmailGenerator.SYSTEM_PROMPT + EmailGenerator.BATCH_INSTRUCTIONS},
+            {"role": "user", "content": recipients}
+        ]
+        max_tokens = EmailGenerator.MAX_TOKENS * len(batch)
+        try:
+            await groq_limiter.acquire(groq_limiter.estimate_tokens(messages, max_tokens))
+            chat_completion = await async_client.chat.completions.create(
+                messages=messages,
+                model=settings.GROQ_MODEL,
+                temperature=EmailGenerator.TEMPERATURE,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}
+            )
+            generated = EmailGenerator._parse_batch(chat_completion.choices[0].message.content, len(batch))
+        except Exception as e:
+            logger.warning(f"Batched generation failed for {len(batch)} leads, retrying per lead: {e}")
+            generated = {}
+        
+        for position, (_, _, _, cache_key) in enumerate(batch):
+            if position in generated:
+                llm_cache.set(cache_key, generated[position])
+        
+        missing = [position for position in range(len(batch)) if position not in generated]
+        if missing and generated:
+            logger.warning(f"Batch response missed {len(missing)} of {len(batch)} leads, retrying per lead")
+        retried = await asyncio.gather(*(EmailGenerator._request_email(*batch[position][1:]) for position in missing))
+        generated.update(zip(missing, retried))
+        return [generated[position] for position in range(len(batch))]
+
+    @staticmethod
+    def _parse_batch(raw_response: str, count: int) -> Dict[int, str]:
+        """Map recipient ids to email bodies, ignoring malformed or unknown entries."""
+        data = json.loads(raw_response)
+        emails = data.get("emails") if isinstance(data, dict) else data
+        if not isinstance(emails, list):
+            raise ValueError("Batch response has no 'emails' list")
+        
+        generated = {}
+        for item in emails:
+            if not isinstance(item, dict) or not isinstance(item.get("body"), str) or not item["body"].strip():
+                continue
+            try:
+                position = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= position < count:
+                generated[position] = item["body"].strip()
+        return generated
+
+    @staticmethod
+    async def _request_email(messages: List[Dict[str, str]], fallback: str, cache_key: str) -> str:
+        """Uncached single-lead completion; successful results are written to the cache."""
+        try:
+            # Wait for RPM/TPM capacity instead of drawing a 429 and the fallback copy
+            await groq_limiter.acquire(groq_limiter.estimate_tokens(messages, EmailGenerator.MAX_TOKENS))
+            chat_completion = await async_client.chat.completions.create(
+                messages=messages,
+                model=settings.GROQ_MODEL,
+                temperature=EmailGenerator.TEMPERATURE,
+                max_tokens=EmailGenerator.MAX_TOKENS
+            )
+            email_body = chat_completion.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning(f"Email generation failed, using fallback copy: {e}")
+            return fallback
+        
+        llm_cache.set(cache_key, email_body)
+        return email_body
+
+    @staticmethod
+    def _prepare_email(lead: Any, context_type: str) -> Tuple[List[Dict[str, str]], str]:
+        """
+        Build the chat messages and the fallback copy for a lead.
+        
+        Runs in the caller's thread so ORM attributes are never read from the loop thread.
         """
         # Determine the core pitch based on contact type
         is_recruiter = lead.contact_type in ["recruiter", "hr"]
@@ -64,29 +267,26 @@ Context Structure:
         Draft the email following the B2B SDR rules strictly. No "hope you're well". Direct and human.
         """
         
-        try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": EmailGenerator.SYSTEM_PROMPT},
-                    {"role": "user", "content": prompt}
-                ],
-                model=settings.GROQ_MODEL,
-                temperature=0.7,
-                max_tokens=300
-            )
-            return chat_completion.choices[0].message.content.strip()
-        except Exception as e:
-            # Fallback (Short & SDR-style)
-            if is_recruiter:
-                return f"Hi {lead.name},\n\nNoticed you're hiring for technical roles at {lead.company or 'your company'}. I'm an SDE with deep experience in {lead.tech_stack or 'modern web stacks'}.\n\nDo you have a few minutes this week to see if my background fits any current openings?\n\nBest,"
-            else:
-                return f"Hi {lead.name},\n\nSaw {lead.company or 'your team'} is looking to streamline operations. I build custom AI agents that automate manual outreach and lead processing.\n\nWorth a 10-minute chat to see if we can save your team some time?\n\nBest,"
+        messages = [
+            {"role": "system", "content": EmailGenerator.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        
+        # Fallback (Short & SDR-style)
+        if is_recruiter:
+            fallback = f"Hi {lead.name},\n\nNoticed you're hiring for technical roles at {lead.company or 'your company'}. I'm an SDE with deep experience in {lead.tech_stack or 'modern web stacks'}.\n\nDo you have a few minutes this week to see if my background fits any current openings?\n\nBest,"
+        else:
+            fallback = f"Hi {lead.name},\n\nSaw {lead.company or 'your team'} is looking to streamline operations. I build custom AI agents that automate manual outreach and lead processing.\n\nWorth a 10-minute chat to see if we can save your team some time?\n\nBest,"
+        
+        return messages, fallback
 
 
     @staticmethod
-    def parse_search_results(results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    async def parse_search_results(results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
         """
         Use LLM to parse raw search results into structured lead objects.
+        
+        Async so the rate limiter's wait never blocks the caller's event loop (FastAPI).
         """
         if not results:
             return []
@@ -110,17 +310,23 @@ Context Structure:
         Return ONLY a JSON list of objects. No other text.
         """
         
-        try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "You are a data extraction assistant. Return JSON only."},
-                    {"role": "user", "content": prompt}
-                ],
+        messages = [
+            {"role": "system", "content": "You are a data extraction assistant. Return JSON only."},
+            {"role": "user", "content": prompt}
+        ]
+        
+        async def complete():
+            # Shares the RPM/TPM budget with email generation (~1k tokens of JSON back)
+            await groq_limiter.acquire(groq_limiter.estimate_tokens(messages, 1024))
+            return await async_client.chat.completions.create(
+                messages=messages,
                 model=settings.GROQ_MODEL,
                 temperature=0,
                 response_format={"type": "json_object"}
             )
-            import json
+        
+        try:
+            chat_completion = await background_loop.wrap(complete())
             raw_response = chat_completion.choices[0].message.content.strip()
             data = json.loads(raw_response)
             # Handle if LLM wraps in a root key
@@ -1,6 +1,11 @@
 """Lead classification logic based on deterministic rules."""
-from datetime import datetime, timezone
-from typing import Literal
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Literal, Optional
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+from models.lead import Lead
+from models.activity_log import ActivityLog
 from config import get_settings
 
 settings = get_settings()
@@ -58,6 +63,94 @@ class LeadClassifier:
             last_contacted_date = last_contacted_date.replace(tzinfo=timezone.utc)
         
         return (now - last_contacted_date).days
+    
+    @staticmethod
+    def _cutoffs(now: Optional[datetime] = None) -> Dict[str, datetime]:
+        """
+        Translate the day thresholds into last_contacted_date boundaries.
+        
+        `(now - date).days <= N` holds exactly when `date > now - (N + 1) days`.
+        """
+        now = now or datetime.now(timezone.utc)
+        return {
+            "active_after": now - timedelta(days=settings.ACTIVE_DAYS_THRESHOLD + 1),
+            "followup_after": now - timedelta(days=settings.NEEDS_FOLLOWUP_MAX_DAYS + 1),
+            "followup_until": now - timedelta(days=settings.NEEDS_FOLLOWUP_MIN_DAYS),
+        }
+    
+    @staticmethod
+    def status_expression(now: Optional[datetime] = None) -> ColumnElement[str]:
+        """SQL CASE expression equivalent to `classify_lead`."""
+        cutoffs = LeadClassifier._cutoffs(now)
+        contacted = Lead.last_contacted_date
+        
+        return case(
+            (contacted.is_(None), "stalled"),
+            (contacted > cutoffs["active_after"], "active"),
+            (and_(contacted > cutoffs["followup_after"], contacted <= cutoffs["followup_until"]), "needs_followup"),
+            else_="stalled"
+        )
+    
+    @staticmethod
+    def needs_action_filter(now: Optional[datetime] = None) -> ColumnElement[bool]:
+        """
+        SQL predicate matching leads the agent would act on.
+        
+        Mirrors `classify_lead`: a lead is skipped only when it is active
+        (contacted within ACTIVE_DAYS_THRESHOLD days) and already stored as such,
+        so active leads never have to be loaded to be skipped.
+        """
+        cutoffs = LeadClassifier._cutoffs(now)
+        
+        return or_(
+            Lead.last_contacted_date.is_(None),
+            Lead.last_contacted_date <= cutoffs["active_after"],
+            Lead.status.is_(None),
+            Lead.status != "active"  # Recently contacted but stored status is stale
+        )
+    
+    @staticmethod
+    def reclassify_all(db: Session, now: Optional[datetime] = None) -> Dict[int, Dict[str, int]]:
+        """
+        Recompute `status` for every lead with set-based SQL (no LLM, no graph).
+        
+        Writes one summary ActivityLog row per affected user instead of one per lead.
+        
+        Returns:
+            {user_id: {new_status: leads_moved}} for users whose leads changed
+        """
+        new_status = LeadClassifier.status_expression(now)
+        is_stale = Lead.status.is_distinct_from(new_status)
+        
+        # 1. Tally the transitions per user before they are applied
+        summary: Dict[int, Dict[str, int]] = {}
+        stale = select(Lead.user_id, new_status.label("new_status")).where(is_stale).subquery()
+        transitions = db.execute(
+            select(stale.c.user_id, stale.c.new_status, func.count()).group_by(stale.c.user_id, stale.c.new_status)
+        ).all()
+        for user_id, status, count in transitions:
+            summary.setdefault(user_id, {})[status] = count
+        
+        if not summary:
+            return summary
+        
+        # 2. One UPDATE ... CASE for the whole table
+        db.execute(
+            update(Lead).where(is_stale).values(status=new_status).execution_options(synchronize_session=False)
+        )
+        
+        # 3. Summary rows in the same transaction
+        db.execute(insert(ActivityLog), [
+            {
+                "user_id": user_id,
+                "lead_id": None,
+                "action_type": "reclassified",
+                "details": {"moved_to": moved_to, "leads_updated": sum(moved_to.values())}
+            }
+            for user_id, moved_to in summary.items()
+        ])
+        db.commit()
+        return summary
 
 
 # Singleton instance
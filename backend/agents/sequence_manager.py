@@ -1,66 +1,280 @@
+import uuid
+from sqlalchemy import and_, or_, update
 from sqlalchemy.orm import Session
-from models.lead import Lead
-from models.sequence import Sequence, SequenceStep
+from config import get_settings
+from models.lead import Lead, lead_scan_options
 from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
 from agents.agent_runner import AgentRunner
+from services.database import as_utc, lease_rows
+from services.sequence_cache import CachedStep, StepMap, sequence_cache
+from services.timer_queue import timer_queue
 from loguru import logger
 
+settings = get_settings()
+
 class SequenceManager:
     """Orchestrates the progression of multi-step automation protocols."""
     
     def __init__(self, db: Session):
         self.db = db
+        # Timers to arm once the transaction that scheduled them has committed
+        self._timers: Dict[int, Optional[datetime]] = {}
+
+    def advance_sequences(self, partition: int = 0, partitions: int = 1) -> int:
+        """
+        Standard Industry Pattern: Cron-friendly sequence stepper.
+        
+        Only leads whose `next_action_at` has passed are loaded (an indexed range
+        scan), so the cost follows the number of due leads, not enrolled ones. They
+        are leased in batches (see `_claim`) so several workers can advance
+        sequences at once: each runs its own partition (lead id modulo
+        `partitions`), and workers sharing a partition take disjoint batches.
+        
+        Each batch is one query for its leads; steps come from the in-process
+        sequence cache, keyed by (sequence_id, step_number). Due steps are then run
+        per user on a single AgentRunner, and each lead's next step is rescheduled.
+        
+        With a timer queue, steps normally fire from their timers (`advance_leads`)
+        and this pass is only the safety sweep; it also re-arms the timers of steps
+        due before the next sweep.
+        
+        Args:
+            partition: Partition to advance, 0 <= partition < partitions
+            partitions: Number of partitions the leads are split into
+        
+        Returns:
+            Number of due leads processed
+        """
+        logger.info(f"Sequence Engine: Scanning partition {partition + 1}/{partitions} for leads ready for next stage...")
+        processed = self._advance(lambda: self._claim(partition, partitions))
+        self._rearm_timers(partition, partitions)
+        return processed
+
+    def advance_leads(self, lead_ids: List[int]) -> int:
+        """
+        Advance the leads whose timers fired.
+        
+        Leads that are no longer due (rescheduled, left their sequence) or are
+        leased by another worker are skipped.
+        
+        Returns:
+            Number of due leads processed
+        """
+        return self._advance(lambda: self._claim(lead_ids=lead_ids))
 
-    def advance_sequences(self):
-        """Standard Industry Pattern: Cron-friendly sequence stepper."""
-        logger.info("Sequence Engine: Scanning for leads ready for next stage...")
+    def flush_timers(self):
+        """Arm the timers of leads scheduled since the last call; call after committing."""
+        if self._timers and timer_queue is not None:
+            timer_queue.schedule(self._timers)
+        self._timers = {}
+
+    def _advance(self, claim: Callable[[], Optional[str]]) -> int:
+        """Claim and advance batches until `claim` finds nothing, then release the leases."""
+        # Steps commit per lead; keep the scanned leads loaded instead of re-selecting each one
+        expire_on_commit = self.db.expire_on_commit
+        self.db.expire_on_commit = False
+        tokens: List[str] = []
+        processed = 0
+        try:
+            while True:
+                token = claim()
+                if not token:
+                    break
+                tokens.append(token)
+                processed += self._advance_batch(token)
+        finally:
+            self.db.expire_on_commit = expire_on_commit
+            self._release(tokens)
+        return processed
+
+    def _claim(self, partition: int = 0, partitions: int = 1, lead_ids: Optional[List[int]] = None) -> Optional[str]:
+        """
+        Lease the next batch of due leads in a partition (or among `lead_ids`) and commit the claim.
+        
+        Concurrent workers take disjoint batches (see `lease_rows`). Leases are held
+        until the pass ends, so leads whose step failed are not retaken by the same
+        pass; a worker that dies only loses them after SEQUENCE_LEASE_SECONDS.
         
-        # Get all leads currently active in a sequence
-        leads = self.db.query(Lead).filter(Lead.sequence_id.isnot(None)).all()
+        Returns:
+            The batch's claim token, or None if no due lead is left
+        """
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        claimable = and_(
+            Lead.sequence_id.isnot(None),
+            Lead.next_action_at <= now,
+            or_(Lead.sequence_locked_until.is_(None), Lead.sequence_locked_until < now)
+        )
+        if partitions > 1:
+            claimable = and_(claimable, Lead.id % partitions == partition)
+        if lead_ids is not None:
+            claimable = and_(claimable, Lead.id.in_(lead_ids))
+        claimed = lease_rows(self.db, Lead, claimable, Lead.next_action_at, settings.SEQUENCE_CLAIM_BATCH_SIZE, {
+            "sequence_claim_token": token,
+            "sequence_locked_until": now + timedelta(seconds=settings.SEQUENCE_LEASE_SECONDS)
+        })
+        return token if claimed else None
+
+    def _release(self, tokens: List[str]):
+        """Return leased leads to the scan; their `next_action_at` decides when they are due again."""
+        if not tokens:
+            return
+        try:
+            self.db.execute(
+                update(Lead)
+                .where(Lead.sequence_claim_token.in_(tokens))
+                .values(sequence_claim_token=None, sequence_locked_until=None),
+                execution_options={"synchronize_session": False}
+            )
+            self.db.commit()
+        except Exception as e:
+            # The leases expire on their own
+            self.db.rollback()
+            logger.error(f"Could not release sequence leases: {e}")
+
+    def _advance_batch(self, token: str) -> int:
+        """Run the due steps of one leased batch; returns the number of leads in it."""
+        leads = self.db.query(Lead).options(*lead_scan_options()).filter(Lead.sequence_claim_token == token).all()
+        steps = sequence_cache.step_map(self.db)
         
+        due_by_user: Dict[int, List[Tuple[Lead, CachedStep]]] = {}
         for lead in leads:
             try:
-                self._process_lead_sequence(lead)
+                next_step = self._due_step(lead, steps)
             except Exception as e:
                 logger.error(f"Engine failure for lead {lead.id}: {e}")
+                continue
+            if next_step:
+                due_by_user.setdefault(lead.user_id, []).append((lead, next_step))
+            else:
+                # Finished, or contacted since it was scheduled: move the due date
+                self.schedule(lead, steps)
+        
+        for user_id, due in due_by_user.items():
+            try:
+                self._run_user_steps(user_id, due, steps)
+            except Exception as e:
+                logger.error(f"Engine failure for steps of user {user_id}: {e}")
         
         self.db.commit()
+        
+        # Due steps that did not go out retry on a timer rather than waiting for the sweep
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SEQUENCE_RETRY_SECONDS)
+        for lead in leads:
+            self._timers.setdefault(lead.id, retry_at)
+        self.flush_timers()
+        return len(leads)
+
+    def _rearm_timers(self, partition: int, partitions: int):
+        """Re-arm the timers of steps due before the next sweep, in case Redis lost them."""
+        if timer_queue is None:
+            return
+        now = datetime.now(timezone.utc)
+        upcoming = self.db.query(Lead.id, Lead.next_action_at).filter(
+            Lead.sequence_id.isnot(None),
+            Lead.next_action_at > now,
+            Lead.next_action_at <= now + timedelta(seconds=settings.SEQUENCE_SWEEP_HORIZON_SECONDS)
+        )
+        if partitions > 1:
+            upcoming = upcoming.filter(Lead.id % partitions == partition)
+        timer_queue.schedule(dict(upcoming.all()))
+
+    def schedule(self, lead: Lead, steps: Optional[StepMap] = None):
+        """
+        Set `lead.next_action_at` to when its next step is due (None if not enrolled or finished).
+        
+        Call whenever a lead joins a sequence or runs a step. `steps` defaults to
+        the cached step map; the caller commits, then calls `flush_timers`.
+        """
+        self._set_next_action(lead, steps)
+        if lead.id is not None:
+            self._timers[lead.id] = lead.next_action_at
+
+    def _set_next_action(self, lead: Lead, steps: Optional[StepMap]):
+        if lead.sequence_id is None:
+            lead.next_action_at = None
+            return
+        
+        key = (lead.sequence_id, (lead.current_step_number or 0) + 1)
+        next_step = steps.get(key) if steps is not None else None
+        if next_step is None:
+            # Only end the schedule once the database agrees there is no next step
+            next_step = sequence_cache.step(self.db, *key)
+        
+        if not next_step:
+            lead.next_action_at = None
+        elif lead.last_contacted_date:
+            lead.next_action_at = as_utc(lead.last_contacted_date) + timedelta(days=next_step.wait_days)
+        else:
+            # Never contacted: due right away
+            lead.next_action_at = datetime.now(timezone.utc)
 
-    def _process_lead_sequence(self, lead: Lead):
+    def _due_step(self, lead: Lead, steps: StepMap) -> Optional[CachedStep]:
         """Determines if a lead is ready for the next action in their protocol."""
         
         # Fetch the next step in the assigned protocol
-        next_step_number = lead.current_step_number + 1
-        next_step = self.db.query(SequenceStep).filter(
-            SequenceStep.sequence_id == lead.sequence_id,
-            SequenceStep.step_number == next_step_number
-        ).first()
+        next_step = steps.get((lead.sequence_id, lead.current_step_number + 1))
 
         if not next_step:
             # End of the road for this sequence
-            return
+            return None
 
         # Time Check: Industry standard delay logic
         if lead.last_contacted_date:
-            wait_until = lead.last_contacted_date + timedelta(days=next_step.wait_days)
+            wait_until = as_utc(lead.last_contacted_date) + timedelta(days=next_step.wait_days)
             if datetime.now(timezone.utc) < wait_until:
-                return # Still in the waiting period
+                return None # Still in the waiting period
+
+        return next_step
 
-        # ACTION TRIGGER
-        logger.info(f"Signal: Triggering Stage {next_step_number} ({next_step.action_type}) for prospect {lead.id}")
+    def _run_user_steps(self, user_id: int, due: List[Tuple[Lead, CachedStep]], steps: StepMap):
+        """Run one user's due steps on a shared runner; WhatsApp steps go out in one concurrent wave."""
+        agent = AgentRunner(db=self.db, user_id=user_id)
+        whatsapp_steps: List[Tuple[Lead, CachedStep]] = []
         
-        agent = AgentRunner(db=self.db, user_id=lead.user_id)
+        for lead, step in due:
+            # ACTION TRIGGER
+            logger.info(f"Signal: Triggering Stage {step.step_number} ({step.action_type}) for prospect {lead.id}")
+            if step.action_type == 'whatsapp':
+                whatsapp_steps.append((lead, step))
+                continue
+            try:
+                self._run_email_step(agent, lead, step, steps)
+            except Exception as e:
+                logger.error(f"Engine failure for lead {lead.id}: {e}")
+        
+        if whatsapp_steps:
+            self._run_whatsapp_steps(agent, whatsapp_steps, steps)
+
+    def _run_email_step(self, agent: AgentRunner, lead: Lead, step: CachedStep, steps: StepMap):
         result = {"success": False}
 
-        if next_step.action_type == 'email':
-            # Dispatch follow-up email
-            result = agent.run_for_lead(lead_id=lead.id, force_context=next_step.template_name)
-        
-        elif next_step.action_type == 'whatsapp':
-            # Dispatch automated WhatsApp
-            result = agent.run_whatsapp_action(lead_id=lead.id, template_name=next_step.template_name)
+        if step.action_type == 'email':
+            # Dispatch follow-up email (the lead is already loaded on this session)
+            result = agent.run_for_lead(
+                lead_id=lead.id,
+                force_context=step.template_name,
+                lead=lead,
+                idempotency_step=f"sequence:{lead.sequence_id}:{step.step_number}",
+                sequence_step=step.step_number
+            )
+
+        if result.get("action_performed") or result.get("already_sent"):
+            # Progress the lead to the next stage only once the step's email went out (or was queued)
+            lead.current_step_number = step.step_number
+            self.schedule(lead, steps)
+            logger.info(f"Sync: Lead {lead.id} successfully transitioned to Stage {step.step_number}")
 
-        if result.get("success"):
-            # Progress the lead to the next stage
-            lead.current_step_number = next_step_number
-            logger.info(f"Sync: Lead {lead.id} successfully transitioned to Stage {next_step_number}")
+    def _run_whatsapp_steps(self, agent: AgentRunner, due: List[Tuple[Lead, CachedStep]], steps: StepMap):
+        """Send a user's due WhatsApp steps in one concurrent wave and advance the ones that went out."""
+        results = agent.run_whatsapp_actions(
+            [(lead, step.template_name) for lead, step in due],
+            step_keys={lead.id: f"sequence:{lead.sequence_id}:{step.step_number}" for lead, step in due},
+            sequence_steps={lead.id: step.step_number for lead, step in due}
+        )
+        for lead, step in due:
+            if results.get(lead.id, {}).get("success"):
+                lead.current_step_number = step.step_number
+                self.schedule(lead, steps)
+                logger.info(f"Sync: Lead {lead.id} successfully transitioned to Stage {step.step_number}")
@@ -43,7 +43,8 @@ def active_node(state: AgentState) -> AgentState:
 def followup_node(state: AgentState) -> AgentState:
     """Generates a follow-up email."""
     lead = state["lead"]
-    email_body = email_generator.generate_email(lead, context_type="followup")
+    # Cycles may pre-generate the body in a batched request
+    email_body = state.get("email_body") or email_generator.generate_email(lead, context_type="followup")
     subject = f"Following up - {lead.name}"
     
     return {
@@ -56,7 +57,8 @@ def followup_node(state: AgentState) -> AgentState:
 def breakup_node(state: AgentState) -> AgentState:
     """Generates a breakup email."""
     lead = state["lead"]
-    email_body = email_generator.generate_email(lead, context_type="breakup")
+    # Cycles may pre-generate the body in a batched request
+    email_body = state.get("email_body") or email_generator.generate_email(lead, context_type="breakup")
     subject = f"Checking in - {lead.name}"
     
     return {
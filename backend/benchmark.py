@@ -0,0 +1,333 @@
+"""
+Throughput benchmark for the agent cycle and the sequence engine.
+
+Seeds synthetic users, leads and sequences into a throwaway SQLite database,
+runs `AgentRunner.run` and `SequenceManager.advance_sequences` against the
+offline fake providers, and records leads/sec, latency percentiles per unit of
+work (a chunk of leads for the cycle, a step or WhatsApp wave for sequences),
+SQL statement counts and peak RSS as JSON.
+
+Usage:
+    python benchmark.py                       # 1k, 10k and 100k leads
+    python benchmark.py --scales 1000 --latency-scale 0.1 --output results.json
+    python benchmark.py --scales 10000 --sequence-workers 4   # partitioned sequence pass
+
+Each scale runs in its own subprocess so peak RSS is measured per scale.
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCALES = [1000, 10000, 100000]
+
+
+def _configure_environment(args: argparse.Namespace, db_path: str) -> None:
+    """Point settings at the fakes and a scratch database; must run before app imports."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["FAKE_PROVIDERS"] = "all"
+    os.environ["FAKE_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ["FAKE_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_RATE_LIMIT_RATE"] = str(args.rate_limit_rate)
+    os.environ.setdefault("FAKE_SEED", "42")
+    # The fakes enforce provider quotas themselves; the client-side limiter would only add sleeps
+    os.environ.setdefault("GROQ_RATE_LIMIT_BACKEND", "none")
+    # Single process: the account's Twilio bucket need not be shared through Redis
+    os.environ.setdefault("TWILIO_RATE_LIMIT_BACKEND", "memory")
+    os.environ.setdefault("LLM_CACHE_BACKEND", "none")
+    os.environ.setdefault("DELIVERY_MODE", "direct")
+    # Measure the scan itself; there are no workers to pump timers
+    os.environ.setdefault("SEQUENCE_TIMER_BACKEND", "none")
+    # A verified-looking sender skips the sandbox rerouting (and its per-email warning)
+    os.environ.setdefault("RESEND_FROM_EMAIL", "FollowUpAI <bench@followupai.example>")
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def _timed(owner: type, name: str, record: Callable[[tuple, float], None]):
+    """Wrap `owner.name` so every call reports (args, seconds) to `record`."""
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            record(args, time.perf_counter() - started)
+
+    setattr(owner, name, wrapper)
+    try:
+        yield
+    finally:
+        setattr(owner, name, original)
+
+
+def _seed(engine, lead_count: int, leads_per_user: int, with_sequences: bool) -> List[int]:
+    """Bulk-insert users and leads; returns the user ids."""
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+    from models.lead import Lead
+    from models.sequence import Sequence, SequenceStep
+    from models.user import User
+
+    now = datetime.now(timezone.utc)
+    with Session(engine) as db:
+        user_count = max(1, -(-lead_count // leads_per_user))
+        db.execute(insert(User), [
+            {"email": f"bench{u}@followupai.com", "full_name": f"Bench {u}", "hashed_password": "x"}
+            for u in range(user_count)
+        ])
+        user_ids = [user.id for user in db.query(User).order_by(User.id)]
+
+        sequence_id = None
+        if with_sequences:
+            sequence = Sequence(name="Benchmark protocol", description="Synthetic load")
+            sequence.steps = [
+                SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup"),
+                SequenceStep(step_number=2, wait_days=3, action_type="whatsapp", template_name="followup"),
+                SequenceStep(step_number=3, wait_days=7, action_type="email", template_name="breakup")
+            ]
+            db.add(sequence)
+            db.flush()
+            sequence_id = sequence.id
+
+        rows = []
+        for i in range(lead_count):
+            # Cycle mix: 60% follow-up, 20% stalled, 20% recently contacted (no action)
+            # Sequence mix: 50% email step due, 30% WhatsApp step due, 20% still waiting
+            bucket = i % 10
+            if with_sequences:
+                step, days_ago = (0, 30) if bucket < 5 else (1, 5) if bucket < 8 else (1, 1)
+            else:
+                step, days_ago = 0, 10 if bucket < 6 else 30 if bucket < 8 else 1
+            contacted = now - timedelta(days=days_ago)
+            rows.append({
+                "user_id": user_ids[i // leads_per_user],
+                "name": f"Lead {i}",
+                "email": f"lead{i}@example.com",
+                "phone": f"+1555{i:07d}",
+                "company": f"Company {i % 500}",
+                "contact_type": "recruiter" if i % 4 == 0 else "client",
+                "last_message": "Thanks, let me discuss with the team and circle back next week. " * 8,
+                "last_contacted_date": contacted,
+                "status": "active",
+                "sequence_id": sequence_id,
+                "current_step_number": step,
+                # What SequenceManager.schedule would store: step 1 waits 0 days, step 2 waits 3
+                "next_action_at": contacted + timedelta(days=3 * step) if with_sequences else None
+            })
+            if len(rows) == 10000:
+                db.execute(insert(Lead), rows)
+                rows = []
+        if rows:
+            db.execute(insert(Lead), rows)
+        db.commit()
+    return user_ids
+
+
+def _scenario(name: str, lead_count: int, args: argparse.Namespace, body: Callable[..., int], latency_unit: str) -> Dict:
+    """
+    Seed a fresh database, run `body(session_factory, user_ids, latencies)` and measure it.
+
+    `body` appends one latency sample per `latency_unit` of work it times.
+    """
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    import models  # noqa: F401  (registers every table on Base)
+    from services.database import Base
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="followupai-bench-"), f"{name}.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 60})
+    Base.metadata.create_all(bind=engine)
+    user_ids = _seed(engine, lead_count, args.leads_per_user, with_sequences=name == "advance_sequences")
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    statements = [0]
+
+    def count(*_):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    latencies: List[float] = []
+    started = time.perf_counter()
+    actions = body(session_factory, user_ids, latencies)
+    elapsed = time.perf_counter() - started
+    event.remove(engine, "before_cursor_execute", count)
+    engine.dispose()
+
+    return {
+        "scenario": name,
+        "leads": lead_count,
+        "users": len(user_ids),
+        "duration_seconds": round(elapsed, 3),
+        "leads_per_second": round(lead_count / elapsed, 1) if elapsed else None,
+        "latency_unit": latency_unit,
+        "latency_ms": _percentiles(latencies),
+        "latency_samples": len(latencies),
+        "actions_taken": actions,
+        "sql_statements": statements[0],
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+
+def _run_agent_cycle(session_factory, user_ids: List[int], latencies: List[float]) -> int:
+    """One AgentRunner.run per user, as run_agent_task does; one latency sample per chunk (its wall time)."""
+    from agents.agent_runner import AgentRunner
+
+    def record(args, seconds):
+        latencies.append(seconds)
+
+    actions = 0
+    with _timed(AgentRunner, "_run_chunk", record):
+        for user_id in user_ids:
+            db = session_factory()
+            try:
+                actions += AgentRunner(db=db, user_id=user_id).run()["actions_taken"]
+            finally:
+                db.close()
+    return actions
+
+
+def _run_sequences(session_factory, user_ids: List[int], latencies: List[float], workers: int = 1) -> int:
+    """
+    One advance_sequences pass; one latency sample per email step, and one per
+    user's WhatsApp wave (its steps go out together).
+
+    With several workers each runs one partition on its own session, as the
+    advance_sequence_partition tasks do.
+    """
+    from sqlalchemy import func
+    from agents.sequence_manager import SequenceManager
+    from models.lead import Lead
+
+    def record(args, seconds):
+        latencies.append(seconds)
+
+    def advance(partition: int) -> None:
+        partition_db = session_factory()
+        try:
+            SequenceManager(partition_db).advance_sequences(partition, workers)
+        finally:
+            partition_db.close()
+
+    db = session_factory()
+    try:
+        steps_before = db.query(func.sum(Lead.current_step_number)).scalar() or 0
+        with _timed(SequenceManager, "_run_email_step", record), \
+                _timed(SequenceManager, "_run_whatsapp_steps", record), \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(advance, range(workers)))
+        db.expire_all()
+        # Actions taken = steps the leads advanced by
+        return (db.query(func.sum(Lead.current_step_number)).scalar() or 0) - steps_before
+    finally:
+        db.close()
+
+
+def run_scale(lead_count: int, args: argparse.Namespace) -> List[Dict]:
+    """Run both scenarios at one scale in this process (called in a child process)."""
+    _configure_environment(args, os.path.join(tempfile.mkdtemp(prefix="followupai-bench-"), "app.db"))
+    sys.path.insert(0, BACKEND_DIR)
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    results = []
+    sequences = functools.partial(_run_sequences, workers=args.sequence_workers)
+    for name, body, unit in (("agent_cycle", _run_agent_cycle, "chunk"), ("advance_sequences", sequences, "step")):
+        result = _scenario(name, lead_count, args, body, unit)
+        print(
+            f"{name:>18} @ {lead_count:>7} leads: {result['leads_per_second']:>9} leads/s, "
+            f"per-{unit} p50/p95/p99 {result['latency_ms']['p50']}/{result['latency_ms']['p95']}/{result['latency_ms']['p99']} ms, "
+            f"{result['sql_statements']} SQL, {result['peak_rss_mb']} MB peak RSS",
+            file=sys.stderr
+        )
+        results.append(result)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Lead counts to run")
+    parser.add_argument("--leads-per-user", type=int, default=1000)
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="FAKE_LATENCY_SCALE (1.0 = real-world latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="FAKE_ERROR_RATE")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="FAKE_RATE_LIMIT_RATE")
+    parser.add_argument("--sequence-workers", type=int, default=1, help="Partitions advanced concurrently")
+    parser.add_argument("--output", help="JSON results path (default: benchmark_results/<timestamp>.json)")
+    parser.add_argument("--single-scale", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_scale:
+        # Child process: results go to stdout for the parent
+        print(json.dumps(run_scale(args.single_scale, args)))
+        return
+
+    results = []
+    for scale in args.scales:
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--single-scale", str(scale),
+             "--leads-per-user", str(args.leads_per_user), "--latency-scale", str(args.latency_scale),
+             "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate),
+             "--sequence-workers", str(args.sequence_workers)],
+            stdout=subprocess.PIPE, text=True, check=True
+        )
+        results.extend(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "config": {
+            "leads_per_user": args.leads_per_user,
+            "latency_scale": args.latency_scale,
+            "error_rate": args.error_rate,
+            "rate_limit_rate": args.rate_limit_rate,
+            "sequence_workers": args.sequence_workers
+        },
+        "results": results
+    }
+    output = args.output or os.path.join(
+        BACKEND_DIR, "benchmark_results", f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Benchmark results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
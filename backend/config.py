@@ -22,25 +22,78 @@ class Settings(BaseSettings):
     # Groq API
     GROQ_API_KEY: str = ""
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
+    GROQ_TIMEOUT_SECONDS: float = 30.0
+    GROQ_MAX_RETRIES: int = 2
+    GROQ_MAX_CONNECTIONS: int = 20  # Pooled keep-alive connections for the async client
+    EMAIL_BATCH_SIZE: int = 10  # Leads packed into one generation request (1 = per-lead calls)
+    GROQ_RPM_LIMIT: int = 30  # Requests per minute for the account tier
+    GROQ_TPM_LIMIT: int = 12000  # Tokens per minute (prompt + max completion)
+    GROQ_RATE_LIMIT_BACKEND: str = "auto"  # auto (redis if REDIS_URL is set) | memory (per process) | redis (shared by workers) | none
+    
+    # LLM Response Cache
+    LLM_CACHE_BACKEND: str = "memory"  # memory | sqlite | redis | none
+    LLM_CACHE_TTL_SECONDS: int = 60 * 60 * 24  # 24 hours
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    LLM_CACHE_SQLITE_PATH: str = "./llm_cache.db"
     
     # Resend API (Transactional Email)
     RESEND_API_KEY: str = ""
     RESEND_FROM_EMAIL: str = "FollowUpAI <onboarding@resend.dev>"
+    RESEND_BATCH_SIZE: int = 100  # Emails per batch API call (Resend maximum: 100)
+    RESEND_BATCH_MAX_RETRIES: int = 2  # Retries for transient per-message failures
+    
+    # Provider resilience (per-provider circuit breakers)
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive transient failures before fast-failing
+    CIRCUIT_RESET_SECONDS: float = 30.0  # Open time before a half-open probe
+    PROVIDER_MAX_RETRIES: int = 2
+    PROVIDER_RETRY_BASE_SECONDS: float = 0.5  # Backoff: 0.5s, 1s, 2s, ...
+    
+    # Delivery
+    DELIVERY_MODE: str = "direct"  # direct (send inline) | outbox (queue for delivery workers)
+    OUTBOX_BATCH_SIZE: int = 100  # Messages claimed per delivery batch
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_LEASE_SECONDS: int = 300  # Claimed rows return to the queue if a worker dies
+    IDEMPOTENCY_CLAIM_TTL_SECONDS: int = 900  # Unfinished send claims may be retaken after this
+    
+    # Sequence engine
+    SEQUENCE_PARTITIONS: int = 4  # Tasks per hourly pass (leads split by id); scale workers to match
+    SEQUENCE_CLAIM_BATCH_SIZE: int = 500  # Due leads leased per claim
+    SEQUENCE_LEASE_SECONDS: int = 3600  # Leased leads return to the scan if a worker dies
+    SEQUENCE_TIMER_BACKEND: str = "redis"  # redis (steps fire at their due time) | none (sweep only)
+    SEQUENCE_TIMER_POLL_SECONDS: float = 1.0  # Max delay between a timer coming due and its task
+    SEQUENCE_RETRY_SECONDS: int = 3600  # Timer re-armed for a due step that failed
+    SEQUENCE_SWEEP_CRON: str = "0 */6 * * *"  # Safety-net scan; use "0 * * * *" without timers
+    SEQUENCE_SWEEP_HORIZON_SECONDS: int = 25200  # The sweep re-arms timers due before the next sweep
+    SEQUENCE_CACHE_TTL_SECONDS: int = 300  # Cached definitions refresh after this if an invalidation is missed (0 = no cache)
     
     # Meta WhatsApp Cloud API (Primary Industry Standard)
     WHATSAPP_ACCESS_TOKEN: Optional[str] = None
     WHATSAPP_PHONE_NUMBER_ID: Optional[str] = None
     WHATSAPP_BUSINESS_ACCOUNT_ID: Optional[str] = None
     WHATSAPP_VERIFY_TOKEN: Optional[str] = "followup_ai_verify_token"
+    WHATSAPP_HTTP_TIMEOUT_SECONDS: float = 10.0
+    WHATSAPP_MAX_CONCURRENCY: int = 20  # In-flight Cloud API requests (and pooled connections)
     
     # Twilio (Fallback/MVP Sandbox for Ease of Use)
     TWILIO_ACCOUNT_SID: Optional[str] = None
     TWILIO_AUTH_TOKEN: Optional[str] = None
     TWILIO_WHATSAPP_NUMBER: str = "whatsapp:+14155238886" # Twilio Sandbox number
+    TWILIO_MAX_WORKERS: int = 8  # Threads sending through the blocking SDK
+    TWILIO_MESSAGES_PER_SECOND: float = 10.0  # Per-account send rate (match your Twilio quota; fractions allowed)
+    TWILIO_RATE_LIMIT_BACKEND: str = "auto"  # auto (redis if REDIS_URL is set) | memory (per process) | redis (shared by workers)
     
     # Search API
     TAVILY_API_KEY: str = ""
     
+    # Fake providers (offline load testing; never enable in production)
+    FAKE_PROVIDERS: str = ""  # Comma-separated: groq,resend,twilio,meta,tavily | all
+    FAKE_LATENCY_DISTRIBUTION: str = "lognormal"  # fixed | uniform | lognormal
+    FAKE_LATENCY_SCALE: float = 1.0  # Multiplies each provider's typical latency (0 = instant)
+    FAKE_ERROR_RATE: float = 0.0  # Share of calls answered with a 503
+    FAKE_RATE_LIMIT_RATE: float = 0.0  # Share of calls answered with a 429
+    FAKE_PROVIDER_PROFILES: str = ""  # JSON overrides, e.g. {"groq": {"latency_ms": 2000, "requests_per_minute": 30}}
+    FAKE_SEED: Optional[int] = None  # Fixed seed for reproducible runs
+    
     # Redis for Taskiq
     REDIS_URL: str = "redis://localhost:6379"
     
@@ -53,6 +106,13 @@ class Settings(BaseSettings):
     NEEDS_FOLLOWUP_MAX_DAYS: int = 20
     STALLED_DAYS_THRESHOLD: int = 21
     
+    # Agent Execution
+    AGENT_MAX_CONCURRENCY: int = 1  # Chunks processed in parallel per cycle (1 = serial)
+    AGENT_CHUNK_SIZE: int = 50  # Leads per cycle transaction, one SAVEPOINT each (SQLite: one writer at a time)
+    
+    # Activity Log Buffering
+    ACTIVITY_FLUSH_SIZE: int = 500  # Rows per bulk INSERT
+    
     # CORS
     CORS_ORIGINS: list = [
         "http://localhost:3000", 
@@ -0,0 +1,27 @@
+import asyncio
+from tkq import delivery_broker
+from services.outbox import outbox
+from loguru import logger
+
+@delivery_broker.task(schedule=[{"cron": "* * * * *"}]) # Safety sweep every minute
+async def deliver_outbox_task():
+    """Background task to drain pending outbox messages in batches."""
+    try:
+        # Claims and provider calls are blocking; keep them off the worker's event loop
+        totals = await asyncio.to_thread(outbox.drain)
+        if totals["claimed"]:
+            logger.info(f"Outbox delivery: {totals}")
+    except Exception as e:
+        logger.error(f"Outbox delivery failed: {str(e)}")
+
+
+async def kick_delivery():
+    """Wake the delivery workers after new messages were queued."""
+    from config import get_settings
+    if get_settings().DELIVERY_MODE != "outbox":
+        return
+    try:
+        await deliver_outbox_task.kiq()
+    except Exception as e:
+        # The minute sweep still picks the messages up
+        logger.warning(f"Could not kick outbox delivery: {str(e)}")
@@ -5,6 +5,10 @@ from config import get_settings
 from services.database import engine, Base
 from routes import auth, leads, agent, discovery
 from tkq import broker
+from services.llm_cache import llm_cache
+from services.rate_limiter import groq_limiter
+from services.communication_service import comm_service
+from services.fake_providers import fake_providers
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
@@ -50,6 +54,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Lead list pagination
 )
 
 # Include routers
@@ -78,7 +83,11 @@ def health_check():
         "status": "healthy",
         "database": "connected",
         "groq_configured": bool(settings.GROQ_API_KEY),
-        "resend_configured": bool(settings.RESEND_API_KEY)
+        "resend_configured": bool(settings.RESEND_API_KEY),
+        "llm_cache": llm_cache.stats(),
+        "groq_rate_limit": groq_limiter.stats(),
+        "circuit_breakers": comm_service.breaker_stats(),
+        "fake_providers": fake_providers.stats()
     }
 
 
@@ -1,4 +1,4 @@
-"""Migration script to add new columns to the leads table."""
+"""Migration script to add new columns to existing tables."""
 import sqlite3
 import os
 
@@ -13,18 +13,26 @@ def migrate():
     cursor = conn.cursor()
 
     columns_to_add = [
-        ("contact_type", "TEXT DEFAULT 'client'"),
-        ("resume_link", "TEXT"),
-        ("tech_stack", "TEXT"),
-        ("source_url", "TEXT"),
-        ("phone", "TEXT"),
-        ("sequence_id", "INTEGER"),
-        ("current_step_number", "INTEGER DEFAULT 0")
+        ("leads", "contact_type", "TEXT DEFAULT 'client'"),
+        ("leads", "resume_link", "TEXT"),
+        ("leads", "tech_stack", "TEXT"),
+        ("leads", "source_url", "TEXT"),
+        ("leads", "phone", "TEXT"),
+        ("leads", "sequence_id", "INTEGER"),
+        ("leads", "current_step_number", "INTEGER DEFAULT 0"),
+        ("leads", "next_action_at", "DATETIME"),
+        ("leads", "sequence_claim_token", "TEXT"),
+        ("leads", "sequence_locked_until", "DATETIME"),
+        ("outbox_messages", "idempotency_key", "TEXT"),
+        ("outbox_messages", "prior_contacted_at", "DATETIME"),
+        ("outbox_messages", "contacted_at", "DATETIME"),
+        ("outbox_messages", "sequence_id", "INTEGER"),
+        ("outbox_messages", "sequence_step", "INTEGER")
     ]
 
-    for col_name, col_type in columns_to_add:
+    for table, col_name, col_type in columns_to_add:
         try:
-            cursor.execute(f"ALTER TABLE leads ADD COLUMN {col_name} {col_type}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
             print(f"Added column: {col_name}")
         except sqlite3.OperationalError as e:
             if "duplicate column name" in str(e).lower():
@@ -32,6 +40,24 @@ def migrate():
             else:
                 print(f"Error adding column {col_name}: {e}")
 
+    indexes_to_add = [
+        ("ix_leads_user_last_contacted", "leads (user_id, last_contacted_date)"),
+        ("ix_leads_next_action_at", "leads (next_action_at)"),
+        ("ix_leads_user_updated", "leads (user_id, updated_at, id)")
+    ]
+
+    for index_name, index_target in indexes_to_add:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {index_target}")
+        print(f"Ensured index: {index_name}")
+
+    # Enrolled leads without a due date are picked up by the next scan, which
+    # then schedules their real next step
+    cursor.execute(
+        "UPDATE leads SET next_action_at = COALESCE(last_contacted_date, CURRENT_TIMESTAMP) "
+        "WHERE sequence_id IS NOT NULL AND next_action_at IS NULL"
+    )
+    print(f"Backfilled next_action_at for {cursor.rowcount} enrolled leads")
+
     conn.commit()
     conn.close()
     print("Migration finished.")
@@ -3,5 +3,7 @@ from models.user import User
 from models.lead import Lead
 from models.activity_log import ActivityLog
 from models.sequence import Sequence, SequenceStep
+from models.outbox import OutboxMessage
+from models.idempotency import IdempotencyKey
 
-__all__ = ["User", "Lead", "ActivityLog", "Sequence", "SequenceStep"]
+__all__ = ["User", "Lead", "ActivityLog", "Sequence", "SequenceStep", "OutboxMessage", "IdempotencyKey"]
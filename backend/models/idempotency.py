@@ -0,0 +1,25 @@
+"""Idempotency key model for outbound messages."""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from services.database import Base
+
+
+class IdempotencyKey(Base):
+    """One outbound message per lead, step and day; the unique key is what deduplicates sends."""
+    
+    __tablename__ = "idempotency_keys"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    lead_id = Column(Integer, ForeignKey("leads.id"), nullable=True)
+    channel = Column(String, nullable=False)  # email, whatsapp
+    step = Column(String, nullable=False)  # followup, breakup, sequence:<id>:<n>, whatsapp:<template>
+    status = Column(String, default="pending", nullable=False)  # pending (claimed), sent
+    claim_token = Column(String, nullable=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=False)
+    provider_id = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key}, lead_id={self.lead_id}, status={self.status})>"
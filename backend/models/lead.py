@@ -1,7 +1,7 @@
 """Lead model for CRM functionality."""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import defer, relationship
 from services.database import Base
 
 
@@ -9,6 +9,14 @@ class Lead(Base):
     """Lead/prospect model."""
     
     __tablename__ = "leads"
+    __table_args__ = (
+        # Agent cycles select a user's due leads by last contact date
+        Index("ix_leads_user_last_contacted", "user_id", "last_contacted_date"),
+        # The sequence scan selects enrolled leads whose next step is due
+        Index("ix_leads_next_action_at", "next_action_at"),
+        # GET /api/leads pages a user's leads by (updated_at, id)
+        Index("ix_leads_user_updated", "user_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -29,6 +37,9 @@ class Lead(Base):
     # Sequences (Automation)
     sequence_id = Column(Integer, ForeignKey("sequences.id"), nullable=True)
     current_step_number = Column(Integer, default=0) # 0 = not started
+    next_action_at = Column(DateTime(timezone=True), nullable=True)  # When the next step is due (None = nothing scheduled)
+    sequence_claim_token = Column(String, nullable=True)
+    sequence_locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease held by a sequence worker
     
     sequence = relationship("Sequence", back_populates="leads")
     
@@ -37,3 +48,11 @@ class Lead(Base):
     
     def __repr__(self):
         return f"<Lead(id={self.id}, name={self.name}, status={self.status})>"
+
+
+def lead_scan_options():
+    """
+    Loader options for batch scans (agent cycle, sequences): defer the free text
+    no automated decision reads. A deferred column still loads on first access.
+    """
+    return defer(Lead.last_message), defer(Lead.source_url)
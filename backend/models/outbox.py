@@ -0,0 +1,40 @@
+"""Outbox model for rendered messages awaiting delivery."""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index
+from sqlalchemy.sql import func
+from services.database import Base
+
+
+class OutboxMessage(Base):
+    """A rendered outbound message, written in the same transaction as the lead update."""
+    
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        # Delivery workers scan for due pending rows
+        Index("ix_outbox_status_available", "status", "available_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    lead_id = Column(Integer, ForeignKey("leads.id"), nullable=True)
+    channel = Column(String, nullable=False)  # email, whatsapp
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=True)
+    body = Column(Text, nullable=False)  # HTML for email, plain text for WhatsApp
+    details = Column(JSON, nullable=True)  # Activity log details recorded on delivery
+    status = Column(String, default="pending", nullable=False)  # pending, sent, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(DateTime(timezone=True), nullable=False)  # Not before (retry backoff)
+    claim_token = Column(String, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Lease held by a delivery worker
+    idempotency_key = Column(String, nullable=True)  # Forwarded to providers that deduplicate on it
+    prior_contacted_at = Column(DateTime(timezone=True), nullable=True)  # Lead's last contact before this message, restored if delivery fails
+    contacted_at = Column(DateTime(timezone=True), nullable=True)  # Contact date the producer stamped on the lead
+    sequence_id = Column(Integer, nullable=True)  # Sequence whose step this message runs, rolled back if delivery fails
+    sequence_step = Column(Integer, nullable=True)
+    provider_id = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<OutboxMessage(id={self.id}, channel={self.channel}, status={self.status})>"
@@ -13,6 +13,7 @@ from routes.auth import get_current_user
 from agents.agent_runner import AgentRunner
 from worker import run_agent_task, run_lead_task
 from services.communication_service import comm_service
+from services.activity_sink import ActivitySink
 
 router = APIRouter(prefix="/api/agent", tags=["Agent"])
 
@@ -108,9 +109,9 @@ def send_custom_email(
         if not email_result["success"]:
             raise Exception(f"Failed to send email: {email_result.get('error')}")
 
-        # Log the activity
-        from models.activity_log import ActivityLog
-        activity = ActivityLog(
+        # Log the activity in the same commit as the lead update
+        sink = ActivitySink(db=db)
+        sink.add(
             user_id=current_user.id,
             lead_id=lead.id,
             action_type="custom_email_sent",
@@ -120,7 +121,7 @@ def send_custom_email(
                 "body_snippet": request.body[:100] + "..."
             }
         )
-        db.add(activity)
+        sink.flush()
         db.commit()
         
         return {"success": True, "message": "Custom email sent and logged"}
@@ -43,7 +43,7 @@ async def run_discovery(
         
         # Parse results using LLM
         raw_results = final_state.get("discovery_results", [])
-        parsed_leads = email_generator.parse_search_results(raw_results, query)
+        parsed_leads = await email_generator.parse_search_results(raw_results, query)
         
         return {
             "success": True,
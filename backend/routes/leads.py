@@ -1,19 +1,28 @@
 """Lead management routes."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import String, or_, select, tuple_, type_coerce
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Literal, Optional, Tuple
 from schemas.lead import LeadCreate, LeadUpdate, LeadResponse
 from services.database import get_db
 from models.lead import Lead
 from models.user import User
 from routes.auth import get_current_user
+from agents.sequence_manager import SequenceManager
 
 from fastapi.responses import StreamingResponse
+import base64
 import csv
 import io
+import json
 
 router = APIRouter(prefix="/api/leads", tags=["Leads"])
 
+LEAD_FIELDS = tuple(LeadResponse.model_fields)
+
 
 @router.get("/export")
 def export_leads(
@@ -57,14 +66,109 @@ def export_leads(
     )
 
 
-@router.get("", response_model=List[LeadResponse])
+@router.get("", responses={200: {"model": List[LeadResponse]}})
 def get_leads(
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    limit: int = Query(100, ge=1, le=500),
+    sort: Literal["id", "updated_at"] = Query("id", description="id (oldest first) or updated_at (most recent first)"),
+    lead_status: Optional[str] = Query(None, alias="status"),
+    contact_type: Optional[str] = None,
+    sequence_id: Optional[int] = None,
+    company: Optional[str] = Query(None, description="Case-insensitive substring"),
+    search: Optional[str] = Query(None, description="Case-insensitive substring of the name, email or company"),
+    fields: Optional[str] = Query(None, description="Comma-separated LeadResponse fields (id is always included)"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all leads for current user."""
-    leads = db.query(Lead).filter(Lead.user_id == current_user.id).all()
-    return leads
+    """
+    Get one page of the current user's leads.
+    
+    Keyset pagination: pages are read with an index range scan from the cursor,
+    never an OFFSET, so deep pages cost the same as the first. The response body
+    stays a list of leads; the cursor of the next page is in the X-Next-Cursor
+    header (absent on the last page). `fields` trims both the SELECT and the payload.
+    """
+    selected = _parse_fields(fields)
+    # The cursor needs the sort key even when it is not requested
+    sort_fields = ("id", "updated_at") if sort == "updated_at" else ("id",)
+    columns = [getattr(Lead, field) for field in dict.fromkeys((*sort_fields, *selected))]
+    
+    query = select(*columns).where(Lead.user_id == current_user.id)
+    if lead_status:
+        query = query.where(Lead.status == lead_status)
+    if contact_type:
+        query = query.where(Lead.contact_type == contact_type)
+    if sequence_id is not None:
+        query = query.where(Lead.sequence_id == sequence_id)
+    if company:
+        query = query.where(Lead.company.icontains(company, autoescape=True))
+    if search:
+        query = query.where(or_(*(
+            column.icontains(search, autoescape=True) for column in (Lead.name, Lead.email, Lead.company)
+        )))
+    
+    if sort == "id":
+        if cursor:
+            query = query.where(Lead.id > _decode_cursor(cursor, sort)[0])
+        query = query.order_by(Lead.id)
+    else:
+        # The raw column is compared so the index serves the range. SQLite stores
+        # datetimes as text of mixed precision (CURRENT_TIMESTAMP has no fraction),
+        # so there the cursor carries the stored text and both sides compare as text
+        is_sqlite = db.get_bind().dialect.name == "sqlite"
+        updated_key = type_coerce(Lead.updated_at, String) if is_sqlite else Lead.updated_at
+        if is_sqlite:
+            query = query.add_columns(updated_key.label("updated_key"))
+        if cursor:
+            after_updated_at, after_id = _decode_cursor(cursor, sort)
+            bound = after_updated_at if is_sqlite else datetime.fromisoformat(after_updated_at)
+            query = query.where(tuple_(updated_key, Lead.id) < (bound, after_id))
+        query = query.order_by(Lead.updated_at.desc(), Lead.id.desc())
+    
+    rows = [dict(row) for row in db.execute(query.limit(limit + 1)).mappings()]
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort == "id":
+            key = [last["id"]]
+        else:
+            key = [last["updated_key"] if is_sqlite else last["updated_at"].isoformat(), last["id"]]
+        headers["X-Next-Cursor"] = _encode_cursor(sort, key)
+    
+    items = [{field: row[field] for field in ("id", *selected)} for row in rows]
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
+
+
+def _parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    if not fields:
+        return LEAD_FIELDS
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in LEAD_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown lead fields: {', '.join(unknown)}")
+    return requested
+
+
+def _encode_cursor(sort: str, key: list) -> str:
+    payload = json.dumps({"sort": sort, "key": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key = payload["key"]
+        valid = payload["sort"] == sort and len(key) == (1 if sort == "id" else 2)
+        # The last value is the id; an updated_at cursor starts with an ISO datetime
+        valid = valid and type(key[-1]) is int
+        if valid and sort == "updated_at":
+            datetime.fromisoformat(key[0])
+    except Exception:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor for this sort")
+    return key
 
 
 @router.post("", response_model=LeadResponse, status_code=status.HTTP_201_CREATED)
@@ -138,7 +242,13 @@ def update_lead(
     for field, value in update_data.items():
         setattr(lead, field, value)
     
+    sequences = SequenceManager(db)
+    if {"sequence_id", "current_step_number", "last_contacted_date"} & update_data.keys():
+        # Enrolling (or moving) a lead reschedules its next sequence step
+        sequences.schedule(lead)
+    
     db.commit()
+    sequences.flush_timers()
     db.refresh(lead)
     return lead
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 from services.database import get_db
+from services.sequence_cache import sequence_cache
 from models.sequence import Sequence, SequenceStep
 from models.user import User
 from routes.auth import get_current_user
@@ -39,6 +40,7 @@ def create_sequence(
         db.add(step)
     
     db.commit()
+    sequence_cache.invalidate()
     db.refresh(sequence)
     return sequence
 
@@ -48,7 +50,7 @@ def get_sequences(
     current_user: User = Depends(get_current_user)
 ):
     """Get all available sequences."""
-    return db.query(Sequence).all()
+    return sequence_cache.all(db)
 
 @router.delete("/{sequence_id}")
 def delete_sequence(
@@ -63,8 +65,11 @@ def delete_sequence(
     
     # First, detach leads from this sequence
     from models.lead import Lead
-    db.query(Lead).filter(Lead.sequence_id == sequence_id).update({"sequence_id": None, "current_step_number": 0})
+    db.query(Lead).filter(Lead.sequence_id == sequence_id).update(
+        {"sequence_id": None, "current_step_number": 0, "next_action_at": None}
+    )
     
     db.delete(sequence)
     db.commit()
+    sequence_cache.invalidate()
     return {"success": True, "message": "Sequence terminated"}
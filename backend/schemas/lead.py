@@ -52,6 +52,7 @@ class LeadResponse(BaseModel):
     phone: Optional[str]
     sequence_id: Optional[int]
     current_step_number: int
+    next_action_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
     
@@ -0,0 +1,95 @@
+"""Buffered bulk writer for activity log rows."""
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from loguru import logger
+from config import get_settings
+from models.activity_log import ActivityLog
+from services.database import SessionLocal
+
+settings = get_settings()
+
+
+class ActivitySink:
+    """
+    Collects ActivityLog rows in memory and writes them with one bulk INSERT per flush.
+
+    Rows are only written when the buffer reaches `max_rows` or when the owner
+    calls `flush()` (e.g. at the end of an agent cycle); nothing flushes on a
+    timer, since a session must not be used from another thread. Safe to share
+    between threads.
+
+    A sink bound to a session (`db`) writes every flush into that session, so the
+    rows commit or roll back with the caller's transaction.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_rows: Optional[int] = None,
+        db: Optional[Session] = None
+    ):
+        self.session_factory = session_factory
+        self.db = db
+        self.max_rows = max_rows or settings.ACTIVITY_FLUSH_SIZE
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, user_id: int, lead_id: Optional[int], action_type: str, details: Optional[Dict] = None) -> None:
+        """Queue a single activity row."""
+        with self._lock:
+            self._buffer.append({
+                "user_id": user_id,
+                "lead_id": lead_id,
+                "action_type": action_type,
+                "details": details
+            })
+            is_full = len(self._buffer) >= self.max_rows
+
+        if is_full:
+            self.flush()
+
+    def flush(self, db: Optional[Session] = None) -> int:
+        """
+        Write all buffered rows with a single bulk INSERT.
+
+        Args:
+            db: Optional session to write into (defaults to the bound session); the
+                caller owns the commit. Without one the rows are committed on a
+                short-lived session of their own.
+
+        Returns:
+            Number of rows written
+        """
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+
+        if not rows:
+            return 0
+
+        db = db if db is not None else self.db
+        if db is not None:
+            db.execute(insert(ActivityLog), rows)
+            return len(rows)
+
+        started = time.perf_counter()
+        session = self.session_factory()
+        try:
+            session.execute(insert(ActivityLog), rows)
+            session.commit()
+            logger.debug(f"Activity sink flushed {len(rows)} rows in {(time.perf_counter() - started) * 1000:.1f}ms")
+            return len(rows)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Activity sink failed to write {len(rows)} rows: {e}")
+            return 0
+        finally:
+            session.close()
+
+    def pending(self) -> int:
+        """Number of rows waiting to be written."""
+        with self._lock:
+            return len(self._buffer)
+
@@ -0,0 +1,178 @@
+"""Circuit breakers with retry policy for outbound providers."""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+from config import get_settings
+
+settings = get_settings()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open; retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive transient failures; open ->
+    half-open once `reset_timeout` has passed, letting a single probe call through.
+    A successful probe closes the breaker, a failed one re-opens it.
+
+    While open, calls fail immediately with CircuitOpenError, so a degraded
+    provider costs one fast check per lead instead of a timeout per lead.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be let through (without claiming the probe)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return not self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Claim permission for one call; in half-open only one probe runs at a time."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+                logger.info(f"Circuit '{self.name}' half-open, probing provider")
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            if self.state != "closed":
+                logger.info(f"Circuit '{self.name}' closed, provider recovered")
+                self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (
+                self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning(
+                    f"Circuit '{self.name}' opened after {self.consecutive_failures} failures "
+                    f"(trip #{self.trips}); fast-failing for {self.reset_timeout:.0f}s"
+                )
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        retries: Optional[int] = None,
+        is_transient: Callable[[Exception], bool] = lambda e: True,
+        can_retry: Optional[Callable[[Exception], bool]] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Run `fn` through the breaker, retrying transient errors with exponential backoff.
+
+        Non-transient errors (the provider answered but rejected the request) are
+        re-raised at once and do not count against the provider. `can_retry`
+        (defaults to `is_transient`) narrows which transient errors are retried,
+        e.g. to those that cannot have delivered a non-idempotent send.
+
+        Raises:
+            CircuitOpenError: the breaker is open (or opened while retrying)
+        """
+        retries = settings.PROVIDER_MAX_RETRIES if retries is None else retries
+        for attempt in range(retries + 1):
+            if not self.allow():
+                raise CircuitOpenError(self.name, self.retry_in())
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    self.record_success()
+                    raise
+                self.record_failure()
+                if attempt == retries or not (can_retry or is_transient)(e):
+                    raise
+                time.sleep(settings.PROVIDER_RETRY_BASE_SECONDS * 2 ** attempt)
+                continue
+            self.record_success()
+            return result
+
+    async def acall(
+        self,
+        fn: Callable[..., Awaitable[Any]],
+        *args: Any,
+        retries: Optional[int] = None,
+        is_transient: Callable[[Exception], bool] = lambda e: True,
+        can_retry: Optional[Callable[[Exception], bool]] = None,
+        **kwargs: Any
+    ) -> Any:
+        """Async variant of `call` for coroutine functions."""
+        retries = settings.PROVIDER_MAX_RETRIES if retries is None else retries
+        for attempt in range(retries + 1):
+            if not self.allow():
+                raise CircuitOpenError(self.name, self.retry_in())
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    self.record_success()
+                    raise
+                self.record_failure()
+                if attempt == retries or not (can_retry or is_transient)(e):
+                    raise
+                await asyncio.sleep(settings.PROVIDER_RETRY_BASE_SECONDS * 2 ** attempt)
+                continue
+            self.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "consecutive_failures": self.consecutive_failures
+            }
+
+
+def build_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(name, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS)
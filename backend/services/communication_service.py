@@ -1,64 +1,302 @@
 """Unified communication service for Email and WhatsApp (Meta/Twilio)."""
-import resend
+import asyncio
+import hashlib
+import time
+from concurrent.futures import Future
+import httpx
 import requests
+import resend
+import urllib3
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from config import get_settings
+from services.circuit_breaker import CircuitOpenError, build_breaker
+from services.event_loop import background_loop
+from services.fake_providers import fake_providers
+from services.twilio_dispatcher import TwilioDispatcher
 from loguru import logger
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 settings = get_settings()
 
+
+class ProviderHTTPError(Exception):
+    """Transient HTTP failure (429/5xx) from a provider without an SDK exception type."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    if isinstance(error, resend.exceptions.ResendError):
+        status = error.code
+    elif isinstance(error, TwilioRestException):
+        status = error.status
+    else:
+        status = getattr(error, "status_code", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def _not_sent(error: Exception) -> bool:
+    """Connection failures raised before any of the request reached the provider."""
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # Refused or unresolvable hosts; a connection dropped mid-request may have been delivered
+        return isinstance(getattr(error.args[0], "reason", error.args[0]), urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def is_transient(error: Exception) -> bool:
+    """Network errors, rate limits and 5xx count against a provider; rejected requests and unknown errors do not."""
+    if isinstance(error, (httpx.TransportError, requests.exceptions.RequestException)):
+        return True
+    status = _status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def is_retry_safe(error: Exception) -> bool:
+    """
+    Whether a non-idempotent send can be retried without risking a duplicate.
+
+    Only failures where the provider provably did not take the message: the
+    connection was never made, or it answered 429/503 (refused before processing).
+    A timeout or other 5xx may come after the message went out.
+    """
+    return _not_sent(error) or _status_code(error) in (429, 503)
+
+
+class ResendRequest(resend.request.Request):
+    """
+    Resend POST with an optional `Idempotency-Key` header (which the pinned SDK
+    cannot set) and an optional requests session (used for the fake provider).
+    """
+
+    def __init__(self, path: str, params, idempotency_key: Optional[str] = None, session: Optional[requests.Session] = None):
+        super().__init__(path=path, params=params, verb="post")
+        self.idempotency_key = idempotency_key
+        self.session = session
+
+    def make_request(self, url: str):
+        headers = self._Request__get_headers()
+        if self.idempotency_key:
+            headers["Idempotency-Key"] = self.idempotency_key
+        return (self.session or requests).request(self.verb, url, json=self.params, headers=headers)
+
+
+def _deferred(error: CircuitOpenError) -> dict:
+    """Fast-fail result: the caller should leave the lead for the next cycle."""
+    return {"success": False, "error": str(error), "deferred": True}
+
+
 class CommunicationService:
     """Handles multi-channel communication (Email, Meta WhatsApp, Twilio WhatsApp)."""
 
     def __init__(self):
+        # One breaker per provider, so a degraded provider fails fast without affecting the others
+        self.breakers = {name: build_breaker(name) for name in ("resend", "twilio", "meta")}
+
         # Initialize Resend
         if settings.RESEND_API_KEY:
             resend.api_key = settings.RESEND_API_KEY
             logger.info("Resend Email client initialized")
+        # Offline fake when FAKE_PROVIDERS includes resend (None = real network)
+        self.resend_session = fake_providers.requests_session("resend")
 
-        # Meta WhatsApp API Config
-        self.wa_token = settings.WHATSAPP_ACCESS_TOKEN
-        self.wa_phone_id = settings.WHATSAPP_PHONE_NUMBER_ID
+        # Meta WhatsApp API Config (placeholder credentials when faked)
+        meta_fake = fake_providers.is_enabled("meta")
+        self.wa_token = settings.WHATSAPP_ACCESS_TOKEN or ("fake-token" if meta_fake else None)
+        self.wa_phone_id = settings.WHATSAPP_PHONE_NUMBER_ID or ("fake-phone-id" if meta_fake else None)
         self.wa_url = f"https://graph.facebook.com/v18.0/{self.wa_phone_id}/messages" if self.wa_phone_id else None
+        # Long-lived keep-alive pool on the shared background loop; the semaphore caps
+        # in-flight requests so bulk sends queue here instead of overrunning the API
+        self.wa_client = httpx.AsyncClient(
+            timeout=settings.WHATSAPP_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=settings.WHATSAPP_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.WHATSAPP_MAX_CONCURRENCY
+            ),
+            headers={"Authorization": f"Bearer {self.wa_token}"} if self.wa_token else None,
+            transport=fake_providers.transport("meta")
+        )
+        self.wa_semaphore = asyncio.Semaphore(settings.WHATSAPP_MAX_CONCURRENCY)
 
         # Twilio Client Initialization
         self.twilio_client = None
-        if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
+        if fake_providers.is_enabled("twilio"):
+            http_client = TwilioHttpClient()
+            http_client.session = fake_providers.requests_session("twilio")
+            self.twilio_client = Client(
+                settings.TWILIO_ACCOUNT_SID or f"AC{'0' * 32}", settings.TWILIO_AUTH_TOKEN or "fake-token",
+                http_client=http_client
+            )
+        elif settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
             try:
                 self.twilio_client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
                 logger.info("Twilio WhatsApp client initialized")
             except Exception as e:
                 logger.error(f"Failed to initialize Twilio: {e}")
+        # The account's quota is shared by every process, so its bucket lives in Redis when there is one
+        twilio_limit_backend = settings.TWILIO_RATE_LIMIT_BACKEND.lower()
+        shared_limit = twilio_limit_backend == "redis" or (twilio_limit_backend == "auto" and settings.REDIS_URL)
+        self.twilio_dispatcher = TwilioDispatcher(
+            self._send_whatsapp_twilio,
+            max_workers=settings.TWILIO_MAX_WORKERS,
+            messages_per_second=settings.TWILIO_MESSAGES_PER_SECOND,
+            redis_url=settings.REDIS_URL if shared_limit else None
+        )
 
-    def send_email(self, to_email: str, subject: str, html_content: str) -> dict:
-        """Sends an email via Resend."""
-        if not settings.RESEND_API_KEY:
+    def send_email(self, to_email: str, subject: str, html_content: str, idempotency_key: Optional[str] = None) -> dict:
+        """
+        Sends an email via Resend.
+        
+        With an `idempotency_key`, Resend answers a repeated request (e.g. a retry
+        after a timeout) with the original result instead of sending again; without
+        one, only failures that provably sent nothing are retried.
+        """
+        if not self._resend_configured():
             logger.warning("Resend API Key not found. Skipping email.")
             return {"success": False, "error": "API Key missing"}
 
         try:
-            # Sandbox handling logic
-            verified_to = to_email
-            is_sandbox = "onboarding@resend.dev" in settings.RESEND_FROM_EMAIL
-            
-            if is_sandbox and to_email != "aisenh037@gmail.com":
-                logger.warning(f"SANDBOX MODE: Rerouting email from {to_email} to aisenh037@gmail.com")
-                verified_to = "aisenh037@gmail.com"
-
-            response = resend.Emails.send({
-                "from": settings.RESEND_FROM_EMAIL,
-                "to": verified_to,
-                "subject": f"[DEMO to {to_email}] {subject}" if is_sandbox else subject,
-                "html": html_content
-            })
+            response = self.breakers["resend"].call(
+                self._resend_send, "/emails", self._email_params(to_email, subject, html_content),
+                idempotency_key, is_transient=is_transient, can_retry=is_transient if idempotency_key else is_retry_safe
+            )
 
             logger.info(f"Email sent to {to_email}. ID: {response.get('id')}")
             return {"success": True, "id": response.get("id")}
+        except CircuitOpenError as e:
+            logger.warning(f"Email to {to_email} deferred: {e}")
+            return _deferred(e)
         except Exception as e:
             logger.error(f"Email failed: {e}")
             return {"success": False, "error": str(e)}
 
+    def send_email_batch(self, messages: List[Dict[str, str]]) -> List[dict]:
+        """
+        Sends many emails through Resend's batch endpoint (up to RESEND_BATCH_SIZE per call).
+        
+        Args:
+            messages: Dicts with `to_email`, `subject`, `html_content` and optionally
+                `idempotency_key`
+        
+        Returns:
+            One `send_email`-style result per message, in input order. Messages that
+            are missing from the response, or whose request failed with a transient
+            error (network, 429, 5xx), are retried up to RESEND_BATCH_MAX_RETRIES
+            times; without an idempotency key on every message, only request
+            failures that provably sent nothing are. While the Resend breaker is
+            open, results are marked `deferred` without a call.
+        """
+        if not messages:
+            return []
+        if not self._resend_configured():
+            logger.warning("Resend API Key not found. Skipping email batch.")
+            return [{"success": False, "error": "API Key missing"} for _ in messages]
+
+        batch_size = max(1, min(settings.RESEND_BATCH_SIZE, 100))
+        results: List[Optional[dict]] = [None] * len(messages)
+        pending = list(range(len(messages)))
+
+        for attempt in range(settings.RESEND_BATCH_MAX_RETRIES + 1):
+            if attempt:
+                logger.warning(f"Retrying {len(pending)} failed emails (attempt {attempt + 1})")
+                time.sleep(settings.PROVIDER_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+
+            retryable = []
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                outcomes = self._send_email_chunk([messages[index] for index in chunk])
+                for index, (result, can_retry) in zip(chunk, outcomes):
+                    results[index] = result
+                    if can_retry:
+                        retryable.append(index)
+
+            pending = retryable
+            if not pending:
+                break
+
+        sent = sum(1 for result in results if result["success"])
+        logger.info(f"Email batch sent {sent}/{len(messages)} messages")
+        return results
+
+    def _send_email_chunk(self, messages: List[Dict[str, str]]) -> List[Tuple[dict, bool]]:
+        """One batch API call; returns (result, retryable) per message."""
+        # Resend deduplicates whole batch requests, so the batch key is derived from
+        # its messages' keys: a retry of the same set repeats it, a subset gets a new one
+        keys = [message.get("idempotency_key") for message in messages]
+        batch_key = hashlib.sha256(":".join(keys).encode("utf-8")).hexdigest()[:32] if all(keys) else None
+        can_retry = is_transient if batch_key else is_retry_safe
+        try:
+            # send_email_batch owns the retry loop, so the breaker makes a single attempt
+            response = self.breakers["resend"].call(self._resend_send, "/emails/batch", [
+                self._email_params(message["to_email"], message["subject"], message["html_content"])
+                for message in messages
+            ], batch_key, retries=0, is_transient=is_transient)
+        except CircuitOpenError as e:
+            logger.warning(f"Email batch of {len(messages)} deferred: {e}")
+            return [(_deferred(e), False) for _ in messages]
+        except Exception as e:
+            # Validation/auth errors fail every attempt; only rate limits, server and network errors are retried
+            logger.error(f"Email batch of {len(messages)} failed: {e}")
+            # One dict per message: callers annotate results individually
+            retry = can_retry(e)
+            return [({"success": False, "error": str(e)}, retry) for _ in messages]
+
+        # `data` lists the accepted emails in request order; per-message failures
+        # (permissive validation) come back in `errors` keyed by request index.
+        if isinstance(response, dict):
+            accepted = iter(response.get("data") or [])
+            errors = {item.get("index"): item.get("message") for item in response.get("errors") or []}
+        else:
+            accepted = iter(response or [])
+            errors = {}
+
+        outcomes = []
+        for index in range(len(messages)):
+            if index in errors:
+                outcomes.append(({"success": False, "error": errors[index]}, False))
+                continue
+            email_id = (next(accepted, None) or {}).get("id")
+            if email_id:
+                outcomes.append(({"success": True, "id": email_id}, False))
+            else:
+                # The response lists what was accepted, so this one was not sent
+                outcomes.append(({"success": False, "error": "No result returned for message"}, True))
+        return outcomes
+
+    def _resend_configured(self) -> bool:
+        return bool(settings.RESEND_API_KEY) or self.resend_session is not None
+
+    def _resend_send(self, path: str, params, idempotency_key: Optional[str] = None):
+        """POST an email or batch to Resend, with the idempotency header when a key is given."""
+        if idempotency_key or self.resend_session is not None:
+            return ResendRequest(path, params, idempotency_key, session=self.resend_session).perform()
+        return resend.Batch.send(params) if path == "/emails/batch" else resend.Emails.send(params)
+
+    @staticmethod
+    def _email_params(to_email: str, subject: str, html_content: str) -> dict:
+        """Resend payload for one email, with sandbox rerouting applied."""
+        verified_to = to_email
+        is_sandbox = "onboarding@resend.dev" in settings.RESEND_FROM_EMAIL
+        
+        if is_sandbox and to_email != "aisenh037@gmail.com":
+            logger.warning(f"SANDBOX MODE: Rerouting email from {to_email} to aisenh037@gmail.com")
+            verified_to = "aisenh037@gmail.com"
+
+        return {
+            "from": settings.RESEND_FROM_EMAIL,
+            "to": verified_to,
+            "subject": f"[DEMO to {to_email}] {subject}" if is_sandbox else subject,
+            "html": html_content
+        }
+
     def send_whatsapp(self, to_phone: str, message: str) -> dict:
         """
         Sends a WhatsApp message. 
@@ -77,14 +315,44 @@ class CommunicationService:
         logger.warning(f"No WhatsApp provider configured. Content: '{message}' to {to_phone}")
         return {"success": False, "error": "WhatsApp API credentials missing"}
 
+    def dispatch_whatsapp(self, to_phone: str, message: str) -> "Future[dict]":
+        """
+        Starts a WhatsApp send without waiting for it (same provider order as `send_whatsapp`).
+        
+        Twilio sends run on the rate-limited dispatch pool, Meta sends on the pooled
+        async client. Await with `asyncio.wrap_future` or call `.result()`.
+        """
+        if self.twilio_client:
+            return self.twilio_dispatcher.submit(to_phone, message, account=settings.TWILIO_ACCOUNT_SID)
+        
+        if self.wa_token and self.wa_phone_id:
+            return background_loop.submit(self._asend_whatsapp_meta(to_phone, message))
+
+        future: "Future[dict]" = Future()
+        future.set_result(self.send_whatsapp(to_phone, message))
+        return future
+
+    def send_whatsapp_batch(self, messages: List[Dict[str, str]]) -> List[dict]:
+        """
+        Sends many WhatsApp messages concurrently.
+        
+        Args:
+            messages: Dicts with `to_phone` and `message`
+        
+        Returns:
+            One `send_whatsapp`-style result per message, in input order
+        """
+        futures = [self.dispatch_whatsapp(item["to_phone"], item["message"]) for item in messages]
+        return [future.result() for future in futures]
+
     def _send_whatsapp_meta(self, to_phone: str, message: str) -> dict:
-        """Meta WhatsApp Cloud API Implementation."""
+        """Meta WhatsApp Cloud API Implementation (sync wrapper over the pooled async client)."""
+        return background_loop.run(self._asend_whatsapp_meta(to_phone, message))
+
+    async def _asend_whatsapp_meta(self, to_phone: str, message: str) -> dict:
+        """Send one message on the pooled client, at most WHATSAPP_MAX_CONCURRENCY at a time."""
         try:
             clean_phone = ''.join(filter(str.isdigit, to_phone))
-            headers = {
-                "Authorization": f"Bearer {self.wa_token}",
-                "Content-Type": "application/json"
-            }
             payload = {
                 "messaging_product": "whatsapp",
                 "recipient_type": "individual",
@@ -92,12 +360,23 @@ class CommunicationService:
                 "type": "text",
                 "text": {"body": message}
             }
-            response = requests.post(self.wa_url, headers=headers, json=payload)
+
+            async def post():
+                async with self.wa_semaphore:
+                    response = await self.wa_client.post(self.wa_url, json=payload)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise ProviderHTTPError(response.status_code, response.text[:200])
+                return response
+
+            response = await self.breakers["meta"].acall(post, is_transient=is_transient, can_retry=is_retry_safe)
             response_data = response.json()
             if response.status_code == 200:
                 logger.info(f"Meta WhatsApp sent. ID: {response_data.get('messages', [{}])[0].get('id')}")
                 return {"success": True, "id": response_data.get('messages', [{}])[0].get('id')}
             return {"success": False, "error": response_data.get('error', {}).get('message', 'Meta Error')}
+        except CircuitOpenError as e:
+            logger.warning(f"WhatsApp to {to_phone} deferred: {e}")
+            return _deferred(e)
         except Exception as e:
             logger.error(f"Meta Exception: {e}")
             return {"success": False, "error": str(e)}
@@ -108,16 +387,29 @@ class CommunicationService:
             formatted_phone = to_phone if to_phone.startswith('+') else f"+{to_phone}"
             whatsapp_to = f"whatsapp:{formatted_phone}"
 
-            response = self.twilio_client.messages.create(
+            response = self.breakers["twilio"].call(
+                self.twilio_client.messages.create,
                 body=message,
                 from_=settings.TWILIO_WHATSAPP_NUMBER,
-                to=whatsapp_to
+                to=whatsapp_to,
+                is_transient=is_transient,
+                can_retry=is_retry_safe
             )
             logger.info(f"Twilio WhatsApp sent. SID: {response.sid}")
             return {"success": True, "id": response.sid}
+        except CircuitOpenError as e:
+            logger.warning(f"WhatsApp to {to_phone} deferred: {e}")
+            return _deferred(e)
         except Exception as e:
             logger.error(f"Twilio Exception: {e}")
             return {"success": False, "error": str(e)}
 
+    def email_available(self) -> bool:
+        """False while the email provider's breaker is open (callers should defer work)."""
+        return self.breakers["resend"].is_available()
+
+    def breaker_stats(self) -> Dict[str, dict]:
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+
 # Singleton instance
 comm_service = CommunicationService()
@@ -1,7 +1,9 @@
 """Database connection and session management."""
-from sqlalchemy import create_engine
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from sqlalchemy import create_engine, select, update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from config import get_settings
 
 settings = get_settings()
@@ -31,6 +33,56 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def begin_transaction(db: Session) -> Session:
+    """
+    Open a fresh session's transaction up front so SAVEPOINTs nest inside it.
+    
+    pysqlite defers BEGIN until the first write, so a SAVEPOINT issued first starts
+    its own transaction and RELEASE commits it. An explicit BEGIN makes savepoints
+    behave as they do on Postgres (where this is a no-op). Safe to call on a
+    session whose transaction has already begun.
+    
+    On SQLite the first write takes the database-wide write lock until commit, so
+    keep LLM and provider round trips out of the transaction.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        connection = db.connection()
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN")
+    return db
+
+
+def lease_rows(db: Session, model: Any, claimable: Any, order_by: Any, limit: int, values: Dict[str, Any]) -> int:
+    """
+    Lease up to `limit` rows of `model` matching `claimable` and commit the claim.
+    
+    SKIP LOCKED lets concurrent workers take disjoint batches on Postgres; SQLite
+    ignores it and serializes the UPDATE, whose WHERE re-checks `claimable` (which
+    must exclude rows under a live lease).
+    
+    Args:
+        order_by: Which claimable rows go first
+        values: Columns set on the leased rows (claim token, lease expiry, ...)
+    
+    Returns:
+        Number of rows leased
+    """
+    candidates = select(model.id).where(claimable).order_by(order_by).limit(limit).with_for_update(skip_locked=True)
+    leased = db.execute(
+        update(model).where(model.id.in_(candidates), claimable).values(**values),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+    db.commit()
+    return leased
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Attach UTC to naive datetimes; SQLite returns them without a zone, and stored values are UTC."""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
 def get_db():
     """Dependency to get database session."""
     db = SessionLocal()
@@ -0,0 +1,54 @@
+"""Shared background event loop for pooled async clients."""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundLoop:
+    """
+    A single event loop running on a daemon thread.
+
+    Async clients (Groq, httpx) bind their connection pools to the loop that first
+    uses them. Running every call on this one loop lets sync threads (agent cycle
+    workers) and async code (taskiq tasks, FastAPI) share the same pools.
+    """
+
+    def __init__(self, name: str = "followupai-io"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, started lazily on first use."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> "Future[T]":
+        """Schedule a coroutine on the loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Block the calling thread until the coroutine finishes on the loop."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("BackgroundLoop.run() called from the loop thread; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    async def wrap(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await a coroutine on the loop from any other event loop."""
+        if threading.current_thread() is self._thread:
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+
+# Singleton instance
+background_loop = BackgroundLoop()
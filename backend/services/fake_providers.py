@@ -0,0 +1,352 @@
+"""Offline stand-ins for Groq, Resend, Twilio, Meta and Tavily, for load testing."""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+import httpx
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from loguru import logger
+from config import get_settings
+
+settings = get_settings()
+
+PROVIDERS = ("groq", "resend", "twilio", "meta", "tavily")
+
+# Typical round trips against the real APIs (median, milliseconds)
+DEFAULT_LATENCY_MS = {"groq": 900.0, "resend": 180.0, "twilio": 350.0, "meta": 250.0, "tavily": 1500.0}
+
+# (path, JSON or form payload, request headers) -> response body
+Handler = Callable[[str, Dict[str, Any], Dict[str, str]], Dict[str, Any]]
+
+
+class ProviderProfile:
+    """
+    Latency distribution and failure mix of one fake provider.
+
+    Latency is drawn per call around `latency_ms` (fixed, uniform within
+    +/- `spread`, or lognormal with that median and sigma). A share of calls is
+    answered with a 429 (`rate_limit_rate`, plus every call over
+    `requests_per_minute`) or a 503 (`error_rate`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency_ms: float,
+        distribution: str = "lognormal",
+        spread: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        requests_per_minute: Optional[int] = None,
+        seed: Optional[int] = None
+    ):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.spread = spread
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.total_latency = 0.0
+        self._rng = random.Random(seed)
+        self._window_started = time.monotonic()
+        self._window_calls = 0
+        self._lock = threading.Lock()
+
+    def sample(self) -> Tuple[float, Optional[int]]:
+        """Latency (seconds) and failure status (None on success) for one call."""
+        with self._lock:
+            self.calls += 1
+            latency = self._latency() / 1000
+            self.total_latency += latency
+
+            now = time.monotonic()
+            if now - self._window_started >= 60:
+                self._window_started = now
+                self._window_calls = 0
+            self._window_calls += 1
+            over_quota = self.requests_per_minute is not None and self._window_calls > self.requests_per_minute
+
+            status = None
+            if over_quota or self._rng.random() < self.rate_limit_rate:
+                status = 429
+                self.rate_limited += 1
+            elif self._rng.random() < self.error_rate:
+                status = 503
+                self.errors += 1
+            return latency, status
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "avg_latency_ms": round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0
+            }
+
+    def _latency(self) -> float:
+        if self.latency_ms <= 0 or self.distribution == "fixed":
+            return max(0.0, self.latency_ms)
+        if self.distribution == "uniform":
+            return self._rng.uniform(self.latency_ms * (1 - self.spread), self.latency_ms * (1 + self.spread))
+        return self.latency_ms * self._rng.lognormvariate(0, self.spread)
+
+
+def _error_body(status: int) -> Dict[str, Any]:
+    message = "Rate limit reached, please retry later" if status == 429 else "Service temporarily unavailable"
+    return {"error": {"message": message, "code": status}}
+
+
+class FakeTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport answering like the provider, for SDKs and clients built on httpx."""
+
+    def __init__(self, profile: ProviderProfile, handler: Handler):
+        self.profile = profile
+        self.handler = handler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        latency, status = self.profile.sample()
+        time.sleep(latency)
+        return self._respond(request, status)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        latency, status = self.profile.sample()
+        await asyncio.sleep(latency)
+        return self._respond(request, status)
+
+    def _respond(self, request: httpx.Request, status: Optional[int]) -> httpx.Response:
+        if status:
+            return httpx.Response(status, json=_error_body(status), headers={"retry-after": "1"}, request=request)
+        payload = json.loads(request.content) if request.content else {}
+        return httpx.Response(200, json=self.handler(request.url.path, payload, dict(request.headers)), request=request)
+
+
+class FakeRequestsAdapter(BaseAdapter):
+    """requests adapter answering like the provider, mounted on the session of requests-based SDKs."""
+
+    def __init__(self, profile: ProviderProfile, handler: Handler, error_body: Callable[[int], Dict[str, Any]]):
+        super().__init__()
+        self.profile = profile
+        self.handler = handler
+        self.error_body = error_body
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        latency, status = self.profile.sample()
+        time.sleep(latency)
+
+        if status:
+            body = self.error_body(status)
+        else:
+            raw = request.body.decode("utf-8") if isinstance(request.body, bytes) else (request.body or "")
+            if "json" in request.headers.get("Content-Type", ""):
+                payload = json.loads(raw or "{}")
+            else:
+                payload = dict(parse_qsl(raw))
+            body = self.handler(urlparse(request.url).path, payload, dict(request.headers))
+
+        response = requests.Response()
+        response.status_code = status or 200
+        response._content = json.dumps(body).encode("utf-8")
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def _fake_email(name: str) -> str:
+    return (
+        f"Hi {name},\n\nNoticed your team is scaling its tech operations. We build custom AI agents "
+        f"that take manual outreach off your plate.\n\nWorth a 10-minute chat this week?\n\nBest,"
+    )
+
+
+def _groq_handler(path: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Chat completion; JSON mode answers batched email and lead-extraction prompts."""
+    messages = payload.get("messages") or [{}]
+    prompt = messages[-1].get("content") or ""
+    if (payload.get("response_format") or {}).get("type") == "json_object":
+        recipients = re.findall(r"### Recipient (\d+)\n\s*Recipient: ([^,\n]+)", prompt)
+        if recipients:
+            content = json.dumps({"emails": [{"id": int(rid), "body": _fake_email(name)} for rid, name in recipients]})
+        else:
+            content = json.dumps({"leads": []})
+    else:
+        match = re.search(r"Recipient: ([^,\n]+)", prompt)
+        content = _fake_email(match.group(1) if match else "there")
+
+    prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+            "logprobs": None
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+class _ResendHandler:
+    """Single and batch sends; a repeated Idempotency-Key returns the original response."""
+
+    def __init__(self):
+        self._responses: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, path: str, payload: Any, headers: Dict[str, str]) -> Dict[str, Any]:
+        key = headers.get("Idempotency-Key")
+        with self._lock:
+            if key and key in self._responses:
+                return self._responses[key]
+        if path.endswith("/batch"):
+            response = {"data": [{"id": str(uuid.uuid4())} for _ in payload]}
+        else:
+            response = {"id": str(uuid.uuid4())}
+        if key:
+            with self._lock:
+                self._responses[key] = response
+        return response
+
+
+def _resend_error(status: int) -> Dict[str, Any]:
+    name = "rate_limit_exceeded" if status == 429 else "application_error"
+    return {"statusCode": status, "name": name, "message": _error_body(status)["error"]["message"]}
+
+
+def _twilio_handler(path: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """Message create (form-encoded) -> Message resource."""
+    account_sid = path.split("/Accounts/")[-1].split("/")[0]
+    return {
+        "sid": f"SM{uuid.uuid4().hex}",
+        "account_sid": account_sid,
+        "to": payload.get("To"),
+        "from": payload.get("From"),
+        "body": payload.get("Body"),
+        "status": "queued",
+        "num_segments": "1",
+        "direction": "outbound-api",
+        "api_version": "2010-04-01",
+        "uri": f"{path[:-5]}/{uuid.uuid4().hex}.json"
+    }
+
+
+def _twilio_error(status: int) -> Dict[str, Any]:
+    return {"code": 20429 if status == 429 else 20500, "message": _error_body(status)["error"]["message"], "status": status}
+
+
+def _meta_handler(path: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    to = payload.get("to")
+    return {
+        "messaging_product": "whatsapp",
+        "contacts": [{"input": to, "wa_id": to}],
+        "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]
+    }
+
+
+def _tavily_handler(path: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    query = payload.get("query", "")
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"Example Company {i} is hiring engineers",
+                "url": f"https://example.com/careers/{i}",
+                "content": f"Example Company {i} is growing its team ({query}). Contact talent@example{i}.com.",
+                "score": round(0.95 - i * 0.05, 2)
+            }
+            for i in range(payload.get("max_results", 5))
+        ]
+    }
+
+
+HANDLERS: Dict[str, Handler] = {
+    "groq": _groq_handler,
+    "twilio": _twilio_handler,
+    "meta": _meta_handler,
+    "tavily": _tavily_handler
+}
+ERROR_BODIES = {"resend": _resend_error, "twilio": _twilio_error}
+
+
+class FakeProviders:
+    """
+    Fake provider backends selected by FAKE_PROVIDERS.
+
+    The fakes sit at the HTTP layer (an httpx transport or a requests adapter),
+    so the real SDKs still build the requests, parse the responses, raise their
+    own exceptions and apply their own retries; only the network is replaced.
+    """
+
+    def __init__(self):
+        selected = {name.strip().lower() for name in settings.FAKE_PROVIDERS.split(",") if name.strip()}
+        self.enabled = set(PROVIDERS) if "all" in selected else selected & set(PROVIDERS)
+        unknown = selected - set(PROVIDERS) - {"all"}
+        if unknown:
+            logger.warning(f"Unknown FAKE_PROVIDERS entries ignored: {', '.join(sorted(unknown))}")
+
+        overrides = json.loads(settings.FAKE_PROVIDER_PROFILES) if settings.FAKE_PROVIDER_PROFILES else {}
+        self.profiles: Dict[str, ProviderProfile] = {}
+        for offset, name in enumerate(sorted(self.enabled)):
+            options = {
+                "latency_ms": DEFAULT_LATENCY_MS[name] * settings.FAKE_LATENCY_SCALE,
+                "distribution": settings.FAKE_LATENCY_DISTRIBUTION,
+                "error_rate": settings.FAKE_ERROR_RATE,
+                "rate_limit_rate": settings.FAKE_RATE_LIMIT_RATE,
+                "seed": None if settings.FAKE_SEED is None else settings.FAKE_SEED + offset,
+                **overrides.get(name, {})
+            }
+            self.profiles[name] = ProviderProfile(name, **options)
+        self._handlers: Dict[str, Handler] = {**HANDLERS, "resend": _ResendHandler()}
+
+        if self.enabled:
+            logger.warning(f"Fake providers enabled (no real traffic): {', '.join(sorted(self.enabled))}")
+
+    def is_enabled(self, name: str) -> bool:
+        return name in self.enabled
+
+    def transport(self, name: str) -> Optional[FakeTransport]:
+        """httpx transport for `name`, or None (use the network) when it is not faked."""
+        if name not in self.enabled:
+            return None
+        return FakeTransport(self.profiles[name], self._handlers[name])
+
+    def requests_session(self, name: str) -> Optional[requests.Session]:
+        """requests session whose HTTPS traffic goes to the fake, or None when `name` is not faked."""
+        if name not in self.enabled:
+            return None
+        session = requests.Session()
+        session.mount("https://", FakeRequestsAdapter(
+            self.profiles[name], self._handlers[name], ERROR_BODIES.get(name, _error_body)
+        ))
+        return session
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: profile.stats() for name, profile in self.profiles.items()}
+
+
+# Singleton instance
+fake_providers = FakeProviders()
@@ -0,0 +1,159 @@
+"""Deterministic idempotency keys that stop the same outbound message from being sent twice."""
+import hashlib
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from loguru import logger
+from config import get_settings
+from models.idempotency import IdempotencyKey
+
+settings = get_settings()
+
+
+def make_key(lead_id: int, step: str, day: Optional[date] = None) -> str:
+    """
+    Key for one message: the same lead, step and (UTC) day always hash to the same key.
+
+    Args:
+        lead_id: Lead being contacted
+        step: What is being sent, e.g. "followup" or "sequence:3:2"
+        day: Defaults to today (UTC)
+    """
+    day = day or datetime.now(timezone.utc).date()
+    return hashlib.sha256(f"{lead_id}:{step}:{day.isoformat()}".encode("utf-8")).hexdigest()[:32]
+
+
+class IdempotencyStore:
+    """
+    Send claims recorded in `idempotency_keys`.
+
+    Workers `claim` a message's key in a short transaction of their own, before any
+    LLM or provider work, so a concurrent worker (an overlapping task, a retry)
+    sees the claim immediately and skips the lead. The outcome is settled in the
+    caller's transaction: `mark_sent` once the provider accepted (or the outbox
+    queued) the message, `release` if it was not sent so a later attempt can retry.
+    A claim left pending by a worker that died is retaken after
+    IDEMPOTENCY_CLAIM_TTL_SECONDS.
+    """
+
+    def claim(self, session_factory: Callable[[], Session], entries: List[Dict]) -> Set[str]:
+        """
+        Claim keys, committing immediately.
+
+        Args:
+            entries: Dicts with key, user_id, lead_id, channel and step
+
+        Returns:
+            The keys claimed by this call; keys held by another worker (or already
+            sent) are left out
+        """
+        if not entries:
+            return set()
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        keys = [entry["key"] for entry in entries]
+        rows = [{**entry, "status": "pending", "claim_token": token, "claimed_at": now} for entry in entries]
+
+        db = session_factory()
+        try:
+            claimed = set(self._insert_new(db, rows))
+            # Take over claims abandoned by a worker that never settled them
+            stale = db.execute(
+                update(IdempotencyKey)
+                .where(
+                    IdempotencyKey.key.in_(keys),
+                    IdempotencyKey.status == "pending",
+                    IdempotencyKey.claimed_at < now - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TTL_SECONDS)
+                )
+                .values(claim_token=token, claimed_at=now)
+                .returning(IdempotencyKey.key),
+                execution_options={"synchronize_session": False}
+            ).scalars().all()
+            claimed.update(stale)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if len(claimed) < len(entries):
+            logger.info(f"Skipped {len(entries) - len(claimed)} duplicate sends already claimed by another worker")
+        return claimed
+
+    def sent(self, session_factory: Callable[[], Session], keys: List[str]) -> Set[str]:
+        """The keys among `keys` whose message has already gone out (or been queued)."""
+        if not keys:
+            return set()
+        db = session_factory()
+        try:
+            return set(db.execute(
+                select(IdempotencyKey.key).where(IdempotencyKey.key.in_(keys), IdempotencyKey.status == "sent")
+            ).scalars())
+        finally:
+            db.close()
+
+    def mark_sent(self, db: Session, sent: Dict[str, Optional[str]]) -> None:
+        """Record accepted messages as {key: provider_id} in the caller's transaction."""
+        if not sent:
+            return
+        table = IdempotencyKey.__table__
+        db.execute(
+            update(table)
+            .where(table.c.key == bindparam("b_key"))
+            .values(status="sent", provider_id=bindparam("b_provider_id")),
+            [{"b_key": key, "b_provider_id": provider_id} for key, provider_id in sent.items()]
+        )
+
+    def release(self, db: Session, keys: List[str]) -> None:
+        """Drop unsent claims in the caller's transaction so the message can be retried."""
+        if not keys:
+            return
+        db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.key.in_(keys), IdempotencyKey.status == "pending"),
+            execution_options={"synchronize_session": False}
+        )
+
+    def discard(self, db: Session, keys: List[str]) -> None:
+        """Drop keys whatever their status (a queued message whose delivery failed), in the caller's transaction."""
+        if not keys:
+            return
+        db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.key.in_(keys)),
+            execution_options={"synchronize_session": False}
+        )
+
+    @staticmethod
+    def _insert_new(db: Session, rows: List[Dict]) -> List[str]:
+        """Insert the rows whose key is not taken yet; returns the inserted keys."""
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = (
+                dialect_insert(IdempotencyKey)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["key"])
+                .returning(IdempotencyKey.key)
+            )
+            return list(db.execute(statement).scalars())
+
+        # Other backends: one savepoint per row
+        inserted = []
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(IdempotencyKey).values(**row))
+                inserted.append(row["key"])
+            except IntegrityError:
+                pass
+        return inserted
+
+
+# Singleton instance
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,175 @@
+"""Content-addressed cache for LLM completions."""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from config import get_settings
+
+settings = get_settings()
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry TTL (per worker process)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCacheBackend:
+    """File-backed cache shared by every process on the host; LRU by last access."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+class RedisCacheBackend:
+    """Cache shared across hosts; TTL via EXPIRE, LRU via the server's maxmemory-policy."""
+
+    def __init__(self, url: str, namespace: str = "followupai:llm:"):
+        import redis
+        self.namespace = namespace
+        self._client = redis.Redis.from_url(url, socket_timeout=1.0, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self.namespace + key)
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self._client.set(self.namespace + key, value, ex=ttl)
+
+
+class LLMCache:
+    """
+    Completions keyed on a hash of the rendered prompt, model, and temperature.
+
+    Backend errors are logged and treated as misses so the cache can never
+    block generation.
+    """
+
+    def __init__(self, backend: Optional[Any], ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, str]], model: str, temperature: float) -> str:
+        payload = json.dumps({"messages": messages, "model": model, "temperature": temperature}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__ if self.backend else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+def build_llm_cache() -> LLMCache:
+    """Create the cache selected by LLM_CACHE_BACKEND (memory | sqlite | redis | none)."""
+    backend_name = settings.LLM_CACHE_BACKEND.lower()
+    backend = None
+    try:
+        if backend_name == "memory":
+            backend = MemoryCacheBackend(settings.LLM_CACHE_MAX_ENTRIES)
+        elif backend_name == "sqlite":
+            backend = SQLiteCacheBackend(settings.LLM_CACHE_SQLITE_PATH, settings.LLM_CACHE_MAX_ENTRIES)
+        elif backend_name == "redis":
+            backend = RedisCacheBackend(settings.REDIS_URL)
+        elif backend_name != "none":
+            logger.warning(f"Unknown LLM_CACHE_BACKEND '{backend_name}', caching disabled")
+    except Exception as e:
+        logger.error(f"Failed to initialize {backend_name} LLM cache, caching disabled: {e}")
+        backend = None
+    return LLMCache(backend, ttl=settings.LLM_CACHE_TTL_SECONDS)
+
+
+# Singleton instance
+llm_cache = build_llm_cache()
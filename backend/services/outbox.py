@@ -0,0 +1,256 @@
+"""Transactional outbox: rendered messages are queued with the lead update and delivered separately."""
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+from sqlalchemy import Integer, and_, bindparam, insert, or_
+from sqlalchemy.orm import Session
+from loguru import logger
+from config import get_settings
+from models.lead import Lead
+from models.outbox import OutboxMessage
+from services.activity_sink import ActivitySink
+from services.communication_service import comm_service
+from services.database import SessionLocal, lease_rows
+from services.idempotency import idempotency_store
+from services.timer_queue import timer_queue
+
+settings = get_settings()
+
+# Activity row written when a message on each channel is delivered
+DELIVERED_ACTIONS = {"email": "sent_email", "whatsapp": "custom_email_sent"}
+PROVIDER_ID_KEYS = {"email": "email_id", "whatsapp": "sid"}
+
+
+class Outbox:
+    """
+    Outbound messages stored in `outbox_messages`.
+
+    Producers (the agent cycle, sequences) call `enqueue` inside the transaction
+    that updates the lead, so a message exists if and only if that update
+    committed. Delivery workers `drain` the table at their own pace: rows are
+    claimed under a lease (SKIP LOCKED on Postgres), sent, and marked sent or
+    rescheduled with backoff. A worker that dies mid-batch only loses its lease,
+    so the rows are picked up again (at-least-once delivery).
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self.session_factory = session_factory
+
+    def enqueue(self, db: Session, messages: List[Dict]) -> int:
+        """
+        Queue rendered messages with one bulk INSERT; the caller owns the commit.
+
+        Args:
+            messages: Dicts with user_id, lead_id, channel, recipient, body and
+                optional subject/details/idempotency_key, prior_contacted_at and
+                contacted_at (the lead's contact date before and after the producer
+                stamped it), and sequence_id/sequence_step for a sequence step
+
+        Returns:
+            Number of messages queued
+        """
+        if not messages:
+            return 0
+        now = datetime.now(timezone.utc)
+        db.execute(insert(OutboxMessage), [
+            {
+                "subject": None, "details": None, "idempotency_key": None, "prior_contacted_at": None,
+                "contacted_at": None, "sequence_id": None, "sequence_step": None,
+                **message, "status": "pending", "attempts": 0, "available_at": now
+            }
+            for message in messages
+        ])
+        return len(messages)
+
+    def claim(self, db: Session, limit: int) -> List[OutboxMessage]:
+        """Lease up to `limit` due messages to this caller and commit the claim."""
+        now = datetime.now(timezone.utc)
+        token = uuid.uuid4().hex
+        claimable = and_(
+            OutboxMessage.status == "pending",
+            OutboxMessage.available_at <= now,
+            or_(OutboxMessage.locked_until.is_(None), OutboxMessage.locked_until < now)
+        )
+        lease_rows(db, OutboxMessage, claimable, OutboxMessage.id, limit, {
+            "claim_token": token,
+            "locked_until": now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+            "attempts": OutboxMessage.attempts + 1
+        })
+        return db.query(OutboxMessage).filter(OutboxMessage.claim_token == token).order_by(OutboxMessage.id).all()
+
+    def deliver_batch(self, limit: int = None) -> Dict[str, int]:
+        """
+        Claim one batch, send it, and record the outcome.
+
+        Emails go out through the batch API; WhatsApp messages concurrently where
+        the provider allows it.
+
+        Returns:
+            Counts of claimed, sent, retrying and failed messages
+        """
+        limit = limit or settings.OUTBOX_BATCH_SIZE
+        db = self.session_factory()
+        try:
+            messages = self.claim(db, limit)
+            if not messages:
+                return {"claimed": 0, "sent": 0, "retrying": 0, "failed": 0}
+
+            results: Dict[int, dict] = {}
+            emails = [message for message in messages if message.channel == "email"]
+            if emails:
+                email_results = comm_service.send_email_batch([
+                    {
+                        "to_email": message.recipient,
+                        "subject": message.subject,
+                        "html_content": message.body,
+                        "idempotency_key": message.idempotency_key
+                    }
+                    for message in emails
+                ])
+                results.update(zip((message.id for message in emails), email_results))
+            whatsapps = [message for message in messages if message.channel == "whatsapp"]
+            if whatsapps:
+                whatsapp_results = comm_service.send_whatsapp_batch([
+                    {"to_phone": message.recipient, "message": message.body} for message in whatsapps
+                ])
+                results.update(zip((message.id for message in whatsapps), whatsapp_results))
+            for message in messages:
+                if message.channel not in DELIVERED_ACTIONS:
+                    results[message.id] = {"success": False, "error": f"Unknown channel '{message.channel}'"}
+
+            sink = ActivitySink(self.session_factory, db=db)
+            counts = {"claimed": len(messages), "sent": 0, "retrying": 0, "failed": 0}
+            settled = []
+            for message in messages:
+                outcome = self._record(message, results[message.id], sink)
+                counts[outcome] += 1
+                if outcome != "retrying":
+                    settled.append(message)
+
+            retries = self._settle_leads(db, settled)
+            sink.flush()
+            db.commit()
+            if retries and timer_queue is not None:
+                timer_queue.schedule(retries)
+            return counts
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def drain(self, max_seconds: float = 50.0) -> Dict[str, int]:
+        """Deliver batches until nothing is due or `max_seconds` have passed."""
+        started = time.monotonic()
+        totals = {"claimed": 0, "sent": 0, "retrying": 0, "failed": 0}
+        while time.monotonic() - started < max_seconds:
+            counts = self.deliver_batch()
+            for key, value in counts.items():
+                totals[key] += value
+            if counts["claimed"] == 0:
+                break
+        return totals
+
+    @staticmethod
+    def _settle_leads(db: Session, messages: List[OutboxMessage]) -> Dict[int, datetime]:
+        """
+        Bring the leads of delivered and failed messages in line with what happened.
+
+        Producers stamp a lead as contacted (and advance its sequence) when its
+        message is queued. A delivered message moves the contact date forward to
+        the delivery time. A failed one drops its idempotency key, restores the
+        previous contact date unless the lead was contacted again meanwhile, and
+        puts a sequence lead back on the undelivered step, due again after
+        SEQUENCE_RETRY_SECONDS, so the lead is retried instead of skipping it.
+
+        Returns:
+            Retry time by lead id for the sequence steps that were rolled back
+        """
+        leads = Lead.__table__
+        sent = [
+            {"lead_id": message.lead_id, "sent": message.sent_at}
+            for message in messages if message.status == "sent" and message.lead_id is not None
+        ]
+        failed = [message for message in messages if message.status == "failed"]
+        if sent:
+            db.execute(
+                leads.update()
+                .where(
+                    leads.c.id == bindparam("lead_id"),
+                    or_(leads.c.last_contacted_date.is_(None), leads.c.last_contacted_date < bindparam("sent"))
+                )
+                .values(last_contacted_date=bindparam("sent")),
+                sent
+            )
+        restored = [
+            {"lead_id": message.lead_id, "stamp": message.contacted_at, "prior": message.prior_contacted_at}
+            for message in failed if message.lead_id is not None and message.contacted_at is not None
+        ]
+        if restored:
+            db.execute(
+                leads.update()
+                .where(leads.c.id == bindparam("lead_id"), leads.c.last_contacted_date == bindparam("stamp"))
+                .values(last_contacted_date=bindparam("prior")),
+                restored
+            )
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SEQUENCE_RETRY_SECONDS)
+        steps = [
+            {"lead_id": message.lead_id, "sequence": message.sequence_id, "step": message.sequence_step}
+            for message in failed if message.lead_id is not None and message.sequence_step is not None
+        ]
+        if steps:
+            # Only while the lead is still on the step this message ran (not moved on or re-enrolled)
+            db.execute(
+                leads.update()
+                .where(
+                    leads.c.id == bindparam("lead_id"),
+                    leads.c.sequence_id == bindparam("sequence"),
+                    leads.c.current_step_number == bindparam("step")
+                )
+                .values(current_step_number=bindparam("step", type_=Integer) - 1, next_action_at=retry_at),
+                steps
+            )
+        idempotency_store.discard(db, [message.idempotency_key for message in failed if message.idempotency_key])
+        return {step["lead_id"]: retry_at for step in steps}
+
+    def _record(self, message: OutboxMessage, result: dict, sink: ActivitySink) -> str:
+        """Apply one send result to its row and stage the activity log; returns the outcome."""
+        now = datetime.now(timezone.utc)
+        message.claim_token = None
+        message.locked_until = None
+        details = dict(message.details or {})
+
+        if result.get("success"):
+            message.status = "sent"
+            message.sent_at = now
+            message.provider_id = result.get("id")
+            message.last_error = None
+            details[PROVIDER_ID_KEYS.get(message.channel, "provider_id")] = message.provider_id
+            sink.add(message.user_id, message.lead_id, DELIVERED_ACTIONS.get(message.channel, "sent"), details)
+            return "sent"
+
+        message.last_error = result.get("error")
+        if result.get("deferred"):
+            # The provider's breaker is open: not the message's fault, so the attempt is refunded
+            message.attempts -= 1
+            message.available_at = now + timedelta(seconds=settings.CIRCUIT_RESET_SECONDS)
+            return "retrying"
+
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = "failed"
+            logger.error(f"Outbox message {message.id} failed after {message.attempts} attempts: {message.last_error}")
+            sink.add(message.user_id, message.lead_id, "error", {
+                "error": message.last_error,
+                "channel": message.channel,
+                "lead_name": details.get("lead_name")
+            })
+            return "failed"
+
+        # Exponential backoff: 30s, 60s, 120s, ...
+        message.available_at = now + timedelta(seconds=30 * 2 ** (message.attempts - 1))
+        return "retrying"
+
+
+# Singleton instance
+outbox = Outbox()
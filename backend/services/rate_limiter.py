@@ -0,0 +1,205 @@
+"""Token-bucket rate limiting for LLM provider requests."""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from config import get_settings
+
+settings = get_settings()
+
+# Refill both buckets, then take the cost if both can cover it. Returns "0" when
+# granted, otherwise the seconds until the scarcer bucket has refilled enough.
+# Server time keeps every worker on the same clock.
+TOKEN_BUCKET_SCRIPT = """
+local capacity_requests = tonumber(ARGV[1])
+local capacity_tokens = tonumber(ARGV[2])
+local window = tonumber(ARGV[3])
+local cost_tokens = tonumber(ARGV[4])
+
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated_at')
+local requests = tonumber(state[1]) or capacity_requests
+local tokens = tonumber(state[2]) or capacity_tokens
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+
+requests = math.min(capacity_requests, requests + elapsed * capacity_requests / window)
+tokens = math.min(capacity_tokens, tokens + elapsed * capacity_tokens / window)
+
+local wait = 0
+if requests >= 1 and tokens >= cost_tokens then
+    requests = requests - 1
+    tokens = tokens - cost_tokens
+else
+    wait = math.max(
+        (1 - requests) * window / capacity_requests,
+        (cost_tokens - tokens) * window / capacity_tokens
+    )
+end
+
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+return tostring(wait)
+"""
+
+
+class LocalTokenBuckets:
+    """Request and token buckets for a single process."""
+
+    def __init__(self, requests_per_window: int, tokens_per_window: int, window: float):
+        self.capacity_requests = requests_per_window
+        self.capacity_tokens = tokens_per_window
+        self.window = window
+        self._requests = float(requests_per_window)
+        self._tokens = float(tokens_per_window)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    async def try_acquire(self, cost_tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated_at
+            self._updated_at = now
+            self._requests = min(self.capacity_requests, self._requests + elapsed * self.capacity_requests / self.window)
+            self._tokens = min(self.capacity_tokens, self._tokens + elapsed * self.capacity_tokens / self.window)
+
+            if self._requests >= 1 and self._tokens >= cost_tokens:
+                self._requests -= 1
+                self._tokens -= cost_tokens
+                return 0.0
+            return max(
+                (1 - self._requests) * self.window / self.capacity_requests,
+                (cost_tokens - self._tokens) * self.window / self.capacity_tokens
+            )
+
+
+class RedisTokenBuckets:
+    """Request and token buckets shared by every worker through one Redis hash."""
+
+    def __init__(self, url: str, key: str, requests_per_window: int, tokens_per_window: int, window: float):
+        import redis.asyncio as aioredis
+        self.key = key
+        self.capacity_requests = requests_per_window
+        self.capacity_tokens = tokens_per_window
+        self.window = window
+        self._client = aioredis.Redis.from_url(url, socket_timeout=1.0)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def try_acquire(self, cost_tokens: int) -> float:
+        wait = await self._script(
+            keys=[self.key],
+            args=[self.capacity_requests, self.capacity_tokens, self.window, cost_tokens]
+        )
+        return float(wait)
+
+
+class RateLimiter:
+    """
+    Waits until both the request (RPM) and token (TPM) budgets can cover a call.
+
+    Callers are delayed rather than failed, so bursts are smoothed out below the
+    provider's limits instead of turning into 429s and fallback copy. If the
+    shared (Redis) buckets are unreachable, the process-local ones take over.
+    """
+
+    def __init__(self, name: str, buckets: Optional[Any], local: Optional[LocalTokenBuckets] = None):
+        self.name = name
+        self.buckets = buckets
+        self.local = local
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Rough prompt size (~4 characters per token) plus the completion budget."""
+        prompt_chars = sum(len(message.get("content") or "") for message in messages)
+        return prompt_chars // 4 + max_tokens
+
+    async def acquire(self, tokens: int) -> float:
+        """
+        Wait for capacity for one request costing `tokens`.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.buckets is None:
+            return 0.0
+
+        # A request larger than the whole window's budget could never be granted
+        tokens = min(tokens, self.buckets.capacity_tokens)
+        started = time.monotonic()
+        delayed = False
+        while True:
+            wait = await self._try_acquire(tokens)
+            if wait <= 0:
+                break
+            delayed = True
+            await asyncio.sleep(wait)
+
+        waited = time.monotonic() - started if delayed else 0.0
+        self._record(waited)
+        if waited > 1:
+            logger.debug(f"Rate limiter '{self.name}' delayed a request by {waited:.2f}s")
+        return waited
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self.buckets).__name__ if self.buckets else None,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "total_wait_seconds": round(self.total_wait_seconds, 3),
+                "avg_wait_seconds": round(self.total_wait_seconds / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 3)
+            }
+
+    async def _try_acquire(self, tokens: int) -> float:
+        try:
+            return await self.buckets.try_acquire(tokens)
+        except Exception as e:
+            if self.local is None:
+                raise
+            logger.warning(f"Rate limiter '{self.name}' using local buckets: {e}")
+            return await self.local.try_acquire(tokens)
+
+    def _record(self, waited: float) -> None:
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if waited > 0:
+                self.waited += 1
+
+
+def build_groq_limiter() -> RateLimiter:
+    """Create the Groq limiter selected by GROQ_RATE_LIMIT_BACKEND (auto | memory | redis | none)."""
+    backend_name = settings.GROQ_RATE_LIMIT_BACKEND.lower()
+    if backend_name == "auto":
+        # One budget for every web and worker process whenever they share a Redis
+        backend_name = "redis" if settings.REDIS_URL else "memory"
+    window = 60.0
+    local = LocalTokenBuckets(settings.GROQ_RPM_LIMIT, settings.GROQ_TPM_LIMIT, window)
+
+    if backend_name == "none":
+        return RateLimiter("groq", None)
+    if backend_name == "redis":
+        try:
+            buckets = RedisTokenBuckets(
+                settings.REDIS_URL, "followupai:ratelimit:groq",
+                settings.GROQ_RPM_LIMIT, settings.GROQ_TPM_LIMIT, window
+            )
+            return RateLimiter("groq", buckets, local=local)
+        except Exception as e:
+            logger.error(f"Failed to initialize Redis rate limiter, using local buckets: {e}")
+    elif backend_name != "memory":
+        logger.warning(f"Unknown GROQ_RATE_LIMIT_BACKEND '{backend_name}', using local buckets")
+    return RateLimiter("groq", local)
+
+
+# Singleton instance
+groq_limiter = build_groq_limiter()
@@ -0,0 +1,203 @@
+"""Versioned in-process cache of sequence definitions, invalidated over Redis pub/sub."""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
+from loguru import logger
+from config import get_settings
+from models.sequence import Sequence, SequenceStep
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class CachedStep:
+    """Read-only copy of a SequenceStep row."""
+    id: int
+    sequence_id: int
+    step_number: int
+    wait_days: int
+    action_type: str
+    template_name: Optional[str]
+
+
+@dataclass(frozen=True)
+class CachedSequence:
+    """Read-only copy of a Sequence row and its steps (ordered by step number)."""
+    id: int
+    name: str
+    description: Optional[str]
+    created_at: Optional[datetime]
+    steps: Tuple[CachedStep, ...]
+
+
+StepMap = Dict[Tuple[int, int], CachedStep]
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int  # Shared version it was loaded at (-1 when Redis is unreachable)
+    loaded_at: float
+    sequences: Tuple[CachedSequence, ...]
+    steps: StepMap
+
+
+class SequenceCache:
+    """
+    Every sequence definition, loaded once per process (two queries) and served from memory.
+
+    Changes go through `invalidate`, which drops the local snapshot and bumps a
+    shared version in Redis, published on a channel every process subscribes to;
+    older snapshots are dropped on receipt. SEQUENCE_CACHE_TTL_SECONDS bounds how
+    stale a snapshot can get if a message is missed (Redis down, reconnecting).
+    Snapshots are kept per database URL, so separate databases never share one.
+    """
+
+    def __init__(self, url: str, ttl: int, namespace: str = "followupai:sequences"):
+        self.url = url
+        self.ttl = ttl
+        self.version_key = f"{namespace}:version"
+        self.channel = f"{namespace}:invalidate"
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._generation = 0  # Bumped by every invalidation; guards loads that raced one
+        self._lock = threading.Lock()
+        self._client = None
+        self._listener: Optional[threading.Thread] = None
+
+    def all(self, db: Session) -> List[CachedSequence]:
+        """All sequences, ordered by id."""
+        return list(self._snapshot(db).sequences)
+
+    def get(self, db: Session, sequence_id: int) -> Optional[CachedSequence]:
+        return next((sequence for sequence in self._snapshot(db).sequences if sequence.id == sequence_id), None)
+
+    def step_map(self, db: Session) -> StepMap:
+        """Every step keyed by (sequence_id, step_number)."""
+        return self._snapshot(db).steps
+
+    def step(self, db: Session, sequence_id: int, step_number: int) -> Optional[CachedStep]:
+        """
+        One step, confirmed against the database on a miss.
+        
+        A miss is usually the end of a sequence, but can be a step or sequence added
+        after this snapshot loaded (its invalidation not received yet); if the row
+        exists, the snapshot is reloaded.
+        """
+        key = (sequence_id, step_number)
+        step = self._snapshot(db).steps.get(key)
+        if step is None and db.query(SequenceStep.id).filter(
+            SequenceStep.sequence_id == sequence_id, SequenceStep.step_number == step_number
+        ).first() is not None:
+            self._drop()
+            step = self._snapshot(db).steps.get(key)
+        return step
+
+    def invalidate(self) -> None:
+        """Drop this process's snapshots and tell every other process to drop theirs; call after committing."""
+        self._drop()
+        try:
+            version = self._redis().incr(self.version_key)
+            self._redis().publish(self.channel, version)
+        except Exception as e:
+            logger.warning(f"Could not publish sequence cache invalidation (others refresh within the TTL): {e}")
+
+    def _snapshot(self, db: Session) -> _Snapshot:
+        key = str(db.get_bind().url)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            generation = self._generation
+        if snapshot and (self.ttl <= 0 or time.monotonic() - snapshot.loaded_at < self.ttl):
+            return snapshot
+
+        self._listen()
+        version = self._shared_version()
+        sequences = db.query(Sequence).options(selectinload(Sequence.steps)).order_by(Sequence.id).all()
+        cached = tuple(
+            CachedSequence(
+                id=sequence.id,
+                name=sequence.name,
+                description=sequence.description,
+                created_at=sequence.created_at,
+                steps=tuple(
+                    CachedStep(
+                        id=step.id,
+                        sequence_id=step.sequence_id,
+                        step_number=step.step_number,
+                        wait_days=step.wait_days,
+                        action_type=step.action_type,
+                        template_name=step.template_name
+                    )
+                    for step in sorted(sequence.steps, key=lambda step: step.step_number)
+                )
+            )
+            for sequence in sequences
+        )
+        snapshot = _Snapshot(
+            version=version,
+            loaded_at=time.monotonic(),
+            sequences=cached,
+            steps={(step.sequence_id, step.step_number): step for sequence in cached for step in sequence.steps}
+        )
+        if self.ttl > 0:
+            with self._lock:
+                # A change committed while loading may not be in these rows
+                if generation == self._generation:
+                    self._snapshots[key] = snapshot
+        return snapshot
+
+    def _drop(self, older_than: Optional[int] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if older_than is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots = {
+                    key: snapshot for key, snapshot in self._snapshots.items()
+                    if 0 <= older_than <= snapshot.version
+                }
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=1.0, decode_responses=True)
+        return self._client
+
+    def _shared_version(self) -> int:
+        try:
+            return int(self._redis().get(self.version_key) or 0)
+        except Exception:
+            return -1
+
+    def _listen(self) -> None:
+        """Start the invalidation subscriber once per process."""
+        with self._lock:
+            if self._listener is not None or self.ttl <= 0:
+                return
+            self._listener = threading.Thread(target=self._subscribe, name="sequence-cache", daemon=True)
+        self._listener.start()
+
+    def _subscribe(self) -> None:
+        import redis
+        backoff = 1.0
+        while True:
+            try:
+                # No socket timeout: the subscription blocks until a message arrives
+                pubsub = redis.Redis.from_url(self.url, decode_responses=True).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while disconnected was missed
+                self._drop()
+                backoff = 1.0
+                for message in pubsub.listen():
+                    self._drop(older_than=int(message["data"]))
+            except Exception as e:
+                # Warn once per outage; the TTL keeps snapshots fresh meanwhile
+                log = logger.warning if backoff == 1.0 else logger.debug
+                log(f"Sequence cache subscriber disconnected, retrying in {backoff:.0f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+
+# Singleton instance
+sequence_cache = SequenceCache(settings.REDIS_URL, ttl=settings.SEQUENCE_CACHE_TTL_SECONDS)
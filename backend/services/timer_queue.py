@@ -0,0 +1,110 @@
+"""Redis sorted-set timer queue that fires sequence steps at their due time."""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+from config import get_settings
+from services.database import as_utc
+
+settings = get_settings()
+
+
+class TimerQueue:
+    """
+    Due times of scheduled sequence steps, one sorted-set member per lead.
+
+    Scores are epoch seconds, so rescheduling a lead overwrites its timer and the
+    earliest timers are one range read away. Any number of workers can `pump`
+    the queue: each due member is removed with its own ZREM, and only the pump
+    whose ZREM succeeded fires it. Scheduling never raises; a timer lost to a
+    Redis error is re-armed by the safety sweep.
+    """
+
+    def __init__(self, client, key: str = "followupai:timers:sequence"):
+        self._client = client
+        self.key = key
+
+    def schedule(self, due: Dict[int, Optional[datetime]]) -> None:
+        """Set the timers of {lead_id: due_at}; a None due time cancels the lead's timer."""
+        if not due:
+            return
+        add = {str(lead_id): as_utc(due_at).timestamp() for lead_id, due_at in due.items() if due_at is not None}
+        cancel = [str(lead_id) for lead_id, due_at in due.items() if due_at is None]
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            if add:
+                pipe.zadd(self.key, add)
+            if cancel:
+                pipe.zrem(self.key, *cancel)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not schedule {len(due)} sequence timers: {e}")
+
+    def pop_due(self, limit: int) -> List[int]:
+        """Take up to `limit` timers that are due; returns their lead ids."""
+        members = self._client.zrangebyscore(self.key, "-inf", time.time(), start=0, num=limit)
+        if not members:
+            return []
+        pipe = self._client.pipeline(transaction=False)
+        for member in members:
+            pipe.zrem(self.key, member)
+        removed = pipe.execute()
+        return [int(member) for member, won in zip(members, removed) if won]
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Time until the earliest timer is due (None if the queue is empty)."""
+        first = self._client.zrange(self.key, 0, 0, withscores=True)
+        return max(0.0, first[0][1] - time.time()) if first else None
+
+    async def pump(self, fire: Callable[[List[int]], Awaitable], stop: asyncio.Event) -> None:
+        """
+        Fire due timers until `stop` is set, sleeping until the next one is due.
+
+        Args:
+            fire: Called with each batch of due lead ids (enqueues their task)
+            stop: Set on worker shutdown
+        """
+        poll = settings.SEQUENCE_TIMER_POLL_SECONDS
+        while not stop.is_set():
+            wait = poll
+            try:
+                lead_ids = await asyncio.to_thread(self.pop_due, settings.SEQUENCE_CLAIM_BATCH_SIZE)
+                if lead_ids:
+                    try:
+                        await fire(lead_ids)
+                    except Exception:
+                        # Put the timers back so the next tick retries them
+                        self.schedule({lead_id: datetime.now(timezone.utc) for lead_id in lead_ids})
+                        raise
+                    continue
+                # Timers added meanwhile are caught by the next poll
+                until_next = await asyncio.to_thread(self.seconds_until_next)
+                if until_next is not None:
+                    wait = min(poll, until_next)
+            except Exception as e:
+                logger.warning(f"Sequence timer pump error: {e}")
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+
+def build_timer_queue() -> Optional[TimerQueue]:
+    """Create the timer queue selected by SEQUENCE_TIMER_BACKEND (redis | none)."""
+    backend_name = settings.SEQUENCE_TIMER_BACKEND.lower()
+    if backend_name == "none":
+        return None
+    if backend_name != "redis":
+        logger.warning(f"Unknown SEQUENCE_TIMER_BACKEND '{backend_name}', sequence timers disabled")
+        return None
+    try:
+        import redis
+        return TimerQueue(redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1.0, decode_responses=True))
+    except Exception as e:
+        logger.error(f"Failed to initialize sequence timer queue, relying on the sweep: {e}")
+        return None
+
+
+# Singleton instance
+timer_queue = build_timer_queue()
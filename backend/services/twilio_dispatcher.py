@@ -0,0 +1,82 @@
+"""Concurrent, rate-limited dispatch for blocking Twilio sends."""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from loguru import logger
+from services.event_loop import background_loop
+from services.rate_limiter import LocalTokenBuckets, RateLimiter, RedisTokenBuckets
+
+
+class TwilioDispatcher:
+    """
+    Runs Twilio SDK calls on a bounded thread pool.
+
+    The SDK is blocking, so sending hundreds of sequence steps one after another
+    spends most of the time waiting on round trips. Each send here runs on one of
+    `max_workers` threads and first takes a slot from a per-account token bucket
+    (`messages_per_second`), keeping the pool at the account's quota without
+    exceeding it.
+
+    With a `redis_url` the bucket lives in Redis, so the quota holds across every
+    process sending for the account; otherwise (or while Redis is unreachable)
+    each process enforces it on its own.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], dict],
+        max_workers: int,
+        messages_per_second: float,
+        redis_url: Optional[str] = None
+    ):
+        if messages_per_second <= 0:
+            raise ValueError(f"messages_per_second must be positive, got {messages_per_second}")
+        self.send = send
+        self.max_workers = max_workers
+        self.messages_per_second = messages_per_second
+        self.redis_url = redis_url
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, to_phone: str, message: str, account: str = "default") -> "Future[dict]":
+        """Queue one send; the future resolves to a `send_whatsapp`-style result."""
+        return self._executor().submit(self._send, account, to_phone, message)
+
+    async def asend(self, to_phone: str, message: str, account: str = "default") -> dict:
+        """Awaitable variant of `submit`, for gathering from async code."""
+        return await asyncio.wrap_future(self.submit(to_phone, message, account))
+
+    def stats(self) -> Dict[str, dict]:
+        return {account: limiter.stats() for account, limiter in self._limiters.items()}
+
+    def _send(self, account: str, to_phone: str, message: str) -> dict:
+        # Wait for the account's rate budget on this worker thread
+        background_loop.run(self._limiter(account).acquire(0))
+        return self.send(to_phone, message)
+
+    def _limiter(self, account: str) -> RateLimiter:
+        with self._lock:
+            if account not in self._limiters:
+                # Requests-only bucket (no token budget) holding at least one send:
+                # rates below 1/s get a longer window instead of a bucket that never fills
+                capacity = max(1.0, self.messages_per_second)
+                window = capacity / self.messages_per_second
+                local = LocalTokenBuckets(capacity, 1, window=window)
+                buckets = None
+                if self.redis_url:
+                    try:
+                        buckets = RedisTokenBuckets(
+                            self.redis_url, f"followupai:ratelimit:twilio:{account}", capacity, 1, window
+                        )
+                    except Exception as e:
+                        logger.error(f"Failed to initialize Redis rate limiter for Twilio, using local buckets: {e}")
+                self._limiters[account] = RateLimiter(f"twilio:{account}", buckets or local, local=local if buckets else None)
+            return self._limiters[account]
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="twilio-dispatch")
+            return self._pool
@@ -0,0 +1,257 @@
+"""Query-budget checks for the autonomous agent cycle."""
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from services.database import Base
+from models.activity_log import ActivityLog
+from models.user import User
+from models.lead import Lead
+from agents.agent_runner import AgentRunner, settings
+from services.activity_sink import ActivitySink
+
+LEAD_COUNT = 1000
+# SQLite reads one keyset page per chunk, plus the empty page that ends the scan
+LEAD_PAGES = LEAD_COUNT // settings.AGENT_CHUNK_SIZE + 1
+
+
+def _seed_cycle_db(lead_count: int):
+    """Create an isolated SQLite database with one user and `lead_count` due leads."""
+    db_path = os.path.join(tempfile.mkdtemp(), "cycle.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    user = User(email="cycle@followupai.com", full_name="Cycle", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    contacted = datetime.now(timezone.utc) - timedelta(days=10)  # needs_followup window
+    db.add_all([
+        Lead(
+            user_id=user.id,
+            name=f"Lead {i}",
+            email=f"lead{i}@example.com",
+            company=f"Company {i}",
+            last_contacted_date=contacted,
+            status="active"
+        )
+        for i in range(lead_count)
+    ])
+    db.commit()
+    return engine, db, user.id
+
+
+@contextmanager
+def _mock_providers(failing_lead=None):
+    """Stub the LLM and outbound providers so the cycle stays offline."""
+    body = "Hi there,\n\nQuick follow-up.\n\nBest,"
+
+    def generate_email(lead, context_type="followup"):
+        if lead.name == failing_lead:
+            raise RuntimeError("provider exploded")
+        return body
+
+    generator = MagicMock()
+    generator.generate_email.side_effect = generate_email
+    # No draft for the failing lead, so the workflow generates (and fails) it per lead
+    generator.generate_emails.side_effect = lambda leads, context_type="followup": [
+        "" if lead.name == failing_lead else body for lead in leads
+    ]
+    comm = MagicMock()
+    comm.send_email.return_value = {"success": True, "id": "mock_id"}
+    comm.send_email_batch.side_effect = lambda messages: [
+        {"success": True, "id": f"mock_{i}"} for i in range(len(messages))
+    ]
+    with patch("agents.workflow.email_generator", generator), \
+            patch("agents.agent_runner.email_generator", generator), \
+            patch("agents.agent_runner.comm_service", comm):
+        yield generator, comm
+
+
+def _run_counting_statements(concurrency: int):
+    engine, db, user_id = _seed_cycle_db(LEAD_COUNT)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+
+    try:
+        with _mock_providers():
+            result = AgentRunner(db, user_id).run(concurrency=concurrency)
+    finally:
+        db.close()
+        engine.dispose()
+
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+    return result, statements, selects
+
+
+def _activity_inserts(statements):
+    return [sql for sql in statements if sql.lstrip().upper().startswith("INSERT INTO ACTIVITY_LOGS")]
+
+
+def test_cycle_reuses_loaded_leads():
+    """A 1k-lead cycle must load leads once, a page per chunk, instead of re-querying them per lead."""
+    result, statements, selects = _run_counting_statements(concurrency=1)
+
+    assert result["leads_processed"] == LEAD_COUNT
+    assert result["actions_taken"] == LEAD_COUNT
+    assert len(selects) == LEAD_PAGES, f"Expected {LEAD_PAGES} lead page SELECTs, got {len(selects)}"
+    # Free text the cycle never reads stays deferred
+    assert not any("last_message" in sql for sql in selects)
+    # 2k activity rows (classified + sent_email) must go out as a handful of bulk INSERTs
+    inserts = _activity_inserts(statements)
+    assert len(inserts) < LEAD_COUNT // 10, f"Activity rows not batched: {len(inserts)} INSERTs"
+    print(f"✅ Serial cycle: {len(statements)} statements, {len(selects)} SELECTs for {LEAD_COUNT} leads")
+
+
+def test_concurrent_cycle_reuses_loaded_leads():
+    """Concurrent workers attach the pre-loaded leads instead of fetching them again."""
+    result, statements, selects = _run_counting_statements(concurrency=4)
+
+    assert result["actions_taken"] == LEAD_COUNT
+    assert len(selects) == LEAD_PAGES, f"Expected {LEAD_PAGES} lead page SELECTs, got {len(selects)}"
+    print(f"✅ Concurrent cycle: {len(statements)} statements, {len(selects)} SELECTs for {LEAD_COUNT} leads")
+
+
+def test_chunked_cycle_isolates_failures():
+    """Chunks commit their work once each, and a failing lead only rolls back its own savepoint."""
+    engine, db, user_id = _seed_cycle_db(100)
+    failing_email = "lead42@example.com"
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+
+    try:
+        with _mock_providers(failing_lead="Lead 42") as (_, comm):
+            result = AgentRunner(db, user_id).run(concurrency=1, chunk_size=25)
+
+        check = sessionmaker(bind=engine)()
+        statuses = dict(check.query(Lead.email, Lead.status).all())
+        errors = check.query(ActivityLog).filter(ActivityLog.action_type == "error").all()
+        check.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert result["actions_taken"] == 99
+    # Per chunk: one commit for the send claims, one for the leads' work
+    assert len(commits) == 8, f"Expected two commits per chunk, got {len(commits)}"
+    assert comm.send_email_batch.call_count == 4 and comm.send_email.call_count == 0
+    assert statuses[failing_email] == "active", "Failed lead's status change was not rolled back"
+    assert sum(1 for status in statuses.values() if status == "needs_followup") == 99
+    assert [log.details["lead_name"] for log in errors] == ["Lead 42"]
+    print(f"✅ Chunked cycle: {len(commits)} commits for 100 leads, failure isolated to one lead")
+
+
+def test_cycle_drafts_emails_in_batches():
+    """Each chunk drafts its emails with one batched call per context, not one call per lead."""
+    engine, db, user_id = _seed_cycle_db(100)
+    try:
+        with _mock_providers() as (generator, _):
+            result = AgentRunner(db, user_id).run(concurrency=1, chunk_size=50)
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert result["actions_taken"] == 100
+    assert generator.generate_email.call_count == 0
+    assert generator.generate_emails.call_count == 2, "Expected one batched call per chunk"
+    assert all(call.kwargs["context_type"] == "followup" for call in generator.generate_emails.call_args_list)
+    print(f"✅ Batched drafting: {generator.generate_emails.call_count} generation calls for 100 leads")
+
+
+def test_cycle_only_loads_leads_needing_action():
+    """Active leads are filtered out in SQL; stale statuses are still synced."""
+    engine, db, user_id = _seed_cycle_db(10)
+    recent = datetime.now(timezone.utc) - timedelta(days=1)
+    db.add_all([
+        Lead(user_id=user_id, name=f"Active {i}", email=f"active{i}@example.com",
+             last_contacted_date=recent, status="active")
+        for i in range(50)
+    ])
+    db.add(Lead(user_id=user_id, name="Replied", email="replied@example.com",
+                last_contacted_date=recent, status="stalled"))
+    db.commit()
+
+    try:
+        with _mock_providers():
+            result = AgentRunner(db, user_id).run()
+        replied = db.query(Lead).filter(Lead.email == "replied@example.com").one()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert result["leads_processed"] == 11, "Active leads should never be loaded"
+    assert result["actions_taken"] == 10
+    assert replied.status == "active"
+    print(f"✅ Due-lead prefilter: {result['leads_processed']} of 61 leads loaded")
+
+
+def test_cycle_holds_no_write_lock_during_provider_calls():
+    """Generation and sends happen before the chunk's transaction, so other writers are never blocked."""
+    engine, db, user_id = _seed_cycle_db(20)
+    # Every status is stale, so each chunk has writes to record
+    db.query(Lead).update({Lead.status: "stalled"})
+    db.commit()
+    locked = []
+
+    def probe(*_):
+        writer = sqlite3.connect(engine.url.database, timeout=0)
+        try:
+            writer.execute("BEGIN IMMEDIATE")
+            writer.rollback()
+        except sqlite3.OperationalError:
+            locked.append(True)
+        finally:
+            writer.close()
+
+    try:
+        with _mock_providers() as (generator, comm):
+            batch = comm.send_email_batch.side_effect
+            comm.send_email_batch.side_effect = lambda messages: probe() or batch(messages)
+            result = AgentRunner(db, user_id).run(concurrency=1, chunk_size=10)
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert result["actions_taken"] == 20 and comm.send_email_batch.call_count == 2
+    assert not locked, "The database write lock was held across a provider call"
+    print("✅ Chunk transactions: no write lock held across provider calls")
+
+
+def test_bound_sink_writes_into_callers_transaction():
+    """A full buffer flushes into the bound session, so its rows roll back with the caller."""
+    engine, db, user_id = _seed_cycle_db(1)
+    try:
+        sink = ActivitySink(db=db, max_rows=2)
+        for i in range(3):
+            sink.add(user_id, None, "classified", {"n": i})
+        buffered = db.query(ActivityLog).count()
+        db.rollback()
+        kept = db.query(ActivityLog).count()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert buffered == 2 and sink.pending() == 1
+    assert kept == 0, "Overflow rows were committed outside the caller's transaction"
+    print("✅ Bound activity sink: overflow flushed into the caller's transaction")
+
+
+if __name__ == "__main__":
+    test_cycle_reuses_loaded_leads()
+    test_concurrent_cycle_reuses_loaded_leads()
+    test_chunked_cycle_isolates_failures()
+    test_cycle_drafts_emails_in_batches()
+    test_cycle_only_loads_leads_needing_action()
+    test_cycle_holds_no_write_lock_during_provider_calls()
+    test_bound_sink_writes_into_callers_transaction()
@@ -0,0 +1,217 @@
+"""Checks for outbound delivery in CommunicationService."""
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import httpx
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.communication_service import comm_service, settings
+
+
+def _messages(count):
+    return [
+        {"to_email": f"lead{i}@example.com", "subject": f"Subject {i}", "html_content": "<p>Hi</p>"}
+        for i in range(count)
+    ]
+
+
+def test_email_batch_maps_results_and_retries_failures():
+    calls = []
+
+    def batch_send(params):
+        calls.append([p["subject"] for p in params])
+        if len(calls) == 1:
+            # Message 1 is rejected (not retried); message 2 is missing from `data` (retried)
+            return {"data": [{"id": "id-0"}], "errors": [{"index": 1, "message": "invalid to"}]}
+        return [{"id": f"retry-{i}"} for i in range(len(params))]
+
+    with patch("services.communication_service.resend.Batch.send", side_effect=batch_send), \
+            patch("services.communication_service.time.sleep"), \
+            patch.object(settings, "RESEND_API_KEY", "re_test"), \
+            patch.object(settings, "RESEND_FROM_EMAIL", "FollowUpAI <team@followupai.com>"):
+        results = comm_service.send_email_batch(_messages(3))
+
+    assert calls == [["Subject 0", "Subject 1", "Subject 2"], ["Subject 2"]]
+    assert results[0] == {"success": True, "id": "id-0"}
+    assert results[1] == {"success": False, "error": "invalid to"}
+    assert results[2] == {"success": True, "id": "retry-0"}
+    print("✅ Email batch: results mapped by index, only the missing message retried")
+
+
+def test_failed_email_batch_gives_each_message_its_own_result():
+    with patch("services.communication_service.resend.Batch.send", side_effect=ValueError("invalid from")), \
+            patch.object(settings, "RESEND_API_KEY", "re_test"), \
+            patch.object(settings, "RESEND_FROM_EMAIL", "FollowUpAI <team@followupai.com>"):
+        results = comm_service.send_email_batch(_messages(3))
+
+    results[0]["lead_id"] = 1
+    assert all(result == {"success": False, "error": "invalid from"} for result in results[1:])
+    print("✅ Email batch: a failed request yields a separate result per message")
+
+
+def test_email_batch_splits_at_provider_limit():
+    with patch("services.communication_service.resend.Batch.send",
+               side_effect=lambda params: {"data": [{"id": p["to"]} for p in params]}) as batch_send, \
+            patch.object(settings, "RESEND_API_KEY", "re_test"), \
+            patch.object(settings, "RESEND_FROM_EMAIL", "FollowUpAI <team@followupai.com>"):
+        results = comm_service.send_email_batch(_messages(250))
+
+    assert [len(call.args[0]) for call in batch_send.call_args_list] == [100, 100, 50]
+    assert all(result["success"] for result in results)
+    assert results[249]["id"] == "lead249@example.com"
+    print("✅ Email batch: 250 emails sent in 3 API calls")
+
+
+def test_meta_whatsapp_batch_runs_concurrently_on_pooled_client():
+    in_flight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return httpx.Response(200, json={"messages": [{"id": f"wamid.{request.url.path[-4:]}"}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    messages = [{"to_phone": f"+1555000{i:04d}", "message": "Hi"} for i in range(20)]
+    with patch.object(comm_service, "twilio_client", None), \
+            patch.object(comm_service, "wa_token", "token"), \
+            patch.object(comm_service, "wa_phone_id", "123"), \
+            patch.object(comm_service, "wa_url", "https://graph.example.com/123/messages"), \
+            patch.object(comm_service, "wa_client", client), \
+            patch.object(comm_service, "wa_semaphore", asyncio.Semaphore(5)):
+        started = time.perf_counter()
+        results = comm_service.send_whatsapp_batch(messages)
+        elapsed = time.perf_counter() - started
+
+    assert all(result["success"] for result in results)
+    assert peak == 5, f"Concurrency limit not applied (peak {peak})"
+    assert elapsed < 0.5, f"Sends were serialized ({elapsed:.2f}s)"
+    print(f"✅ Meta WhatsApp: 20 messages in {elapsed:.2f}s, at most {peak} in flight")
+
+
+def test_twilio_dispatcher_bounds_rate_and_concurrency():
+    from services.twilio_dispatcher import TwilioDispatcher
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+
+    def slow_send(to_phone, message):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return {"success": True, "id": f"SM{to_phone}"}
+
+    dispatcher = TwilioDispatcher(slow_send, max_workers=4, messages_per_second=40)
+    started = time.perf_counter()
+    futures = [dispatcher.submit(f"+1555{i:07d}", "Hi", account="AC1") for i in range(60)]
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    assert all(result["success"] for result in results)
+    assert peak[0] == 4
+    # 40 burst + 20 more at 40/s needs ~0.5s; the pool alone could do 400/s
+    assert 0.4 <= elapsed < 1.5, f"Unexpected dispatch time {elapsed:.2f}s"
+    assert dispatcher.stats()["AC1"]["waited"] > 0
+    print(f"✅ Twilio dispatcher: 60 sends in {elapsed:.2f}s with 4 threads at 40 msg/s")
+
+
+def test_twilio_dispatcher_accepts_sub_second_rates():
+    from services.twilio_dispatcher import TwilioDispatcher
+    dispatcher = TwilioDispatcher(lambda to_phone, message: {"success": True}, max_workers=1, messages_per_second=0.5)
+
+    result = dispatcher.submit("+15550000000", "Hi", account="AC1").result(timeout=2)
+    buckets = dispatcher._limiter("AC1").buckets
+
+    assert result["success"]
+    # One send per two seconds, rather than a bucket that never holds a whole send
+    assert buckets.capacity_requests == 1 and buckets.window == 2.0
+    try:
+        TwilioDispatcher(lambda to_phone, message: {}, max_workers=1, messages_per_second=0)
+        assert False, "A zero rate must be rejected"
+    except ValueError:
+        pass
+    print("✅ Twilio dispatcher: 0.5 msg/s sends one message every 2s")
+
+
+def test_resend_breaker_trips_fast_fails_and_recovers():
+    from services.circuit_breaker import CircuitBreaker
+    breaker = CircuitBreaker("resend", failure_threshold=3, reset_timeout=30)
+    calls = []
+
+    def flaky_send(params):
+        calls.append(params["to"])
+        if len(calls) <= 3:
+            raise httpx.ConnectError("connection refused")
+        return {"id": "re_ok"}
+
+    with patch.dict(comm_service.breakers, {"resend": breaker}), \
+            patch("services.communication_service.resend.Emails.send", side_effect=flaky_send), \
+            patch("services.circuit_breaker.time.sleep"), \
+            patch.object(settings, "RESEND_API_KEY", "re_test"), \
+            patch.object(settings, "RESEND_FROM_EMAIL", "FollowUpAI <team@followupai.com>"):
+        failed = comm_service.send_email("a@example.com", "Hi", "<p>Hi</p>")  # 1 try + 2 retries
+        deferred = comm_service.send_email("b@example.com", "Hi", "<p>Hi</p>")
+        assert not comm_service.email_available()
+        breaker.opened_at -= breaker.reset_timeout  # let the reset timeout elapse
+        probe = comm_service.send_email("c@example.com", "Hi", "<p>Hi</p>")
+
+    assert failed["success"] is False and "deferred" not in failed
+    assert deferred == {"success": False, "error": deferred["error"], "deferred": True}
+    assert calls == ["a@example.com"] * 3 + ["c@example.com"], "Open breaker must not call the provider"
+    assert probe == {"success": True, "id": "re_ok"}
+    stats = breaker.stats()
+    assert stats["state"] == "closed" and stats["trips"] == 1 and stats["rejected"] == 1
+    print("✅ Circuit breaker: tripped after 3 failures, fast-failed, closed after a half-open probe")
+
+
+def test_only_unsent_failures_are_retried():
+    import requests
+    import urllib3
+    from services.circuit_breaker import CircuitBreaker
+    from services.communication_service import ProviderHTTPError, is_retry_safe, is_transient
+    refused = requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(None, "/", urllib3.exceptions.NewConnectionError(None, "refused"))
+    )
+    timeout = httpx.ReadTimeout("read timed out")
+
+    assert is_transient(refused) and is_retry_safe(refused)
+    assert is_transient(ProviderHTTPError(503, "busy")) and is_retry_safe(ProviderHTTPError(503, "busy"))
+    # The message may have gone out: counts against the provider, but is not re-sent
+    assert is_transient(timeout) and not is_retry_safe(timeout)
+    assert is_transient(ProviderHTTPError(500, "oops")) and not is_retry_safe(ProviderHTTPError(500, "oops"))
+    assert not is_transient(KeyError("sid")) and not is_retry_safe(KeyError("sid"))
+
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise timeout
+
+    breaker = CircuitBreaker("twilio", failure_threshold=5, reset_timeout=30)
+    with patch("services.circuit_breaker.time.sleep"):
+        try:
+            breaker.call(send, retries=2, is_transient=is_transient, can_retry=is_retry_safe)
+        except httpx.ReadTimeout:
+            pass
+    assert len(calls) == 1 and breaker.stats()["failures"] == 1
+    print("✅ Retries: only failures that sent nothing are retried; timeouts still count against the breaker")
+
+
+if __name__ == "__main__":
+    test_email_batch_maps_results_and_retries_failures()
+    test_failed_email_batch_gives_each_message_its_own_result()
+    test_email_batch_splits_at_provider_limit()
+    test_meta_whatsapp_batch_runs_concurrently_on_pooled_client()
+    test_twilio_dispatcher_bounds_rate_and_concurrency()
+    test_twilio_dispatcher_accepts_sub_second_rates()
+    test_only_unsent_failures_are_retried()
+    test_resend_breaker_trips_fast_fails_and_recovers()
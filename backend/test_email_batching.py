@@ -0,0 +1,65 @@
+"""Checks for batched multi-lead email generation."""
+import json
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.email_generator import EmailGenerator
+from services.llm_cache import LLMCache
+
+
+def _lead(i):
+    return SimpleNamespace(
+        name=f"Lead {i}", company=f"Company {i}", contact_type="client",
+        tech_stack=None, resume_link=None
+    )
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _generate(leads, create):
+    with patch("agents.email_generator.async_client.chat.completions.create", create), \
+            patch("agents.email_generator.llm_cache", LLMCache(None, ttl=60)), \
+            patch("agents.email_generator.settings.EMAIL_BATCH_SIZE", 10):
+        return EmailGenerator.generate_emails(leads, context_type="followup")
+
+
+def test_batch_packs_leads_into_one_request():
+    leads = [_lead(i) for i in range(10)]
+    create = AsyncMock(return_value=_completion(json.dumps(
+        {"emails": [{"id": i, "body": f"Email for lead {i}"} for i in reversed(range(10))]}
+    )))
+
+    bodies = _generate(leads, create)
+
+    assert create.await_count == 1
+    assert bodies == [f"Email for lead {i}" for i in range(10)]
+    assert create.await_args.kwargs["response_format"] == {"type": "json_object"}
+    print("✅ Batched generation: 10 leads in 1 request, results mapped back in order")
+
+
+def test_unparseable_batch_falls_back_per_lead():
+    leads = [_lead(i) for i in range(3)]
+
+    async def create(**kwargs):
+        if "response_format" in kwargs:
+            return _completion("Sure! Here are your emails: ...")
+        return _completion("Single email")
+
+    create_mock = AsyncMock(side_effect=create)
+    bodies = _generate(leads, create_mock)
+
+    assert bodies == ["Single email"] * 3
+    assert create_mock.await_count == 1 + len(leads)
+    print("✅ Batched generation: malformed JSON falls back to per-lead requests")
+
+
+if __name__ == "__main__":
+    test_batch_packs_leads_into_one_request()
+    test_unparseable_batch_falls_back_per_lead()
@@ -0,0 +1,66 @@
+"""Checks for the offline fake providers."""
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import groq
+import httpx
+from services.communication_service import CommunicationService
+from services.fake_providers import FakeProviders, settings
+
+
+def _fakes(**overrides):
+    options = {"FAKE_PROVIDERS": "all", "FAKE_LATENCY_SCALE": 0.0, "FAKE_SEED": 7, **overrides}
+    with patch.multiple(settings, **options):
+        return FakeProviders()
+
+
+def test_groq_sdk_runs_against_fake():
+    fakes = _fakes(FAKE_PROVIDER_PROFILES='{"groq": {"requests_per_minute": 2}}')
+    client = groq.Groq(api_key="fake", max_retries=0, http_client=httpx.Client(transport=fakes.transport("groq")))
+    prompt = "### Recipient 0\nRecipient: Ada, client at Acme\n\n### Recipient 1\nRecipient: Alan, hr at Bletchley"
+
+    completion = client.chat.completions.create(
+        model="llama", messages=[{"role": "user", "content": prompt}], response_format={"type": "json_object"}
+    )
+    assert '"id": 1' in completion.choices[0].message.content and completion.usage.total_tokens > 0
+
+    client.chat.completions.create(model="llama", messages=[{"role": "user", "content": "Recipient: Ada, x"}])
+    try:
+        client.chat.completions.create(model="llama", messages=[{"role": "user", "content": "Recipient: Ada, x"}])
+        assert False, "Third call in the minute should be rate limited"
+    except groq.RateLimitError:
+        pass
+    assert fakes.stats()["groq"]["rate_limited"] == 1
+    print("✅ Fake Groq: real SDK parses completions and raises RateLimitError past the quota")
+
+
+def test_comm_service_sends_through_fakes():
+    fakes = _fakes()
+    with patch("services.communication_service.fake_providers", fakes):
+        service = CommunicationService()
+        emails = service.send_email_batch([
+            {"to_email": f"lead{i}@example.com", "subject": "Hi", "html_content": "<p>Hi</p>"} for i in range(3)
+        ])
+        twilio = service.send_whatsapp("+15550001111", "Hello")
+        service.twilio_client = None
+        meta = asyncio.run(service._asend_whatsapp_meta("+15550001111", "Hello"))
+
+    assert all(result["success"] for result in emails) and len({result["id"] for result in emails}) == 3
+    assert twilio["success"] and twilio["id"].startswith("SM")
+    assert meta["success"] and meta["id"].startswith("wamid.")
+
+    failing = _fakes(FAKE_ERROR_RATE=1.0)
+    with patch("services.communication_service.fake_providers", failing):
+        result = CommunicationService().send_email("lead@example.com", "Hi", "<p>Hi</p>")
+    assert not result["success"] and failing.stats()["resend"]["errors"] >= 1
+    print("✅ Fake providers: Resend, Twilio and Meta sends go through the real client code")
+
+
+if __name__ == "__main__":
+    test_groq_sdk_runs_against_fake()
+    test_comm_service_sends_through_fakes()
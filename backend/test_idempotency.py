@@ -0,0 +1,104 @@
+"""Checks for idempotent outbound sends."""
+import os
+import sys
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from models.idempotency import IdempotencyKey
+from models.lead import Lead
+from agents.agent_runner import AgentRunner
+from services.communication_service import comm_service, settings
+from services.idempotency import make_key
+from test_agent_cycle import _mock_providers, _seed_cycle_db
+
+
+def test_overlapping_runs_send_each_email_once():
+    """A second run over the same due leads on the same day does no LLM or provider work."""
+    engine, db, user_id = _seed_cycle_db(20)
+    Session = sessionmaker(bind=engine)
+    try:
+        with _mock_providers(failing_lead="Lead 7") as (generator, comm):
+            first = AgentRunner(db, user_id).run(chunk_size=10)
+
+            # An overlapping worker still sees the leads as due
+            stale = datetime.now(timezone.utc) - timedelta(days=10)
+            db.query(Lead).update({Lead.last_contacted_date: stale})
+            db.commit()
+            generator.reset_mock()
+            comm.reset_mock()
+            second = AgentRunner(db, user_id).run(chunk_size=10)
+            retried = generator.generate_email.call_count
+
+        check = Session()
+        keys = {row.lead_id: row for row in check.query(IdempotencyKey).all()}
+        check.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert first["actions_taken"] == 19
+    # Only the lead whose first attempt failed (claim released) is worked on again
+    assert second["actions_taken"] == 0 and retried == 1
+    assert comm.send_email_batch.call_count == 0
+    assert len(keys) == 19 and all(row.status == "sent" and row.provider_id for row in keys.values())
+    assert keys[1].key == make_key(1, "followup")
+    print("✅ Idempotency: overlapping run skipped 19 already-sent leads")
+
+
+def test_already_sent_step_advances_the_sequence():
+    """A step whose key is already `sent` (e.g. the run crashed before advancing) moves on without a resend."""
+    from models.sequence import Sequence, SequenceStep
+    from agents.sequence_manager import SequenceManager
+    engine, db, user_id = _seed_cycle_db(0)
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup"),
+        SequenceStep(step_number=2, wait_days=3, action_type="email", template_name="breakup")
+    ])
+    db.add(sequence)
+    db.commit()
+    lead = Lead(user_id=user_id, name="Lead 0", email="lead0@example.com", sequence_id=sequence.id,
+                current_step_number=0, next_action_at=datetime.now(timezone.utc))
+    db.add(lead)
+    db.commit()
+    db.add(IdempotencyKey(key=make_key(lead.id, f"sequence:{sequence.id}:1"), user_id=user_id, lead_id=lead.id,
+                          channel="email", step=f"sequence:{sequence.id}:1", status="sent", provider_id="re_1",
+                          claimed_at=datetime.now(timezone.utc)))
+    db.commit()
+
+    try:
+        with _mock_providers() as (generator, comm), patch("agents.sequence_manager.timer_queue", None):
+            SequenceManager(db).advance_sequences()
+        db.expire_all()
+        step = db.query(Lead.current_step_number).scalar()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert comm.send_email.call_count == 0 and generator.generate_email.call_count == 0
+    assert step == 1
+    print("✅ Idempotency: an already-sent step advances the sequence without a resend")
+
+
+def test_resend_receives_idempotency_key():
+    assert make_key(5, "sequence:1:2", date(2026, 1, 1)) == make_key(5, "sequence:1:2", date(2026, 1, 1))
+    assert make_key(5, "sequence:1:2", date(2026, 1, 1)) != make_key(5, "sequence:1:2", date(2026, 1, 2))
+
+    response = MagicMock(status_code=200, text='{"id": "re_1"}')
+    response.json.return_value = {"id": "re_1"}
+    with patch.object(settings, "RESEND_API_KEY", "re_test"), \
+            patch("services.communication_service.requests.request", return_value=response) as request:
+        result = comm_service.send_email("lead@example.com", "Hi", "<p>Hi</p>", idempotency_key="abc123")
+
+    assert result == {"success": True, "id": "re_1"}
+    assert request.call_args.kwargs["headers"]["Idempotency-Key"] == "abc123"
+    print("✅ Idempotency: key forwarded to Resend as Idempotency-Key header")
+
+
+if __name__ == "__main__":
+    test_overlapping_runs_send_each_email_once()
+    test_already_sent_step_advances_the_sequence()
+    test_resend_receives_idempotency_key()
@@ -0,0 +1,72 @@
+"""SQL lead-status rules must match the Python classifier."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from services.database import Base
+from models.user import User
+from models.lead import Lead
+from models.activity_log import ActivityLog
+from agents.lead_classifier import lead_classifier
+
+
+def _seed_status_db():
+    """In-memory database with one lead per day offset (0-40) plus a never-contacted lead."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    user = User(email="status@followupai.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+
+    now = datetime.now(timezone.utc)
+    # Half-day offsets keep every lead clear of a day boundary while the test runs
+    leads = [
+        Lead(user_id=user.id, name=f"Day {days}", email=f"day{days}@example.com",
+             last_contacted_date=now - timedelta(days=days, hours=12), status="active")
+        for days in range(41)
+    ]
+    leads.append(Lead(user_id=user.id, name="Never", email="never@example.com", status="active"))
+    db.add_all(leads)
+    db.commit()
+    return db, user.id
+
+
+def test_sql_rules_match_classify_lead():
+    db, _ = _seed_status_db()
+    expected = {lead.id: lead_classifier.classify_lead(lead.last_contacted_date) for lead in db.query(Lead).all()}
+
+    sql_status = dict(db.query(Lead.id, lead_classifier.status_expression()).all())
+    due_ids = {lead_id for (lead_id,) in db.query(Lead.id).filter(lead_classifier.needs_action_filter()).all()}
+
+    assert sql_status == expected
+    assert due_ids == {lead_id for lead_id, status in expected.items() if status != "active"}
+    print("✅ SQL status CASE and due-lead filter match classify_lead")
+    db.close()
+
+
+def test_reclassify_all_writes_summary_rows():
+    db, user_id = _seed_status_db()
+
+    summary = lead_classifier.reclassify_all(db)
+    leads = db.query(Lead).all()
+    logs = db.query(ActivityLog).all()
+
+    assert all(lead.status == lead_classifier.classify_lead(lead.last_contacted_date) for lead in leads)
+    assert summary[user_id]["needs_followup"] == 14  # days 7-20
+    assert len(logs) == 1 and logs[0].lead_id is None
+    assert logs[0].details["leads_updated"] == sum(summary[user_id].values())
+    assert lead_classifier.reclassify_all(db) == {}, "Second pass should find nothing stale"
+    print(f"✅ Bulk reclassification: {summary[user_id]}")
+    db.close()
+
+
+if __name__ == "__main__":
+    test_sql_rules_match_classify_lead()
+    test_reclassify_all_writes_summary_rows()
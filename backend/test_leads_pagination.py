@@ -0,0 +1,126 @@
+"""Keyset pagination, filters and sparse fields of GET /api/leads."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from services.database import Base, get_db
+from models.user import User
+from models.lead import Lead
+from routes.auth import get_current_user
+from routes.leads import _encode_cursor, router
+
+
+def _client(lead_count: int):
+    """App with only the leads router on an in-memory database holding `lead_count` leads."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    user = User(email="pages@followupai.com", hashed_password="x")
+    other = User(email="other@followupai.com", hashed_password="x")
+    db.add_all([user, other])
+    db.flush()
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    db.add_all([
+        Lead(user_id=user.id, name=f"Lead {i}", email=f"lead{i}@example.com",
+             company="Acme_Labs" if i % 3 == 0 else "Globex", status="stalled" if i % 2 else "active",
+             last_message="Long thread " * 50,
+             # Every other lead shares its neighbour's timestamp, so ties are broken by id
+             updated_at=start + timedelta(minutes=i // 2))
+        for i in range(lead_count)
+    ])
+    db.add(Lead(user_id=other.id, name="Not mine", email="other@example.com", status="stalled"))
+    db.commit()
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def _walk(client, **params):
+    """Follow X-Next-Cursor to the end; returns every page."""
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/leads", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_keyset_pages_cover_every_lead_once():
+    client = _client(45)
+
+    by_id = _walk(client, limit=10)
+    by_update = _walk(client, limit=10, sort="updated_at")
+
+    assert [len(page) for page in by_id] == [10, 10, 10, 10, 5]
+    assert [lead["id"] for page in by_id for lead in page] == list(range(1, 46))
+    # Most recently updated first; equal timestamps fall back to id
+    assert [lead["id"] for page in by_update for lead in page] == list(range(45, 0, -1))
+    print(f"✅ Keyset pages: {len(by_id)} pages by id, {len(by_update)} by updated_at")
+
+
+def test_updated_at_pages_use_the_index():
+    """Mixed-precision SQLite timestamps page correctly, read in index order with no sort step."""
+    client = _client(20)
+    db = client.app.dependency_overrides[get_db]()
+    # A row touched by CURRENT_TIMESTAMP is stored without a fraction; leads 11 and 12 hold the same time with one
+    db.execute(text("UPDATE leads SET updated_at = '2026-01-01 00:05:00' WHERE id = 10"))
+    db.commit()
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters)))
+
+    # One lead per page, so every row's stored form becomes a cursor
+    pages = _walk(client, limit=1, sort="updated_at", fields="name")
+    statement, parameters = statements[-1]
+    raw = db.connection().connection.driver_connection
+    plan = " ".join(row[-1] for row in raw.execute("EXPLAIN QUERY PLAN " + statement, parameters))
+
+    assert [lead["id"] for page in pages for lead in page] == list(range(20, 0, -1))
+    assert "ix_leads_user_updated" in plan and "TEMP B-TREE" not in plan, plan
+    print(f"✅ Keyset by updated_at: {len(pages)} pages, plan: {plan}")
+
+
+def test_filters_and_sparse_fields():
+    client = _client(45)
+
+    pages = _walk(client, limit=4, status="stalled", company="acme_", fields="name,company")
+    leads = [lead for page in pages for lead in page]
+    searched = [lead["name"] for page in _walk(client, limit=2, search="LEAD4", fields="name") for lead in page]
+    invalid = client.get("/api/leads", params={"fields": "name,password"})
+    wrong_sort = client.get("/api/leads", params={"sort": "updated_at", "cursor": client.get(
+        "/api/leads", params={"limit": 1}).headers["X-Next-Cursor"]})
+
+    # Odd multiples of 3 below 45, i.e. stalled Acme_Labs leads; "_" matched literally
+    assert [lead["name"] for lead in leads] == [f"Lead {i}" for i in range(3, 45, 6)]
+    assert all(set(lead) == {"id", "name", "company"} for lead in leads)
+    # Matched on email (lead4@, lead40@ ... lead44@); the names have a space
+    assert searched == ["Lead 4"] + [f"Lead {i}" for i in range(40, 45)]
+    crafted = [
+        client.get("/api/leads", params={"sort": sort, "cursor": _encode_cursor(sort, key)})
+        for sort, key in [("id", ["x"]), ("id", [True]), ("updated_at", [5, 1]), ("updated_at", ["yesterday", 1]),
+                          ("updated_at", ["2026-01-01T00:00:00", "1"])]
+    ]
+
+    assert invalid.status_code == 400 and wrong_sort.status_code == 400
+    assert [response.status_code for response in crafted] == [400] * len(crafted)
+    print(f"✅ Lead filters: {len(leads)} stalled Acme leads with 3 fields each")
+
+
+if __name__ == "__main__":
+    test_keyset_pages_cover_every_lead_once()
+    test_updated_at_pages_use_the_index()
+    test_filters_and_sparse_fields()
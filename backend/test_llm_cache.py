@@ -0,0 +1,54 @@
+"""Checks for the LLM completion cache backends."""
+import os
+import sys
+import tempfile
+import time
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.llm_cache import LLMCache, MemoryCacheBackend, SQLiteCacheBackend
+
+MESSAGES = [{"role": "system", "content": "persona"}, {"role": "user", "content": "Recipient: Jane"}]
+
+
+def test_key_covers_prompt_model_and_temperature():
+    key = LLMCache.make_key(MESSAGES, "llama", 0.7)
+    assert key == LLMCache.make_key(list(MESSAGES), "llama", 0.7)
+    assert key != LLMCache.make_key(MESSAGES, "llama", 0.0)
+    assert key != LLMCache.make_key(MESSAGES, "mixtral", 0.7)
+    assert key != LLMCache.make_key(MESSAGES[:1], "llama", 0.7)
+    print("✅ Cache key: prompt, model and temperature all participate")
+
+
+def _check_backend(backend):
+    cache = LLMCache(backend, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", "email A")
+    cache.set("b", "email B")
+    assert cache.get("a") == "email A"  # "a" is now most recently used
+    cache.set("c", "email C")           # evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == "email C"
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+    backend.set("short", "gone soon", ttl=0)
+    time.sleep(0.01)
+    assert cache.get("short") is None
+
+
+def test_memory_backend_lru_and_ttl():
+    _check_backend(MemoryCacheBackend(max_entries=2))
+    print("✅ Memory backend: LRU eviction and TTL expiry")
+
+
+def test_sqlite_backend_lru_and_ttl():
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+    _check_backend(SQLiteCacheBackend(path, max_entries=2))
+    print("✅ SQLite backend: LRU eviction and TTL expiry")
+
+
+if __name__ == "__main__":
+    test_key_covers_prompt_model_and_temperature()
+    test_memory_backend_lru_and_ttl()
+    test_sqlite_backend_lru_and_ttl()
@@ -0,0 +1,221 @@
+"""Checks for the transactional outbox."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import sessionmaker
+from models.activity_log import ActivityLog
+from models.lead import Lead
+from models.idempotency import IdempotencyKey
+from models.outbox import OutboxMessage
+from models.sequence import Sequence, SequenceStep
+from agents.agent_runner import AgentRunner
+from agents.sequence_manager import SequenceManager
+from services.outbox import Outbox, settings
+from test_agent_cycle import _mock_providers, _seed_cycle_db
+
+
+def test_cycle_queues_emails_and_workers_deliver_them():
+    engine, db, user_id = _seed_cycle_db(30)
+    Session = sessionmaker(bind=engine)
+    try:
+        with _mock_providers() as (_, comm), patch.object(settings, "DELIVERY_MODE", "outbox"):
+            result = AgentRunner(db, user_id).run(chunk_size=10)
+        assert comm.send_email_batch.call_count == 0, "Outbox mode must not send inline"
+
+        check = Session()
+        assert check.query(OutboxMessage).filter(OutboxMessage.status == "pending").count() == 30
+        assert check.query(Lead).filter(Lead.last_contacted_date.is_(None)).count() == 0
+        check.close()
+
+        def send_batch(messages):
+            # lead3 is rejected once, then accepted on retry
+            return [
+                {"success": False, "error": "timeout"} if m["to_email"] == "lead3@example.com"
+                else {"success": True, "id": f"re_{m['to_email']}"}
+                for m in messages
+            ]
+
+        relay = Outbox(session_factory=Session)
+        with patch("services.outbox.comm_service.send_email_batch", side_effect=send_batch) as sender:
+            counts = relay.drain()
+        assert counts == {"claimed": 30, "sent": 29, "retrying": 1, "failed": 0}
+        assert sender.call_count == 1
+
+        check = Session()
+        retrying = check.query(OutboxMessage).filter(OutboxMessage.status == "pending").one()
+        assert retrying.attempts == 1 and retrying.available_at > datetime.now(timezone.utc).replace(tzinfo=None)
+        assert check.query(ActivityLog).filter(ActivityLog.action_type == "sent_email").count() == 29
+        check.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert result["actions_taken"] == 30
+    print("✅ Outbox: 30 emails queued with their lead updates, 29 delivered, 1 backed off")
+
+
+def test_claimed_messages_are_not_claimed_twice():
+    engine, db, user_id = _seed_cycle_db(0)
+    Session = sessionmaker(bind=engine)
+    relay = Outbox(session_factory=Session)
+    try:
+        relay.enqueue(db, [
+            {"user_id": user_id, "lead_id": None, "channel": "email", "recipient": f"r{i}@example.com", "body": "hi"}
+            for i in range(5)
+        ])
+        db.commit()
+
+        first, second = Session(), Session()
+        claimed_a = relay.claim(first, limit=3)
+        claimed_b = relay.claim(second, limit=3)
+        first.close()
+        second.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    ids_a = {message.id for message in claimed_a}
+    ids_b = {message.id for message in claimed_b}
+    assert len(ids_a) == 3 and len(ids_b) == 2 and not ids_a & ids_b
+    print("✅ Outbox: concurrent claims lease disjoint messages")
+
+
+def test_failed_delivery_restores_the_lead():
+    engine, db, user_id = _seed_cycle_db(2)
+    Session = sessionmaker(bind=engine)
+    try:
+        with _mock_providers(), patch.object(settings, "DELIVERY_MODE", "outbox"):
+            AgentRunner(db, user_id).run()
+        check = Session()
+        before = {lead.email: lead.last_contacted_date for lead in check.query(Lead)}
+        check.close()
+
+        def send_batch(messages):
+            return [
+                {"success": False, "error": "invalid recipient"} if m["to_email"] == "lead0@example.com"
+                else {"success": True, "id": "re_1"}
+                for m in messages
+            ]
+
+        relay = Outbox(session_factory=Session)
+        with patch.object(settings, "OUTBOX_MAX_ATTEMPTS", 1), \
+                patch("services.outbox.comm_service.send_email_batch", side_effect=send_batch):
+            counts = relay.drain()
+
+        check = Session()
+        after = {lead.email: lead.last_contacted_date for lead in check.query(Lead)}
+        sent = check.query(OutboxMessage).filter(OutboxMessage.status == "sent").one()
+        keys = check.query(IdempotencyKey).count()
+        check.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert counts == {"claimed": 2, "sent": 1, "retrying": 0, "failed": 1}
+    # Seeded ten days ago, stamped on enqueue, restored when delivery failed for good
+    assert after["lead0@example.com"] < before["lead0@example.com"]
+    assert after["lead1@example.com"] == sent.sent_at
+    assert keys == 1, "The failed message's idempotency key should be dropped so it can be retried"
+    print("✅ Outbox: failed delivery restores the lead's contact date, delivered re-stamps it")
+
+
+def test_settling_keeps_newer_contacts():
+    """A late delivery or failure never overwrites a contact made after the message was queued."""
+    engine, db, user_id = _seed_cycle_db(2)
+    Session = sessionmaker(bind=engine)
+    newer = datetime.now(timezone.utc) + timedelta(hours=1)
+    try:
+        with _mock_providers(), patch.object(settings, "DELIVERY_MODE", "outbox"):
+            AgentRunner(db, user_id).run()
+        # Both leads were emailed by hand while their messages were still queued
+        db.query(Lead).update({Lead.last_contacted_date: newer})
+        db.commit()
+
+        def send_batch(messages):
+            return [
+                {"success": False, "error": "invalid recipient"} if m["to_email"] == "lead0@example.com"
+                else {"success": True, "id": "re_1"}
+                for m in messages
+            ]
+
+        relay = Outbox(session_factory=Session)
+        with patch.object(settings, "OUTBOX_MAX_ATTEMPTS", 1), \
+                patch("services.outbox.comm_service.send_email_batch", side_effect=send_batch):
+            counts = relay.drain()
+        check = Session()
+        contacted = [lead.last_contacted_date for lead in check.query(Lead).order_by(Lead.id)]
+        check.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert counts["sent"] == 1 and counts["failed"] == 1
+    assert contacted == [newer.replace(tzinfo=None)] * 2
+    print("✅ Outbox: late settlements keep the newer contact date")
+
+
+def test_failed_sequence_step_is_rolled_back():
+    """A queued sequence step that fails delivery puts the lead back on it, due again after the retry delay."""
+    engine, db, user_id = _seed_cycle_db(0)
+    Session = sessionmaker(bind=engine)
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup"),
+        SequenceStep(step_number=2, wait_days=3, action_type="email", template_name="breakup")
+    ])
+    db.add(sequence)
+    db.commit()
+    db.add_all([
+        Lead(user_id=user_id, name=f"Lead {i}", email=f"lead{i}@example.com", sequence_id=sequence.id,
+             current_step_number=0, next_action_at=datetime.now(timezone.utc))
+        for i in range(2)
+    ])
+    db.commit()
+
+    timers = MagicMock()
+    try:
+        with _mock_providers(), patch.object(settings, "DELIVERY_MODE", "outbox"), \
+                patch("agents.sequence_manager.timer_queue", None):
+            SequenceManager(db).advance_sequences()
+        check = Session()
+        queued = [lead.current_step_number for lead in check.query(Lead).order_by(Lead.id)]
+        check.close()
+
+        def send_batch(messages):
+            return [
+                {"success": False, "error": "invalid recipient"} if m["to_email"] == "lead0@example.com"
+                else {"success": True, "id": "re_1"}
+                for m in messages
+            ]
+
+        relay = Outbox(session_factory=Session)
+        with patch.object(settings, "OUTBOX_MAX_ATTEMPTS", 1), patch("services.outbox.timer_queue", timers), \
+                patch("services.outbox.comm_service.send_email_batch", side_effect=send_batch):
+            relay.drain()
+        check = Session()
+        failed, delivered = check.query(Lead).order_by(Lead.id).all()
+        check.close()
+    finally:
+        db.close()
+        engine.dispose()
+
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=settings.SEQUENCE_RETRY_SECONDS)
+    assert queued == [1, 1], "Queued steps advance the sequence"
+    assert failed.current_step_number == 0 and failed.last_contacted_date is None
+    assert abs(failed.next_action_at.replace(tzinfo=timezone.utc) - retry_at) < timedelta(minutes=1)
+    assert delivered.current_step_number == 1
+    assert delivered.next_action_at.replace(tzinfo=timezone.utc) > retry_at, "Step 2 waits three days"
+    assert list(timers.schedule.call_args.args[0]) == [failed.id]
+    print("✅ Outbox: an undelivered sequence step is rolled back and re-armed")
+
+
+if __name__ == "__main__":
+    test_cycle_queues_emails_and_workers_deliver_them()
+    test_claimed_messages_are_not_claimed_twice()
+    test_failed_delivery_restores_the_lead()
+    test_settling_keeps_newer_contacts()
+    test_failed_sequence_step_is_rolled_back()
@@ -0,0 +1,78 @@
+"""Checks for the token-bucket rate limiter."""
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.rate_limiter import LocalTokenBuckets, RateLimiter
+from agents.email_generator import email_generator
+
+
+def test_requests_wait_for_refill():
+    # 10 requests per 0.5s window: the 11th request waits for ~1/10 of the window
+    limiter = RateLimiter("test", LocalTokenBuckets(10, 100000, window=0.5))
+
+    async def burst():
+        return await asyncio.gather(*(limiter.acquire(10) for _ in range(12)))
+
+    waits = asyncio.run(burst())
+
+    assert sum(1 for wait in waits if wait == 0) == 10
+    assert max(waits) >= 0.05
+    stats = limiter.stats()
+    assert stats["acquired"] == 12 and stats["waited"] == 2
+    print(f"✅ Rate limiter: 10 immediate, 2 delayed (max wait {stats['max_wait_seconds']}s)")
+
+
+def test_token_budget_limits_large_requests():
+    # Plenty of requests, but only 1000 tokens per 0.5s window
+    limiter = RateLimiter("test", LocalTokenBuckets(100, 1000, window=0.5))
+
+    async def burst():
+        return await asyncio.gather(*(limiter.acquire(600) for _ in range(2)))
+
+    waits = sorted(asyncio.run(burst()))
+
+    assert waits[0] == 0
+    assert waits[1] >= 0.1, "Second 600-token request should wait for the token bucket"
+    print("✅ Rate limiter: token budget enforced independently of request count")
+
+
+def test_discovery_parsing_waits_without_blocking_the_loop():
+    # One request per 0.3s window, already spent: parsing has to wait ~0.3s for it
+    limiter = RateLimiter("test", LocalTokenBuckets(1, 100000, window=0.3))
+    asyncio.run(limiter.acquire(10))
+    completion = MagicMock()
+    completion.choices[0].message.content = '{"leads": [{"name": "Ada"}]}'
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=completion)
+
+    async def parse_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        leads = await email_generator.parse_search_results([{"title": "t", "url": "u", "content": "c"}], "q")
+        ticker.cancel()
+        return leads, ticks
+
+    with patch("agents.email_generator.groq_limiter", limiter), patch("agents.email_generator.async_client", client):
+        leads, ticks = asyncio.run(parse_while_ticking())
+
+    assert leads == [{"name": "Ada"}]
+    assert ticks >= 10, "The caller's event loop was blocked while waiting for the limiter"
+    print(f"✅ Discovery parsing: caller's loop ticked {ticks} times during the limiter wait")
+
+
+if __name__ == "__main__":
+    test_requests_wait_for_refill()
+    test_token_budget_limits_large_requests()
+    test_discovery_parsing_waits_without_blocking_the_loop()
@@ -0,0 +1,275 @@
+"""Query-budget checks for the sequence engine."""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from models.lead import Lead
+from models.sequence import Sequence, SequenceStep
+from models.user import User
+from agents.agent_runner import AgentRunner
+from agents.sequence_manager import SequenceManager
+from services.sequence_cache import sequence_cache
+from test_agent_cycle import _mock_providers, _seed_cycle_db
+
+
+def test_advance_sequences_scan_is_constant_queries():
+    """Only due leads are loaded, steps come from the definition cache and each user shares one runner."""
+    engine, db, user_id = _seed_cycle_db(0)
+    other = User(email="other@followupai.com", full_name="Other", hashed_password="x")
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup"),
+        SequenceStep(step_number=2, wait_days=3, action_type="email", template_name="breakup")
+    ])
+    db.add_all([other, sequence])
+    db.commit()
+
+    contacted = datetime.now(timezone.utc) - timedelta(days=1)
+    db.add_all([
+        Lead(user_id=user_id if i % 2 else other.id, name=f"Lead {i}", email=f"lead{i}@example.com",
+             sequence_id=sequence.id, current_step_number=0 if i < 40 else 1, last_contacted_date=contacted,
+             next_action_at=contacted if i < 40 else contacted + timedelta(days=3))
+        for i in range(60)
+    ])
+    db.commit()
+    db.expire_all()
+    # Definitions are loaded once per process (a worker's first pass)
+    sequence_cache.step_map(db)
+
+    selects = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: selects.append(statement) if statement.startswith("SELECT") else None)
+    runners = []
+    original_init = AgentRunner.__init__
+
+    def counting_init(self, *args, **kwargs):
+        runners.append(self)
+        original_init(self, *args, **kwargs)
+
+    timers = MagicMock()
+    try:
+        with _mock_providers() as (_, comm), patch.object(AgentRunner, "__init__", counting_init), \
+                patch("agents.sequence_manager.timer_queue", timers):
+            SequenceManager(db).advance_sequences()
+        scan_selects = len(selects)
+        leads = db.query(Lead).order_by(Lead.id).all()
+        steps = [lead.current_step_number for lead in leads]
+        rescheduled = [lead.next_action_at for lead in leads[:40]]
+        armed = timers.schedule.call_args_list[0].args[0]
+        with patch("agents.sequence_manager.timer_queue", None):
+            next_pass = SequenceManager(db).advance_sequences()
+        leased = db.query(Lead).filter(Lead.sequence_claim_token.isnot(None)).count()
+    finally:
+        db.close()
+        engine.dispose()
+
+    # Leads 0-39 run step 1; leads 40-59 wait for step 2 (3 days)
+    assert steps == [1] * 60
+    assert comm.send_email.call_count == 40
+    assert scan_selects == 2, f"Expected 2 SELECTs (leads + timer re-arm), got {scan_selects}"
+    assert len(runners) == 2, f"Expected one runner per user, got {len(runners)}"
+    # Step 1 went out: step 2 is due 3 days after it, so the next pass finds nothing
+    assert all(due and due.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc) + timedelta(days=2) for due in rescheduled)
+    assert next_pass == 0 and leased == 0
+    # Their step-2 timers were armed for the same due time
+    assert sorted(armed) == [lead.id for lead in leads[:40]]
+    assert all(due > datetime.now(timezone.utc) + timedelta(days=2) for due in armed.values())
+    print(f"✅ Sequence scan: {scan_selects} SELECTs and {len(runners)} runners for 60 leads")
+
+
+def test_partitions_split_due_leads_and_skip_leased_ones():
+    """Each partition advances its own share; leads leased by a live worker are left alone."""
+    engine, db, user_id = _seed_cycle_db(0)
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup")
+    ])
+    db.add(sequence)
+    db.commit()
+
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Lead(user_id=user_id, name=f"Lead {i}", email=f"lead{i}@example.com", sequence_id=sequence.id,
+             current_step_number=0, next_action_at=now - timedelta(minutes=1),
+             # Another worker holds lead 10's lease
+             sequence_claim_token="other" if i == 9 else None,
+             sequence_locked_until=now + timedelta(minutes=5) if i == 9 else None)
+        for i in range(10)
+    ])
+    db.commit()
+
+    try:
+        with _mock_providers() as (_, comm), patch("agents.sequence_manager.timer_queue", None):
+            processed = [SequenceManager(db).advance_sequences(partition, 3) for partition in range(3)]
+        db.expire_all()
+        leads = db.query(Lead).order_by(Lead.id).all()
+    finally:
+        db.close()
+        engine.dispose()
+
+    # Ids 1-10 by id % 3: partition 0 -> 3, 6, 9; partition 1 -> 1, 4, 7, (10 leased); partition 2 -> 2, 5, 8
+    assert processed == [3, 3, 3]
+    assert comm.send_email.call_count == 9
+    assert [lead.current_step_number for lead in leads] == [1] * 9 + [0]
+    assert leads[9].sequence_claim_token == "other"
+    assert all(lead.sequence_claim_token is None for lead in leads[:9])
+    print(f"✅ Sequence partitions: {processed} leads per partition, leased lead skipped")
+
+
+def test_timers_advance_only_due_leads():
+    """A fired timer advances its lead once; stale timers are skipped and failed steps re-armed."""
+    engine, db, user_id = _seed_cycle_db(0)
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup")
+    ])
+    db.add(sequence)
+    db.commit()
+
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Lead(user_id=user_id, name=f"Lead {i}", email=f"lead{i}@example.com", sequence_id=sequence.id,
+             current_step_number=0, next_action_at=now + timedelta(days=1) if i == 2 else now)
+        for i in range(3)
+    ])
+    db.commit()
+
+    timers = MagicMock()
+    try:
+        # Lead 2's send fails; lead 3 was rescheduled after its timer was set
+        with _mock_providers(failing_lead="Lead 1") as (_, comm), patch("agents.sequence_manager.timer_queue", timers):
+            processed = SequenceManager(db).advance_leads([1, 2, 3])
+            repeated = SequenceManager(db).advance_leads([1])
+        db.expire_all()
+        steps = [lead.current_step_number for lead in db.query(Lead).order_by(Lead.id)]
+    finally:
+        db.close()
+        engine.dispose()
+
+    armed = timers.schedule.call_args_list[0].args[0]
+    assert processed == 2 and repeated == 0
+    assert steps == [1, 0, 0]
+    assert armed[1] is None  # finished its sequence
+    assert armed[2] > now + timedelta(minutes=30)  # retry after SEQUENCE_RETRY_SECONDS
+    print("✅ Sequence timers: due leads advanced once, failed step re-armed")
+
+
+def test_unsent_steps_do_not_advance():
+    """A deferred or rejected email leaves the lead on its step, due again once the retry timer fires."""
+    engine, db, user_id = _seed_cycle_db(0)
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup"),
+        SequenceStep(step_number=2, wait_days=3, action_type="email", template_name="breakup")
+    ])
+    db.add(sequence)
+    db.commit()
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Lead(user_id=user_id, name=f"Lead {i}", email=f"lead{i}@example.com", sequence_id=sequence.id,
+             current_step_number=0, next_action_at=now)
+        for i in range(2)
+    ])
+    db.commit()
+
+    results = {
+        "lead0@example.com": {"success": False, "error": "resend circuit open; retry in 30s", "deferred": True},
+        "lead1@example.com": {"success": False, "error": "invalid to"}
+    }
+    try:
+        with _mock_providers() as (_, comm), patch("agents.sequence_manager.timer_queue", MagicMock()):
+            comm.send_email.side_effect = lambda to_email, **kwargs: results[to_email]
+            processed = SequenceManager(db).advance_sequences()
+        db.expire_all()
+        leads = db.query(Lead).order_by(Lead.id).all()
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert processed == 2 and comm.send_email.call_count == 2
+    assert [lead.current_step_number for lead in leads] == [0, 0]
+    assert all(lead.last_contacted_date is None for lead in leads)
+    print("✅ Sequence steps: deferred and rejected emails keep the lead on its step")
+
+
+def test_schedule_rechecks_cache_misses():
+    """A step added after the snapshot loaded still gets scheduled instead of ending the sequence."""
+    engine, db, user_id = _seed_cycle_db(0)
+    sequence = Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup")
+    ])
+    db.add(sequence)
+    db.commit()
+    contacted = datetime.now(timezone.utc) - timedelta(days=1)
+    lead = Lead(user_id=user_id, name="Lead", email="lead@example.com", sequence_id=sequence.id,
+                current_step_number=1, last_contacted_date=contacted)
+    db.add(lead)
+    db.commit()
+
+    try:
+        stale = sequence_cache.step_map(db)
+        # Added by another process whose invalidation has not arrived
+        db.add(SequenceStep(sequence_id=sequence.id, step_number=2, wait_days=3, action_type="email", template_name="breakup"))
+        db.commit()
+        manager = SequenceManager(db)
+        manager.schedule(lead, stale)
+        scheduled = lead.next_action_at
+        lead.current_step_number = 2
+        manager.schedule(lead, sequence_cache.step_map(db))
+        finished = lead.next_action_at
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert scheduled == contacted + timedelta(days=3)
+    assert finished is None
+    print("✅ Sequence schedule: cache misses re-checked before ending a sequence")
+
+
+def test_sequence_cache_serves_definitions_until_invalidated():
+    """Definitions load once per process; invalidation reloads them and notifies the other processes."""
+    engine, db, _ = _seed_cycle_db(0)
+    db.add(Sequence(name="Protocol", steps=[
+        SequenceStep(step_number=1, wait_days=0, action_type="email", template_name="followup")
+    ]))
+    db.commit()
+
+    selects = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: selects.append(statement) if statement.startswith("SELECT") else None)
+    redis = MagicMock()
+    redis.incr.return_value = 7
+    try:
+        with patch.object(sequence_cache, "_redis", return_value=redis):
+            first = sequence_cache.step_map(db)
+            cold = len(selects)
+            sequence_cache.step_map(db)
+            warm = len(selects) - cold
+
+            sequence = db.query(Sequence).one()
+            sequence.steps.append(SequenceStep(step_number=2, wait_days=3, action_type="whatsapp", template_name="followup"))
+            db.commit()
+            stale = sequence_cache.step_map(db)
+            sequence_cache.invalidate()
+            fresh = sequence_cache.step_map(db)
+            listed = sequence_cache.all(db)
+    finally:
+        db.close()
+        engine.dispose()
+
+    assert warm == 0, f"Cached lookups should not query, got {warm} SELECTs"
+    assert list(first) == list(stale) == [(1, 1)]
+    assert sorted(fresh) == [(1, 1), (1, 2)] and fresh[(1, 2)].wait_days == 3
+    assert [step.step_number for step in listed[0].steps] == [1, 2]
+    redis.publish.assert_called_once_with(sequence_cache.channel, 7)
+    print(f"✅ Sequence cache: {cold} SELECTs cold, {warm} warm, reloaded after invalidation")
+
+
+if __name__ == "__main__":
+    test_advance_sequences_scan_is_constant_queries()
+    test_partitions_split_due_leads_and_skip_leased_ones()
+    test_timers_advance_only_due_leads()
+    test_unsent_steps_do_not_advance()
+    test_schedule_rechecks_cache_misses()
+    test_sequence_cache_serves_definitions_until_invalidated()
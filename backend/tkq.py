@@ -15,3 +15,14 @@ scheduler = TaskiqScheduler(
     broker=broker,
     sources=[LabelScheduleSource(broker)],
 )
+
+# Delivery queue: outbox drains run on their own workers, scaled apart from generation
+delivery_broker = ListQueueBroker(
+    url=settings.REDIS_URL,
+    queue_name="followupai:delivery"
+)
+
+delivery_scheduler = TaskiqScheduler(
+    broker=delivery_broker,
+    sources=[LabelScheduleSource(delivery_broker)],
+)
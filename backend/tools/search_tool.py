@@ -3,6 +3,7 @@ import httpx
 from loguru import logger
 from typing import List, Dict, Any
 from config import get_settings
+from services.fake_providers import fake_providers
 
 settings = get_settings()
 
@@ -12,6 +13,8 @@ class SearchTool:
     def __init__(self):
         self.api_key = settings.TAVILY_API_KEY
         self.base_url = "https://api.tavily.com/search"
+        # Offline fake when FAKE_PROVIDERS includes tavily (None = real network)
+        self.transport = fake_providers.transport("tavily")
 
     async def search_leads(self, query: str, search_depth: str = "advanced") -> List[Dict[str, Any]]:
         """
@@ -24,7 +27,7 @@ class SearchTool:
         Returns:
             List of search results with title, url, and content
         """
-        if not self.api_key:
+        if not self.api_key and self.transport is None:
             logger.warning("TAVILY_API_KEY not configured. Search will return empty results.")
             return []
 
@@ -38,7 +41,7 @@ class SearchTool:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=self.transport) as client:
                 response = await client.post(self.base_url, json=payload, timeout=30.0)
                 response.raise_for_status()
                 data = response.json()
@@ -1,7 +1,12 @@
 import asyncio
+from typing import List
+from taskiq import TaskiqEvents, TaskiqState
 from tkq import broker
 from agents.agent_runner import AgentRunner
+from config import get_settings
 from services.database import SessionLocal
+from services.timer_queue import timer_queue
+from delivery_worker import kick_delivery
 from loguru import logger
 
 @broker.task
@@ -11,8 +16,10 @@ async def run_agent_task(user_id: int):
     db = SessionLocal()
     try:
         agent = AgentRunner(db=db, user_id=user_id)
-        result = agent.run()
+        # The cycle is blocking (DB + provider calls); keep it off the worker's event loop
+        result = await asyncio.to_thread(agent.run)
         logger.info(f"Agent run completed for user {user_id}: {result}")
+        await kick_delivery()
     except Exception as e:
         logger.error(f"Agent run failed for user {user_id}: {str(e)}")
     finally:
@@ -25,23 +32,83 @@ async def run_lead_task(user_id: int, lead_id: int, context_type: str = None):
     db = SessionLocal()
     try:
         agent = AgentRunner(db=db, user_id=user_id)
-        result = agent.run_for_lead(lead_id=lead_id, force_context=context_type)
+        result = await asyncio.to_thread(agent.run_for_lead, lead_id=lead_id, force_context=context_type)
         logger.info(f"Lead task completed for lead {lead_id}: {result}")
+        await kick_delivery()
     except Exception as e:
         logger.error(f"Lead task failed for lead {lead_id}: {str(e)}")
     finally:
         db.close()
 
-@broker.task(schedule=[{"cron": "0 * * * *"}]) # Run every hour
+@broker.task(schedule=[{"cron": get_settings().SEQUENCE_SWEEP_CRON}]) # Safety sweep; timers fire the steps
 async def autonomous_sequence_check():
-    """Background task to advance all active outreach sequences."""
+    """Fan the sequence pass out as one task per lead partition, so every worker takes a share."""
+    partitions = max(1, get_settings().SEQUENCE_PARTITIONS)
+    logger.info(f"Starting autonomous sequence advancement check across {partitions} partitions")
+    for partition in range(partitions):
+        await advance_sequence_partition.kiq(partition, partitions)
+
+@broker.task
+async def advance_sequence_partition(partition: int, partitions: int):
+    """Background task to advance the outreach sequences of one lead partition."""
     from agents.sequence_manager import SequenceManager
-    logger.info("Starting autonomous sequence advancement check")
     db = SessionLocal()
     try:
         manager = SequenceManager(db=db)
-        manager.advance_sequences()
+        processed = await asyncio.to_thread(manager.advance_sequences, partition, partitions)
+        logger.info(f"Sequence partition {partition + 1}/{partitions} advanced {processed} due leads")
+        await kick_delivery()
+    except Exception as e:
+        logger.error(f"Sequence advancement failed for partition {partition + 1}/{partitions}: {str(e)}")
+    finally:
+        db.close()
+
+@broker.task
+async def advance_due_leads_task(lead_ids: List[int]):
+    """Background task to run the sequence steps whose timers fired."""
+    from agents.sequence_manager import SequenceManager
+    db = SessionLocal()
+    try:
+        manager = SequenceManager(db=db)
+        processed = await asyncio.to_thread(manager.advance_leads, lead_ids)
+        logger.info(f"Sequence timers advanced {processed}/{len(lead_ids)} leads")
+        if processed:
+            await kick_delivery()
+    except Exception as e:
+        logger.error(f"Timed sequence advancement failed for {len(lead_ids)} leads: {str(e)}")
+    finally:
+        db.close()
+
+@broker.on_event(TaskiqEvents.WORKER_STARTUP)
+async def start_sequence_timers(state: TaskiqState):
+    """Pump due sequence timers into tasks while this worker runs."""
+    if timer_queue is None:
+        return
+    state.sequence_timers_stop = asyncio.Event()
+    state.sequence_timers = asyncio.create_task(
+        timer_queue.pump(advance_due_leads_task.kiq, state.sequence_timers_stop)
+    )
+
+@broker.on_event(TaskiqEvents.WORKER_SHUTDOWN)
+async def stop_sequence_timers(state: TaskiqState):
+    if timer_queue is None:
+        return
+    state.sequence_timers_stop.set()
+    await state.sequence_timers
+
+@broker.task(schedule=[{"cron": "*/15 * * * *"}]) # Run every 15 minutes
+async def reclassify_leads_task():
+    """Background task to refresh every lead's status with set-based SQL."""
+    from agents.lead_classifier import lead_classifier
+    logger.info("Starting bulk lead status reclassification")
+    db = SessionLocal()
+    try:
+        # Bulk UPDATE and commit are blocking; keep them off the worker's event loop
+        summary = await asyncio.to_thread(lead_classifier.reclassify_all, db)
+        moved = sum(sum(counts.values()) for counts in summary.values())
+        logger.info(f"Reclassification complete: {moved} leads updated across {len(summary)} users")
     except Exception as e:
-        logger.error(f"Sequence advancement failed: {str(e)}")
+        db.rollback()
+        logger.error(f"Lead reclassification failed: {str(e)}")
     finally:
         db.close()
@@ -1,8 +1,8 @@
 "use client";
 
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import api from '@/lib/api';
-import { Lead, LeadCreate, Sequence } from '@/types';
+import { LeadCreate, LeadRowData, Sequence } from '@/types';
 import toast from 'react-hot-toast';
 import { format } from 'date-fns';
 import LeadRow from '@/components/LeadRow';
@@ -19,9 +19,17 @@ import {
     Send
 } from 'lucide-react';
 
+const PAGE_SIZE = 50;
+const SEARCH_DEBOUNCE_MS = 300;
+const ROW_FIELDS: (keyof LeadRowData)[] = [
+    'name', 'email', 'phone', 'company', 'status', 'sequence_id', 'current_step_number', 'last_contacted_date'
+];
+
 export default function LeadsPage() {
-    const [leads, setLeads] = useState<Lead[]>([]);
+    const [leads, setLeads] = useState<LeadRowData[]>([]);
+    const [nextCursor, setNextCursor] = useState<string | undefined>();
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [showModal, setShowModal] = useState(false);
     const [formData, setFormData] = useState<LeadCreate>({
         name: '',
@@ -41,18 +49,25 @@ export default function LeadsPage() {
     const [isExporting, setIsExporting] = useState(false);
     const [actionLoading, setActionLoading] = useState<number | null>(null);
     const [showCustomEmailModal, setShowCustomEmailModal] = useState(false);
-    const [selectedLead, setSelectedLead] = useState<Lead | null>(null);
+    const [selectedLead, setSelectedLead] = useState<LeadRowData | null>(null);
     const [customEmail, setCustomEmail] = useState({ subject: '', body: '' });
     const [isSendingCustom, setIsSendingCustom] = useState(false);
     const [sequences, setSequences] = useState<Sequence[]>([]);
     const [isAssigning, setIsAssigning] = useState<number | null>(null);
     const [searchTerm, setSearchTerm] = useState('');
+    const [statusFilter, setStatusFilter] = useState('');
+    const latestRequest = useRef(0);
 
     useEffect(() => {
-        fetchLeads();
         fetchSequences();
     }, []);
 
+    // Search and filters run on the server; changing them restarts paging from the first page
+    useEffect(() => {
+        const timer = setTimeout(() => fetchLeads(), SEARCH_DEBOUNCE_MS);
+        return () => clearTimeout(timer);
+    }, [searchTerm, statusFilter]);
+
     const fetchSequences = async () => {
         try {
             const response = await api.get('/api/sequences');
@@ -60,14 +75,29 @@ export default function LeadsPage() {
         } catch (error) { }
     };
 
-    const fetchLeads = async () => {
+    // Loads one page of leads: the first one (replacing the list) or the one after `cursor`
+    const fetchLeads = async (cursor?: string) => {
+        const request = ++latestRequest.current;
+        if (cursor) setLoadingMore(true);
         try {
-            const response = await api.get('/api/leads');
-            setLeads(response.data);
+            const response = await api.get('/api/leads', {
+                params: {
+                    limit: PAGE_SIZE,
+                    cursor,
+                    fields: ROW_FIELDS.join(','),
+                    search: searchTerm.trim() || undefined,
+                    status: statusFilter || undefined
+                }
+            });
+            // A newer search or reload has replaced this one
+            if (request !== latestRequest.current) return;
+            setLeads(cursor ? (current) => [...current, ...response.data] : response.data);
+            setNextCursor(response.headers['x-next-cursor']);
         } catch (error) {
             toast.error('Failed to load leads');
         } finally {
             setLoading(false);
+            setLoadingMore(false);
         }
     };
 
@@ -244,10 +274,19 @@ export default function LeadsPage() {
                         className="w-full pl-10 pr-4 py-2 bg-white dark:bg-slate-900 border border-slate-200 dark:border-slate-800 rounded-xl text-sm focus:ring-2 focus:ring-primary-500/10 focus:border-primary-500 outline-none transition-all dark:text-white"
                     />
                 </div>
-                <button className="flex items-center space-x-2 px-4 py-2 text-sm font-semibold text-slate-500 hover:text-slate-900 dark:hover:text-slate-300 transition-colors">
+                <div className="flex items-center space-x-2 px-4 py-2 text-sm font-semibold text-slate-500">
                     <Filter className="w-4 h-4" />
-                    <span>Filter</span>
-                </button>
+                    <select
+                        value={statusFilter}
+                        onChange={(e) => setStatusFilter(e.target.value)}
+                        className="bg-transparent outline-none cursor-pointer hover:text-slate-900 dark:hover:text-slate-300 transition-colors"
+                    >
+                        <option value="">All statuses</option>
+                        <option value="active">Active</option>
+                        <option value="needs_followup">Needs follow-up</option>
+                        <option value="stalled">Stalled</option>
+                    </select>
+                </div>
             </div>
 
             {loading ? (
@@ -255,7 +294,7 @@ export default function LeadsPage() {
                     <div className="animate-spin rounded-full h-8 w-8 border-2 border-primary-500 border-t-transparent"></div>
                     <p className="text-sm font-medium text-slate-500">Syncing pipeline data...</p>
                 </div>
-            ) : leads.length === 0 ? (
+            ) : leads.length === 0 && !searchTerm && !statusFilter ? (
                 <div className="bg-white dark:bg-slate-900 rounded-2xl border border-slate-200 dark:border-slate-800 p-16 text-center shadow-sm">
                     <div className="mb-6 inline-flex p-4 bg-slate-50 dark:bg-slate-800 rounded-full text-slate-400">
                         <Ghost className="w-12 h-12" />
@@ -295,12 +334,14 @@ export default function LeadsPage() {
                                 </tr>
                             </thead>
                             <tbody className="divide-y divide-slate-100 dark:divide-slate-800">
+                                {leads.length === 0 && (
+                                    <tr>
+                                        <td colSpan={8} className="px-6 py-10 text-center text-sm font-medium text-slate-500">
+                                            No leads match your search.
+                                        </td>
+                                    </tr>
+                                )}
                                 {leads
-                                    .filter(lead =>
-                                        lead.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                                        lead.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                                        (lead.company && lead.company.toLowerCase().includes(searchTerm.toLowerCase()))
-                                    )
                                     .map((lead) => (
                                         <LeadRow
                                             key={lead.id}
@@ -321,6 +362,17 @@ export default function LeadsPage() {
                             </tbody>
                         </table>
                     </div>
+                    {nextCursor && (
+                        <div className="flex justify-center p-4 border-t border-slate-200 dark:border-slate-800">
+                            <button
+                                onClick={() => fetchLeads(nextCursor)}
+                                disabled={loadingMore}
+                                className="px-4 py-2 text-sm font-semibold text-slate-500 hover:text-slate-900 dark:hover:text-slate-300 transition-colors disabled:opacity-50"
+                            >
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             )}
 
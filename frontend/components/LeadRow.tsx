@@ -1,6 +1,6 @@
 "use client";
 
-import { Lead, Sequence } from '@/types';
+import { LeadRowData, Sequence } from '@/types';
 import { format } from 'date-fns';
 import {
     Mail,
@@ -13,14 +13,14 @@ import {
 } from 'lucide-react';
 
 interface LeadRowProps {
-    lead: Lead;
+    lead: LeadRowData;
     sequences: Sequence[];
     isAssigning: boolean;
     actionLoading: boolean;
     onAssignSequence: (leadId: number, sequenceId: number | null) => void;
     onDelete: (id: number) => void;
     onRunAgent: (leadId: number, context?: string) => void;
-    onSendEmail: (lead: Lead) => void;
+    onSendEmail: (lead: LeadRowData) => void;
     onWhatsApp: (phone: string, name: string) => void;
 }
 
@@ -23,6 +23,10 @@ export interface Lead {
     updated_at: string;
 }
 
+// The columns of the leads table, the only ones its list requests fetch
+export type LeadRowData = Pick<Lead,
+    'id' | 'name' | 'email' | 'phone' | 'company' | 'status' | 'sequence_id' | 'current_step_number' | 'last_contacted_date'>;
+
 export interface SequenceStep {
     id: number;
     sequence_id: number;